@@ -1,40 +1,55 @@
 from tank import Tank, Direction
 from field import Field
-from util import ArmedTimer, GameObject
+from util import ArmedTimer, GameObject, Clock
+from flow_field import FlowField
+from line_of_sight import SightLines
 import random
-from itertools import cycle
 
 
 class TankAI:
     SPAWNING_DELAY = 1.5
     FIRE_TIMER = 1.0
 
-    @staticmethod
-    def dir_delay():
-        return random.uniform(0.3, 3.0)
+    # the edges of the field a tank can be next to, as bits
+    EDGE_LEFT, EDGE_UP, EDGE_RIGHT, EDGE_DOWN = 1, 2, 4, 8
 
-    def pick_direction(self):
-        c, r = self.field.map.col_row_from_coords(*self.tank.position)
-        prohibited_dir = set()
-        # prohibited_dir.add(self.tank.direction)
+    def dir_delay(self):
+        return self.rng.uniform(0.3, 3.0)
 
+    def pick_direction(self):
+        field_map = self.field.map
+        c, r = field_map.col_row_from_coords(*self.tank.position)
+        edges = 0
         if c <= 1:
-            prohibited_dir.add(Direction.LEFT)
+            edges |= self.EDGE_LEFT
         if r <= 1:
-            prohibited_dir.add(Direction.UP)
-        if c >= self.field.map.width - 2:
-            prohibited_dir.add(Direction.RIGHT)
-        if r >= self.field.map.height - 2:
-            prohibited_dir.add(Direction.DOWN)
-        return random.choice(list(Direction.all() - prohibited_dir))
-
-    def __init__(self, tank: Tank, field: Field):
+            edges |= self.EDGE_UP
+        if c >= field_map.width - 2:
+            edges |= self.EDGE_RIGHT
+        if r >= field_map.height - 2:
+            edges |= self.EDGE_DOWN
+        return self.rng.choice(ALLOWED_DIRECTIONS[edges])
+
+    # following a flow field: the chance to take a random turn when the direction timer is over
+    WANDER_CHANCE = 0.25
+
+    def __init__(self, tank: Tank, field: Field, rng=random, flow: FlowField = None, sight: SightLines = None):
         self.tank = tank
         self.field = field
+        self.rng = rng
 
-        self.fire_timer = ArmedTimer(delay=self.FIRE_TIMER)
-        self.dir_timer = ArmedTimer(delay=self.dir_delay())
-        self.spawn_timer = ArmedTimer(delay=self.SPAWNING_DELAY)
+        # None: random turns only
+        self.flow = flow
+        self._last_corner = None
+
+        # None: fire every FIRE_TIMER; else only when a target is on the line of fire
+        self.sight = sight
+
+        # deadlines instead of timers: an event happens at the first tick later than its deadline
+        t = tank.clock.now()
+        self.fire_at = t + self.FIRE_TIMER
+        self.dir_at = t + self.dir_delay()
+        self.spawn_at = t + self.SPAWNING_DELAY
 
     def _destroy(self):
         self.tank.to_destroy = True
@@ -45,36 +60,89 @@ class TankAI:
         else:
             self._destroy()
 
-    def update(self):
-        if self.tank.is_spawning:
-            if self.spawn_timer.tick():
-                if self.field.oc_map.test_rect(self.tank.bounding_rect, good_values=(None, self.tank)):
-                    self.tank.is_spawning = False
-                else:
-                    return
+    def update(self, t=None):
+        """
+        :param t: the time of the tick, the time of the clock of the tank by default;
+        the whole fraction is updated with the same one
+        """
+        if t is None:
+            t = self.tank.clock.now()
+        tank = self.tank
+
+        if tank.is_spawning:
+            if self.spawn_at < t and self.field.oc_map.test_rect(tank.bounding_rect, good_values=(None, tank)):
+                tank.is_spawning = False
             else:
                 return
 
-        if self.tank.hit:
-            if self.tank.tank_type == Tank.Type.ENEMY_HEAVY:
+        if tank.hit:
+            if tank.tank_type == Tank.Type.ENEMY_HEAVY:
                 self._degrade()
             else:
                 self._destroy()
-            self.tank.hit = False
+            tank.hit = False
+
+        if self.fire_at < t and (self.sight is None or self.sight.can_hit(*tank.gun_point, tank.direction)):
+            tank.fire()
+            self.fire_at = t + self.FIRE_TIMER
+
+        if self.flow is not None:
+            self._follow_flow(t)
+        elif self.dir_at < t:
+            tank.direction = self.pick_direction()
+            self.dir_at = t + self.dir_delay()
+
+        tank.move_tank(tank.direction)
+
+    def _follow_flow(self, t):
+        tank = self.tank
+        x, y = tank.position
+        corner = self.flow.corner_of(x, y)
+        cx, cy = self.field.map.coord_by_col_and_row(*corner)
+        at_new_corner = corner != self._last_corner and abs(x - cx) < tank.speed and abs(y - cy) < tank.speed
+        # the last move was undone
+        blocked = tank.position == tank.old_position
+
+        if self.dir_at < t:
+            self.dir_at = t + self.dir_delay()
+            if self.rng.uniform(0, 1) < self.WANDER_CHANCE:
+                tank.direction = self.pick_direction()
+                return
 
-        if self.fire_timer.tick():
-            self.tank.fire()
-            self.fire_timer.start()
+        if not (at_new_corner or blocked):
+            return
 
-        if self.dir_timer.tick():
-            self.tank.direction = self.pick_direction()
-            self.dir_timer.delay = self.dir_delay()
-            self.dir_timer.start()
+        self._last_corner = corner
+        options = self.flow.best_directions(corner)
+        if not options:
+            return
 
-        self.tank.move_tank(self.tank.direction)
+        if blocked and tank.direction in options:
+            # the way goes through bricks (or another tank): shoot it out
+            tank.fire()
+            return
+
+        direction = options[0] if len(options) == 1 else self.rng.choice(options)
+        if direction != tank.direction and (x, y) != (cx, cy):
+            # turn exactly at the corner, so the tank fits between the walls
+            w, h = tank.size
+            if not self.field.intersect_rect((cx - round(w / 2), cy - round(h / 2), w, h)):
+                tank.position = cx, cy
+        tank.direction = direction
 
     def reset(self):
-        self.tank.direction = Direction.random()
+        self.tank.direction = Direction.random(self.rng)
+
+
+def _allowed_directions(edges):
+    # a list in the declaration order (not a set) to keep seeded games reproducible
+    blocked = {Direction.LEFT: TankAI.EDGE_LEFT, Direction.UP: TankAI.EDGE_UP,
+               Direction.RIGHT: TankAI.EDGE_RIGHT, Direction.DOWN: TankAI.EDGE_DOWN}
+    return [d for d in Direction if not edges & blocked[d]]
+
+
+# the directions a tank may choose by the edges it is next to
+ALLOWED_DIRECTIONS = tuple(_allowed_directions(edges) for edges in range(16))
 
 
 class EnemyFractionAI:
@@ -82,41 +150,86 @@ class EnemyFractionAI:
 
     RESPAWN_TIMER = 5.0
 
-    def __init__(self, field: Field, tanks: GameObject):
+    ENEMY_QUEUE = (
+        Tank.Type.ENEMY_SIMPLE,
+        Tank.Type.ENEMY_FAST,
+        Tank.Type.ENEMY_MIDDLE,
+        Tank.Type.ENEMY_HEAVY,
+    )
+
+    MODE_RANDOM = 'random'
+    MODE_FLOW = 'flow'  # to the base or the player by the flow fields
+    MODES = (MODE_RANDOM, MODE_FLOW)
+
+    # these types hunt the player in the flow mode, the others go to the base
+    PLAYER_HUNTERS = (Tank.Type.ENEMY_FAST, Tank.Type.ENEMY_MIDDLE)
+
+    def __init__(self, field: Field, tanks: GameObject, clock: Clock, rng=random, mode=MODE_RANDOM, base=None,
+                 sight_fire=False):
+        """
+        :param clock: of the game, the new enemies get it
+        :param tanks: the layer of the tanks with the views 'enemies' and 'friends'
+        :param base: the object to attack
+        :param sight_fire: fire only when the player or the base (maybe behind bricks) is on the line of fire
+        """
         self.tanks = tanks
         self.field = field
+        self.clock = clock
+        self.rng = rng
+
+        assert mode in self.MODES, f'unknown AI mode {mode}'
+        self.mode = mode
+        self.flow_to_base = self.flow_to_player = None
+        if mode == self.MODE_FLOW:
+            # one field for all the enemies going to the same target
+            self.flow_to_base = FlowField(field)
+            self.flow_to_base.targets = [self.flow_to_base.corner_of(*base.center_point)]
+            self.flow_to_player = FlowField(field)
+
+        self.base = base
+        self.sight = SightLines(field) if sight_fire else None
         self.spawn_points = {
             (x, y): None for x, y in field.respawn_points(True)
         }
-        self.spawn_timer = ArmedTimer(self.RESPAWN_TIMER)
+        self.spawn_timer = ArmedTimer(clock, self.RESPAWN_TIMER)
 
-        self.enemy_queue = cycle([
-            Tank.Type.ENEMY_SIMPLE,
-            Tank.Type.ENEMY_FAST,
-            Tank.Type.ENEMY_MIDDLE,
-            Tank.Type.ENEMY_HEAVY,
-        ])
-        self._enemy_queue_iter = iter(self.enemy_queue)
+        # the types of the next enemies go round ENEMY_QUEUE, an index (not an iterator) is easy to save
+        self.enemy_queue_index = 0
 
         self.try_to_spawn_tank()
 
     @property
     def all_enemies(self):
-        return [t for t in self.tanks if t.fraction == Tank.ENEMY]
+        return self.tanks.view('enemies')
 
     def get_next_enemy(self, pos):
-        t_type = next(self._enemy_queue_iter)
-        new_tank = Tank(Tank.ENEMY, Tank.Color.PLAIN, t_type)
+        t_type = self.ENEMY_QUEUE[self.enemy_queue_index]
+        self.enemy_queue_index = (self.enemy_queue_index + 1) % len(self.ENEMY_QUEUE)
+        new_tank = Tank(self.clock, Tank.ENEMY, Tank.Color.PLAIN, t_type)
         new_tank.is_spawning = True
 
-        new_tank.ai = TankAI(new_tank, self.field)
+        new_tank.ai = TankAI(new_tank, self.field, self.rng, self._flow_for(t_type), self.sight)
 
-        if random.uniform(0, 1) > 0.35:
+        if self.rng.uniform(0, 1) > 0.35:
             new_tank.is_bonus = True
 
         new_tank.place(self.field.get_center_of_cell(*pos))
         return new_tank
 
+    def _flow_for(self, tank_type):
+        if self.mode != self.MODE_FLOW:
+            return None
+        return self.flow_to_player if tank_type in self.PLAYER_HUNTERS else self.flow_to_base
+
+    def _update_targets(self):
+        friends = self.tanks.view('friends')
+        if self.flow_to_player is not None and friends:
+            # the hunters go to the nearest of the players
+            self.flow_to_player.targets = [self.flow_to_player.corner_of(*t.position) for t in friends]
+        if self.sight is not None:
+            self.sight.targets = [t.bounding_rect for t in friends]
+            self.sight.targets_behind_bricks = [self.base.bounding_rect]
+
     def try_to_spawn_tank(self):
         free_locations = list()
         for loc, tank in self.spawn_points.items():
@@ -127,7 +240,7 @@ class EnemyFractionAI:
                 free_locations.append(loc)
 
         if free_locations and len(self.all_enemies) < self.MAX_ENEMIES:
-            pos = random.choice(free_locations)
+            pos = self.rng.choice(free_locations)
             tank = self.get_next_enemy(pos)
             self.spawn_points[pos] = tank
             self.tanks.add_child(tank)
@@ -141,8 +254,13 @@ class EnemyFractionAI:
             self.spawn_timer.start()
             self.try_to_spawn_tank()
 
+        self._update_targets()
+
+        # one pass over the enemies with the time of the tick taken once
+        t = self.clock.now()
         for enemy_tank in self.all_enemies:
-            self.update_one_tank(enemy_tank)
+            enemy_tank.to_destroy = False
+            enemy_tank.ai.update(t)
 
     def update_one_tank(self, t: Tank):
         t.to_destroy = False
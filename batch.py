@@ -0,0 +1,141 @@
+"""
+Batch runner: plays many independent headless games in a process pool and aggregates the results.
+
+    python3 batch.py --games 64 --ticks 3600 --levels 1 2 --player random
+"""
+import os
+
+# no window for the workers, must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import random
+import time
+from collections import Counter, namedtuple
+from multiprocessing import Pool
+
+from ai import EnemyFractionAI
+from game import Game
+from tank import Tank
+from util import FixedClock, Direction
+
+
+MatchSettings = namedtuple('MatchSettings', ('seed', 'level', 'ticks', 'max_enemies', 'player', 'ai',
+                                             'sight_fire'))
+
+
+class IdlePlayer:
+    """Stands still and never fires"""
+
+    def __call__(self, game: Game):
+        game.my_tank_move_to_direction = None
+
+
+class RandomPlayer:
+    """Drives the player's tank randomly, from its own seeded generator"""
+    TURN_EVERY = 30
+    FIRE_EVERY = 15
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def __call__(self, game: Game):
+        if game.ticks % self.TURN_EVERY == 0:
+            game.my_tank_move_to_direction = self.rng.choice([None, *Direction])
+        if game.ticks % self.FIRE_EVERY == 0:
+            game.fire()
+
+
+# name -> the player of a match, made from the seed of the match
+PLAYERS = {
+    'idle': lambda seed: IdlePlayer(),
+    'random': RandomPlayer,
+}
+
+
+def play_match(settings: MatchSettings):
+    game = Game(clock=FixedClock(), seed=settings.seed, level=settings.level, ai_mode=settings.ai,
+                sight_fire=settings.sight_fire)
+    if settings.max_enemies is not None:
+        game.ai.MAX_ENEMIES = settings.max_enemies
+    player = PLAYERS[settings.player](settings.seed)
+
+    while game.ticks < settings.ticks and not game.is_game_over:
+        player(game)
+        game.step()
+
+    return {
+        'seed': settings.seed,
+        'level': settings.level,
+        'score': game.score,
+        'survival_ticks': game.ticks,
+        'base_destroyed': game.is_game_over,
+        'kills': {t.name: game.kills[t] for t in Tank.Type if game.kills[t]},
+    }
+
+
+def aggregate(results):
+    kills = Counter()
+    for r in results:
+        kills.update(r['kills'])
+
+    n = len(results)
+    return {
+        'games': n,
+        'total_score': sum(r['score'] for r in results),
+        'mean_score': sum(r['score'] for r in results) / n if n else 0.0,
+        'mean_survival_ticks': sum(r['survival_ticks'] for r in results) / n if n else 0.0,
+        'bases_destroyed': sum(1 for r in results if r['base_destroyed']),
+        'kills': dict(kills),
+    }
+
+
+def run_batch(settings_list, processes=None):
+    with Pool(processes) as pool:
+        results = pool.map(play_match, settings_list, chunksize=1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run many headless games in parallel.')
+    parser.add_argument('--games', type=int, default=16)
+    parser.add_argument('--ticks', type=int, default=60 * 60, help='max ticks per game')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, next ones get +1')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1])
+    parser.add_argument('--max-enemies', type=int, default=None)
+    parser.add_argument('--player', choices=sorted(PLAYERS), default='random')
+    parser.add_argument('--ai', choices=EnemyFractionAI.MODES, default=EnemyFractionAI.MODE_RANDOM)
+    parser.add_argument('--sight-fire', action='store_true', help='enemies fire only at targets on the line of fire')
+    parser.add_argument('--processes', type=int, default=None, help='default: number of cores')
+    parser.add_argument('--output', help='write per game results and the summary as JSON to this file')
+    args = parser.parse_args()
+
+    settings_list = [
+        MatchSettings(seed=args.seed + i,
+                      level=args.levels[i % len(args.levels)],
+                      ticks=args.ticks,
+                      max_enemies=args.max_enemies,
+                      player=args.player,
+                      ai=args.ai,
+                      sight_fire=args.sight_fire)
+        for i in range(args.games)
+    ]
+
+    t0 = time.monotonic()
+    results = run_batch(settings_list, args.processes)
+    elapsed = time.monotonic() - t0
+
+    summary = aggregate(results)
+    summary['elapsed_sec'] = round(elapsed, 3)
+    summary['ticks_per_sec'] = round(sum(r['survival_ticks'] for r in results) / elapsed, 1)
+
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
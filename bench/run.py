@@ -0,0 +1,459 @@
+"""
+Benchmarks of the simulation and rendering hot paths, headless.
+
+    python3 bench/run.py --output bench.json
+    python3 bench/run.py --filter game.update --compare old_bench.json
+
+Every case reports the time of one call in microseconds (median, mean, min, stdev over the rounds).
+"""
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # data files are relative to the root of the project
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+pygame.init()
+SCREEN = pygame.display.set_mode((540, 480))
+
+import config
+import sprite_cache
+from bonus import Bonus, BonusType
+from config import ATLAS_FILE
+from explosion import Explosion
+from field import Field
+from flow_field import FlowField
+from game import Game
+from projectile import Projectile
+from spectate import SpectatorEncoder, SpectatorView
+from spritesheet import SpriteSheet
+from tank import Tank
+from util import FixedClock, Direction
+
+
+CASES = {}
+
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+# --- helpers ---
+
+def make_game(seed=1, **kwargs):
+    return Game(clock=FixedClock(), seed=seed, **kwargs)
+
+
+def populate_enemies(game: Game, n, rng):
+    """
+    Puts n mature enemies at random free places of the field (they may overlap when there are many)
+    """
+    game.ai.MAX_ENEMIES = n
+    for t in game.ai.all_enemies:
+        game.remove_tank(t)
+
+    field = game.field
+    probe = Tank(game.clock, Tank.ENEMY)
+    places = []
+    for c in range(1, field.width):
+        for r in range(1, field.height):
+            probe.place(field.get_center_of_cell(c, r))
+            if not field.intersect_rect(probe.bounding_rect):
+                places.append((c, r))
+    for _ in range(n):
+        tank = game.ai.get_next_enemy(rng.choice(places))
+        tank.is_spawning = False
+        tank.is_bonus = False
+        game.tanks.add_child(tank)
+
+
+def random_rects(n, rng, max_size=32):
+    return [(rng.randint(40, 456), rng.randint(40, 456), rng.randint(0, max_size), rng.randint(0, max_size))
+            for _ in range(n)]
+
+
+def cycle_through(items, func):
+    items = list(items)
+    n = len(items)
+    state = {'i': 0}
+
+    def op():
+        i = state['i']
+        func(items[i])
+        state['i'] = (i + 1) % n
+
+    return op
+
+
+# --- cases: maps and collisions ---
+
+@case('oc_map.fill_rect')
+def bench_fill_rect():
+    oc_map = Field().oc_map
+    return cycle_through(random_rects(1000, random.Random(1)), lambda r: oc_map.fill_rect(r, 1, only_if_empty=True))
+
+
+@case('oc_map.test_rect')
+def bench_test_rect():
+    oc_map = Field().oc_map
+    rng = random.Random(2)
+    for r in random_rects(40, rng):
+        oc_map.fill_rect(r, rng.choice((1, 2)))
+    return cycle_through(random_rects(1000, rng), lambda r: oc_map.test_rect(r, good_values=(None, 1)))
+
+
+@case('field.intersect_rect')
+def bench_intersect_rect():
+    field = Field()
+    field.load_from_file('data/level1.txt')
+    return cycle_through(random_rects(1000, random.Random(3)), field.intersect_rect)
+
+
+@case('field.check_hit')
+def bench_check_hit():
+    field = Field()
+    field.load_from_file('data/level1.txt')
+    rng = random.Random(4)
+    # a fresh field every round would dominate the time, so the projectiles are of the power that breaks nothing
+    projectiles = []
+    for _ in range(1000):
+        p = Projectile(rng.randint(40, 456), rng.randint(40, 456), Direction.random(rng))
+        p.power = 0
+        projectiles.append(p)
+    return cycle_through(projectiles, field.check_hit)
+
+
+# --- cases: simulation ---
+
+def bench_game_update(n_enemies, ai_mode='random', sight_fire=False):
+    def setup():
+        game = make_game(ai_mode=ai_mode, sight_fire=sight_fire)
+        populate_enemies(game, n_enemies, random.Random(5))
+        rng = random.Random(6)
+        directions = [None, *Direction]
+
+        def op():
+            if game.ticks % 30 == 0:
+                game.my_tank_move_to_direction = rng.choice(directions)
+            game.step()
+
+        return op
+    return setup
+
+
+for _n in (0, 5, 50, 200):
+    case(f'game.update[{_n}_enemies]')(bench_game_update(_n))
+case('game.update[50_enemies_flow]')(bench_game_update(50, 'flow'))
+case('game.update[50_enemies_sight_fire]')(bench_game_update(50, sight_fire=True))
+
+
+def bench_projectile_storm(ecs=False):
+    game = make_game(ecs=ecs)
+    populate_enemies(game, 10, random.Random(7))
+    rng = random.Random(8)
+
+    def op():
+        # 20 new projectiles every tick flying in all directions from all over the field
+        for _ in range(20):
+            game.spawn_projectile(rng.randint(40, 456), rng.randint(40, 456), Direction.random(rng),
+                                  sender=game.my_tank)
+        game.step()
+
+    return op
+
+
+case('game.update[projectile_storm]')(bench_projectile_storm)
+case('game.update[projectile_storm_ecs]')(lambda: bench_projectile_storm(ecs=True))
+
+
+@case('flow_field.compute')
+def bench_flow_field():
+    field = Field()
+    field.load_from_file('data/level1.txt')
+    flow = FlowField(field)
+    flow.targets = [(13, 25)]
+
+    def op():
+        flow._dirty = True
+        flow.distance((1, 1))
+
+    return op
+
+
+@case('game.snapshot[5_enemies]')
+def bench_snapshot():
+    game = make_game(players=2)
+    populate_enemies(game, 5, random.Random(9))
+    return game.snapshot
+
+
+@case('spectate.keyframe[5_enemies]')
+def bench_spectate_keyframe():
+    # what a new spectator costs the server, and the view to take it
+    game = make_game(players=2)
+    populate_enemies(game, 5, random.Random(12))
+    encoder = SpectatorEncoder(game)
+    encoder.delta()
+    view = SpectatorView()
+
+    def op():
+        view.apply(encoder.keyframe())
+
+    return op
+
+
+@case('rollback.resimulate_8[5_enemies]')
+def bench_rollback():
+    # what a late input costs a peer of a network game at most: back 8 steps and again to the present
+    game = make_game(players=2)
+    populate_enemies(game, 5, random.Random(10))
+    state = game.snapshot()
+    rng = random.Random(11)
+    directions = [None, *Direction]
+
+    def op():
+        game.restore(state)
+        for _ in range(8):
+            game.player_directions[:] = rng.choice(directions), rng.choice(directions)
+            game.step()
+
+    return op
+
+
+# --- cases: rendering ---
+
+@case('field.render')
+def bench_field_render():
+    field = Field()
+    field.load_from_file('data/level1.txt')
+    return lambda: field.render(SCREEN)
+
+
+@case('scene.visit[50_enemies]')
+def bench_scene_visit():
+    game = make_game()
+    populate_enemies(game, 50, random.Random(9))
+    game.step()
+    return lambda: game.scene.visit(SCREEN)
+
+
+@case('game.render[50_enemies]')
+def bench_game_render():
+    game = make_game()
+    populate_enemies(game, 50, random.Random(10))
+
+    def op():
+        game.step()
+        game.render(SCREEN)
+
+    return op
+
+
+# --- cases: sprites ---
+
+@case('spritesheet.image_at[cold]')
+def bench_image_at_cold():
+    locations = [Tank.get_sprite_location(c, t, d, s)
+                 for c in Tank.Color for t in Tank.Type for d in Direction for s in Tank.POSSIBLE_MOVE_STATES]
+
+    def op():
+        # a new sheet has an empty cache
+        atlas = SpriteSheet(ATLAS_FILE, upsample=2, sprite_size=8)
+        for location in locations:
+            atlas.image_at(*location, auto_crop=True, square=False)
+
+    return op
+
+
+@case('spritesheet.find_crop_rect')
+def bench_find_crop_rect():
+    atlas = SpriteSheet(ATLAS_FILE, upsample=2, sprite_size=8)
+    images = [atlas.image_at(*Tank.get_sprite_location(c, t, d, 0))
+              for c in Tank.Color for t in Tank.Type for d in Direction]
+    return cycle_through(images, SpriteSheet.find_crop_rect)
+
+
+# --- cases: startup ---
+
+def bench_startup(with_cache):
+    def setup():
+        cache_file = None
+        if with_cache:
+            # built here, so the case does not depend on the state of data/
+            sheet = SpriteSheet(ATLAS_FILE, upsample=config.ATLAS_UPSAMPLE, sprite_size=config.ATLAS_SPRITE_SIZE)
+            config._altas = sheet
+            sprite_cache.make_all_sprites()
+            cache_file = os.path.join(tempfile.mkdtemp(), 'atlas.cache')
+            sprite_cache.save(sheet, cache_file)
+
+        def op():
+            # a new atlas and a new game: everything from loading the sprites to the first enemy spawn
+            config._altas = SpriteSheet(ATLAS_FILE, upsample=config.ATLAS_UPSAMPLE,
+                                        sprite_size=config.ATLAS_SPRITE_SIZE, cache_file=cache_file)
+            make_game()
+
+        return op
+    return setup
+
+
+case('startup[no_cache]')(bench_startup(False))
+case('startup[sprite_cache]')(bench_startup(True))
+
+
+# --- memory ---
+
+def bytes_per_instance(make, n=1000):
+    items = []
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(n):
+        items.append(make())
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return round(size / n, 1)
+
+
+def count_instances(cls):
+    """
+    Counts the calls of cls.__init__, the objects made instead of taken from a pool
+    """
+    state = {'n': 0}
+    init = cls.__init__
+
+    def counting_init(self, *args, **kwargs):
+        state['n'] += 1
+        init(self, *args, **kwargs)
+
+    cls.__init__ = counting_init
+    return state, lambda: setattr(cls, '__init__', init)
+
+
+def memory_report(ticks=1000):
+    clock = FixedClock()
+    report = {
+        'bytes_per_instance': {
+            'Projectile': bytes_per_instance(lambda: Projectile(100, 100, Direction.UP)),
+            'Explosion': bytes_per_instance(lambda: Explosion(clock, 100, 100)),
+            'Bonus': bytes_per_instance(lambda: Bonus(BonusType.UPGRADE, 100, 100)),
+        }
+    }
+
+    # the storm makes 20 projectiles a tick and plenty of explosions
+    op = bench_projectile_storm()
+    made, restores = {}, []
+    for cls in (Projectile, Explosion):
+        made[cls.__name__], restore = count_instances(cls)
+        restores.append(restore)
+    try:
+        for _ in range(ticks):
+            op()
+    finally:
+        for restore in restores:
+            restore()
+    report[f'new_instances_per_{ticks}_storm_ticks'] = {name: state['n'] for name, state in made.items()}
+    return report
+
+
+# --- runner ---
+
+def measure(op, min_time, rounds):
+    # calibrate the number of calls in a round to take about min_time / rounds
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / rounds or number >= 1 << 20:
+            break
+        number *= 2
+
+    results = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            op()
+        results.append((time.perf_counter() - t0) / number * 1e6)
+
+    return {
+        'calls_per_round': number,
+        'rounds': rounds,
+        'median_us': round(statistics.median(results), 3),
+        'mean_us': round(statistics.mean(results), 3),
+        'min_us': round(min(results), 3),
+        'stdev_us': round(statistics.stdev(results), 3) if rounds > 1 else 0.0,
+    }
+
+
+def compare(results, baseline):
+    print(f'{"case":<32} {"baseline":>12} {"now":>12} {"change":>8}')
+    for name, r in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        a, b = old['median_us'], r['median_us']
+        change = (b - a) / a * 100.0 if a else 0.0
+        print(f'{name:<32} {a:>12.2f} {b:>12.2f} {change:>+7.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks of the hot paths, headless.')
+    parser.add_argument('--filter', default='', help='run only the cases containing this substring')
+    parser.add_argument('--min-time', type=float, default=1.0, help='seconds per case')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--output', help='save the results as JSON')
+    parser.add_argument('--compare', help='JSON of a previous run to compare with')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    parser.add_argument('--memory', action='store_true', help='also report the memory of the entities')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(CASES))
+        return
+
+    results = {}
+    for name, setup in CASES.items():
+        if args.filter not in name:
+            continue
+        op = setup()
+        results[name] = measure(op, args.min_time, args.rounds)
+        print(f'{name:<32} {results[name]["median_us"]:>12.2f} us', file=sys.stderr)
+
+    report = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    if args.memory:
+        report['memory'] = memory_report()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
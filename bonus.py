@@ -4,7 +4,7 @@ from enum import Enum
 from pygame import Surface
 
 from config import ATLAS
-from util import GameObject
+from util import Entity
 
 
 class BonusType(Enum):
@@ -18,11 +18,13 @@ class BonusType(Enum):
     GUN = (44, 14)
 
     @classmethod
-    def random(cls):
-        return random.choice(list(cls))
+    def random(cls, rng=random):
+        return rng.choice(list(cls))
 
 
-class Bonus(GameObject):
+class Bonus(Entity):
+    __slots__ = ('type', 'sprite')
+
     def __init__(self, bonus_type: BonusType, x, y):
         super().__init__()
         self.type = bonus_type
@@ -33,5 +35,9 @@ class Bonus(GameObject):
 
         self.size = (sz * 2, sz * 2)
 
+    @property
+    def screen_rects(self):
+        return (*self.position, self.sprite.get_width(), self.sprite.get_height()),
+
     def render(self, screen: Surface):
         screen.blit(self.sprite, self.position)
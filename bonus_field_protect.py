@@ -1,5 +1,5 @@
 from field import Field, CellType
-from util import Animator, Timer
+from util import Animator, Timer, Clock
 
 
 class FieldProtector:
@@ -7,11 +7,11 @@ class FieldProtector:
     NOT_PROTECTED = 'not_protected'
     BLINKING = 'blinking'
 
-    def __init__(self, field: Field):
+    def __init__(self, field: Field, clock: Clock):
         self.field = field
-        self._blink_animator = Animator(delay=1, max_states=2)
-        self._protected_timer = Timer(delay=15)
-        self._blink_timer = Timer(delay=6)
+        self._blink_animator = Animator(clock, delay=1, max_states=2)
+        self._protected_timer = Timer(clock, delay=15)
+        self._blink_timer = Timer(clock, delay=6)
         self._state = self.NOT_PROTECTED
 
     def update(self):
@@ -1,6 +1,7 @@
 from spritesheet import SpriteSheet
 import sys
 
+# debug output, the options of the game itself are parsed by main.py
 FIELD_DEBUG = '--field-debug' in sys.argv
 DEBUG = '--debug' in sys.argv
 PROJECTILE_DEBUG = '--projectile-debug' in sys.argv
@@ -11,13 +12,18 @@ GAME_HEIGHT = 480
 FIELD_HEIGHT = FIELD_WIDTH = 13 * 2  # 13 full blocks by (2x2) cells each
 
 ATLAS_FILE = 'data/atlas.png'
+ATLAS_SPRITE_SIZE = 8
+ATLAS_UPSAMPLE = 2
+SPRITE_CACHE_FILE = 'data/atlas.cache'  # built by sprite_cache.py
+LEVEL_FILE = 'data/level{}.txt'
 
 _altas = None
 
 def get_atlas() -> SpriteSheet:
     global _altas
     if _altas is None:
-        _altas = SpriteSheet(ATLAS_FILE, upsample=2, sprite_size=8)
+        _altas = SpriteSheet(ATLAS_FILE, upsample=ATLAS_UPSAMPLE, sprite_size=ATLAS_SPRITE_SIZE,
+                             cache_file=SPRITE_CACHE_FILE)
     return _altas
 
 ATLAS = get_atlas
@@ -0,0 +1,37 @@
+"""
+Input of the player in one simulation step as a bitmask: what is recorded in replays and sent over the network
+"""
+from util import Direction
+
+UP = 1
+LEFT = 2
+DOWN = 4
+RIGHT = 8
+FIRE = 16
+
+ALL = UP | LEFT | DOWN | RIGHT | FIRE
+
+_BIT_OF_DIRECTION = {
+    Direction.UP: UP,
+    Direction.LEFT: LEFT,
+    Direction.DOWN: DOWN,
+    Direction.RIGHT: RIGHT,
+}
+
+# the first direction bit set wins, in this order
+_DIRECTION_OF_BIT = ((UP, Direction.UP), (DOWN, Direction.DOWN), (LEFT, Direction.LEFT), (RIGHT, Direction.RIGHT))
+
+
+def bits_of(direction: Direction = None, fire=False):
+    bits = 0 if direction is None else _BIT_OF_DIRECTION[direction]
+    return bits | FIRE if fire else bits
+
+
+def direction_of(bits):
+    """
+    :return: the direction to move or None to stay
+    """
+    for bit, direction in _DIRECTION_OF_BIT:
+        if bits & bit:
+            return direction
+    return None
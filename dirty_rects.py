@@ -0,0 +1,57 @@
+import pygame
+from util import GameObject
+
+
+class DirtyRectTracker:
+    """
+    Finds the parts of the screen changed since the previous frame:
+    the old and the new screen rects of every object that has moved, changed its look, appeared or disappeared
+    """
+
+    # above this share of the screen a full flip is cheaper than the list of rects
+    MAX_DIRTY_SHARE = 0.5
+
+    def __init__(self, screen_size):
+        w, h = screen_size
+        self.screen_area = w * h
+        self._last_frame = {}  # obj -> (screen_rects, render_state)
+        self.full_update = True
+
+    def invalidate(self):
+        self.full_update = True
+
+    def _walk(self, obj: GameObject, frame, dirty):
+        rects = obj.screen_rects
+        if rects:
+            state = rects, obj.render_state
+            last_state = self._last_frame.get(obj)
+            if last_state != state:
+                dirty.extend(rects)
+                if last_state is not None:
+                    dirty.extend(last_state[0])
+            frame[obj] = state
+        dirty.extend(obj.take_dirty_rects())
+
+        for child in obj:
+            self._walk(child, frame, dirty)
+
+    def collect(self, scene: GameObject, extra_rects=()):
+        """
+        Call it after the scene is rendered
+        :return: list of pygame.Rect to update or None if the whole screen must be flipped
+        """
+        frame, dirty = {}, list(extra_rects)
+        self._walk(scene, frame, dirty)
+        for obj, (rects, _) in self._last_frame.items():
+            if obj not in frame:
+                dirty.extend(rects)
+        self._last_frame = frame
+
+        if self.full_update:
+            self.full_update = False
+            return None
+
+        dirty = [pygame.Rect(r) for r in dirty]
+        if sum(r.w * r.h for r in dirty) > self.screen_area * self.MAX_DIRTY_SHARE:
+            return None
+        return dirty
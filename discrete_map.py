@@ -12,11 +12,20 @@ class DiscreteMap:
         self.default_value = default_value
         self.step = cell_size
         self._cells = []
+        self._listeners = []
         self.clear()
 
+    def add_listener(self, listener):
+        """
+        The listener is called as listener(col, row, old_value, new_value) every time set_cell_col_row changes a cell
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
     def clear(self):
-        dv = self.default_value
-        self._cells = [[dv] * self.height for _ in range(self.width)]
+        self._cells = [self.default_value] * (self.width * self.height)
 
     def coord_by_col_and_row(self, col, row):
         xs, ys = self.position
@@ -33,10 +42,11 @@ class DiscreteMap:
     def inside_col_row(self, col, row):
         return 0 <= col < self.width and 0 <= row < self.height
 
-    # addressing: self.cells[x or column][y or row]
+    # addressing: flat list, column by column: self._cells[col * height + row]
+    # so a vertical run of cells of one column is a single slice
     def get_cell_by_col_row(self, col, row):
-        if self.inside_col_row(col, row):
-            return self._cells[col][row]
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return self._cells[col * self.height + row]
         else:
             return None
 
@@ -45,11 +55,28 @@ class DiscreteMap:
 
     def set_cell_col_row(self, col, row, cell):
         if self.inside_col_row(col, row):
-            self._cells[col][row] = cell
+            index = col * self.height + row
+            old_cell = self._cells[index]
+            self._cells[index] = cell
+            if old_cell != cell:
+                for listener in self._listeners:
+                    listener(col, row, old_cell, cell)
 
     def set_cell_by_coord(self, x, y, cell):
         self.set_cell_col_row(*self.col_row_from_coords(x, y), cell)
 
+    def column_slices(self, min_c, max_c, min_r, max_r):
+        """
+        Clips the cell range (inclusive) to the map
+        :return: list of (start, stop) slice bounds of self._cells, one per column
+        """
+        min_c, max_c = max(min_c, 0), min(max_c, self.width - 1)
+        min_r, max_r = max(min_r, 0), min(max_r, self.height - 1)
+        if min_r > max_r:
+            return []
+        h = self.height
+        return [(col * h + min_r, col * h + max_r + 1) for col in range(min_c, max_c + 1)]
+
     def render(self, screen):
         step = self.step
         for col in range(self.width):
@@ -62,7 +89,145 @@ class DiscreteMap:
 
 
 class OccupancyMap(DiscreteMap):
-    def find_col_row_of_rect(self, r):
+    """
+    Besides plain fill_rect, objects can be tracked by handle (place/remove/place_group):
+    the map remembers the footprint of every placed object
+    and only rewrites its cells when the footprint changes
+    """
+
+    def clear(self):
+        super().clear()
+        self._footprints = {}
+        # objects that miss some cells of their footprint to other objects;
+        # a dict, not a set: the order they get the cells back in must not depend on the addresses of the objects
+        self._shadowed = {}
+        # object -> its priority, of the objects of the last place_group
+        self._group = {}
+
+    def place(self, obj, rect, only_if_empty=False):
+        """
+        Moves the footprint of obj to the rect
+        :param only_if_empty: do not take the cells of other objects
+        """
+        new_range = self.range_of_rect(rect)
+        old_range = self._footprints.get(obj)
+        if old_range == new_range:
+            return
+        if old_range is not None:
+            self._vacate(obj, old_range)
+        self._footprints[obj] = new_range
+        self._occupy(obj, new_range, only_if_empty)
+
+    def remove(self, obj):
+        self._group.pop(obj, None)
+        old_range = self._footprints.pop(obj, None)
+        if old_range is not None:
+            self._vacate(obj, old_range)
+
+    def place_group(self, placements):
+        """
+        Places the footprints of a group of objects (the mature tanks) as if the map was cleared of them
+        and they were filled in one by one with only_if_empty: a cell covered by several of them goes to the first one,
+        and a cell of an object placed on its own (the base) is never taken.
+        The objects of the previous group missing from this one are removed.
+        Only the footprints that changed and the objects they take cells from are rewritten
+        :param placements: (obj, rect) pairs in the order of priority
+        """
+        placements = [(obj, self.range_of_rect(rect)) for obj, rect in placements]
+        group = {obj: rank for rank, (obj, _) in enumerate(placements)}
+        footprints = self._footprints
+        for obj in self._group:
+            if obj not in group:
+                self._release(obj, footprints.pop(obj))
+
+        changed = set()
+        for obj, new_range in placements:
+            old_range = footprints.get(obj)
+            if old_range != new_range:
+                if old_range is not None:
+                    self._release(obj, old_range)
+                footprints[obj] = new_range
+                changed.add(obj)
+        self._group = group
+
+        # in the order of priority: an object shadowed on the way is always behind the one that takes its cells
+        for obj, new_range in placements:
+            if obj in changed or obj in self._shadowed:
+                self._claim(obj, new_range, group)
+
+    def _occupy(self, obj, cell_range, only_if_empty):
+        cells = self._cells
+        contested = False
+        for start, stop in self.column_slices(*cell_range):
+            segment = cells[start:stop]
+            others = [c for c in dict.fromkeys(segment) if c is not None and c is not obj]
+            if others:
+                contested = True
+                if not only_if_empty:
+                    self._shadowed.update(dict.fromkeys(others))
+            if only_if_empty:
+                cells[start:stop] = [obj if c is None else c for c in segment]
+            else:
+                cells[start:stop] = [obj] * (stop - start)
+
+        if contested and only_if_empty:
+            self._shadowed[obj] = None
+        else:
+            self._shadowed.pop(obj, None)
+
+    def _claim(self, obj, cell_range, group):
+        """
+        Takes the free cells of the range and the ones of the objects of the group behind obj
+        """
+        cells = self._cells
+        rank = group[obj]
+        lacking = False
+        for start, stop in self.column_slices(*cell_range):
+            segment = cells[start:stop]
+            others = [c for c in dict.fromkeys(segment) if c is not None and c is not obj]
+            if not others:
+                cells[start:stop] = [obj] * (stop - start)
+                continue
+            behind = [c for c in others if group.get(c, -1) > rank]
+            self._shadowed.update(dict.fromkeys(behind))
+            lacking = lacking or len(behind) < len(others)
+            cells[start:stop] = [obj if c is None or c in behind else c for c in segment]
+
+        if lacking:
+            self._shadowed[obj] = None
+        else:
+            self._shadowed.pop(obj, None)
+
+    def _release(self, obj, cell_range):
+        """
+        Frees the cells of obj in the range without giving them to anybody
+        """
+        cells = self._cells
+        for start, stop in self.column_slices(*cell_range):
+            cells[start:stop] = [None if c is obj else c for c in cells[start:stop]]
+        self._shadowed.pop(obj, None)
+
+    def _vacate(self, obj, cell_range):
+        cells = self._cells
+        for start, stop in self.column_slices(*cell_range):
+            cells[start:stop] = [None if c is obj else c for c in cells[start:stop]]
+
+        self._shadowed.pop(obj, None)
+
+        # give the freed cells back to the overlapped objects, if any
+        min_c, max_c, min_r, max_r = cell_range
+        for other in list(self._shadowed):
+            if other not in self._footprints:
+                self._shadowed.pop(other, None)
+                continue
+            o_min_c, o_max_c, o_min_r, o_max_r = self._footprints[other]
+            overlap = (max(min_c, o_min_c), min(max_c, o_max_c),
+                       max(min_r, o_min_r), min(max_r, o_max_r))
+            if overlap[0] <= overlap[1] and overlap[2] <= overlap[3]:
+                self._occupy(other, overlap, only_if_empty=True)
+                self._shadowed[other] = None  # it still may lack cells outside of the overlap
+
+    def range_of_rect(self, r):
         x, y, w, h = r
         assert w >= 0 and h >= 0
 
@@ -72,19 +237,32 @@ class OccupancyMap(DiscreteMap):
         max_c = max(c1, c2, 0)
         min_r = min(r1, r2, self.height - 1)
         max_r = max(r1, r2, 0)
+        return min_c, max_c, min_r, max_r
 
+    def find_col_row_of_rect(self, r):
+        min_c, max_c, min_r, max_r = self.range_of_rect(r)
         for col in range(min_c, max_c + 1):
             for row in range(min_r, max_r + 1):
                 yield col, row
 
     def fill_rect(self, rect, v=1, only_if_empty=False):
-        for col, row in self.find_col_row_of_rect(rect):
-            if not only_if_empty or self.get_cell_by_col_row(col, row) is None:
-                self.set_cell_col_row(col, row, v)
+        cells = self._cells
+        for start, stop in self.column_slices(*self.range_of_rect(rect)):
+            if only_if_empty:
+                cells[start:stop] = [v if c is None else c for c in cells[start:stop]]
+            else:
+                cells[start:stop] = [v] * (stop - start)
 
     def test_rect(self, rect, good_values=(0, 1)):
-        cells_to_test = self.find_col_row_of_rect(rect)
-        return self.test_cells(cells_to_test, good_values)
+        min_c, max_c, min_r, max_r = self.range_of_rect(rect)
+        # cells outside of the map read as None
+        if None not in good_values and (min_c < 0 or min_r < 0 or
+                                        max_c >= self.width or max_r >= self.height):
+            return False
+        cells = self._cells
+        return all(c in good_values
+                   for start, stop in self.column_slices(min_c, max_c, min_r, max_r)
+                   for c in set(cells[start:stop]))
 
     def test_cells(self, cols_rows, good_values=(0,)):
         return all(self.get_cell_by_col_row(c, r) in good_values for c, r in cols_rows)
@@ -0,0 +1,70 @@
+"""
+Column storage of components: every component is a list, an entity is a row index into all of them.
+Systems process all the rows of a store in one loop instead of calling a method of every object.
+"""
+
+
+class ColumnStore:
+    """
+    Parallel lists, one per component. Rows of killed entities are reused by the next spawns
+
+        store = ColumnStore('x', 'y')
+        row = store.spawn(owner, x=1, y=2)
+        store.x[row] += 1
+    """
+
+    def __init__(self, *components):
+        self.components = components
+        for name in components:
+            setattr(self, name, [])
+        self.owners = []  # row -> the facade object of the entity, None for a free row
+        self.alive = {}  # rows in use, in the order of spawning
+        self._free = []
+
+    def __len__(self):
+        return len(self.alive)
+
+    def spawn(self, owner, **values):
+        """
+        :return: the row of the new entity, all its components must be given
+        """
+        if self._free:
+            row = self._free.pop()
+            self.owners[row] = owner
+            for name in self.components:
+                getattr(self, name)[row] = values[name]
+        else:
+            row = len(self.owners)
+            self.owners.append(owner)
+            for name in self.components:
+                getattr(self, name).append(values[name])
+        self.alive[row] = None
+        return row
+
+    def kill(self, row):
+        del self.alive[row]
+        self.owners[row] = None
+        self._free.append(row)
+
+    def clear(self):
+        for name in self.components:
+            getattr(self, name).clear()
+        self.owners.clear()
+        self.alive.clear()
+        self._free.clear()
+
+
+# --- systems ---
+
+MOTION_COMPONENTS = ('x', 'y', 'prev_x', 'prev_y', 'vx', 'vy')
+
+
+def movement_system(store: ColumnStore):
+    """
+    Moves every entity by its velocity and remembers where it was (components of MOTION_COMPONENTS)
+    """
+    xs, ys, prev_xs, prev_ys, vxs, vys = store.x, store.y, store.prev_x, store.prev_y, store.vx, store.vy
+    for row in store.alive:
+        x, y = xs[row], ys[row]
+        prev_xs[row], prev_ys[row] = x, y
+        xs[row], ys[row] = x + vxs[row], y + vys[row]
@@ -1,8 +1,11 @@
 from config import *
 from util import *
+from functools import lru_cache
 
 
-class Explosion(GameObject):
+class Explosion(Entity):
+    __slots__ = ('animator', 'sprites')
+
     SPRITE_DESCRIPTORS = (
         (32, 16, 2, 2),
         (34, 16, 2, 2),
@@ -21,27 +24,64 @@ class Explosion(GameObject):
         TYPE_SUPER_SHORT: 2
     }
 
-    def __init__(self, x, y, type=TYPE_FULL):
+    FRAME_DELAY = 0.08
+
+    pool = Pool()
+
+    def __init__(self, clock: Clock, x, y, type=TYPE_FULL):
         super().__init__()
 
         self.position = x, y
         n = self._n_states[type]
-        self.animator = Animator(0.08, n, once=True)
-        self.sprites = [ATLAS().image_at(x, y, sx, sy) for
-                        x, y, sx, sy in self.SPRITE_DESCRIPTORS]
+        self.animator = Animator(clock, self.FRAME_DELAY, n, once=True)
+        self.sprites = self.sprite_list(ATLAS())
 
-    def render(self, screen):
-        state = self.animator()
+    @classmethod
+    def acquire(cls, clock: Clock, x, y, type=TYPE_FULL):
+        """
+        An explosion from the pool (or a new one), it goes back to the pool by itself when it is over
+        """
+        e = cls.pool.take()
+        if e is None:
+            return cls(clock, x, y, type)
+        e.position = x, y
+        e.animator.__init__(clock, cls.FRAME_DELAY, cls._n_states[type], once=True)
+        return e
 
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def sprite_list(atlas):
+        return tuple(atlas.image_at(x, y, sx, sy) for x, y, sx, sy in Explosion.SPRITE_DESCRIPTORS)
+
+    def update(self):
+        self.animator()
         if self.animator.done:
             self.remove_from_parent()
-        else:
-            _, _, w, h = self.SPRITE_DESCRIPTORS[state]
-            half_sprite_size = ATLAS().real_sprite_size // 2
-            w_pix = w * half_sprite_size
-            h_pix = h * half_sprite_size
-            x, y = self.position
-            x -= w_pix
-            y -= h_pix
-            sprite = self.sprites[state]
-            screen.blit(sprite, (x, y))
+            self.pool.give_back(self)
+
+    def _sprite_rect(self, state):
+        _, _, w, h = self.SPRITE_DESCRIPTORS[state]
+        half_sprite_size = ATLAS().real_sprite_size // 2
+        w_pix = w * half_sprite_size
+        h_pix = h * half_sprite_size
+        x, y = self.position
+        return x - w_pix, y - h_pix, w_pix * 2, h_pix * 2
+
+    @property
+    def screen_rects(self):
+        if self.animator.done:
+            return ()
+        return self._sprite_rect(self.animator.state),
+
+    @property
+    def render_state(self):
+        return self.animator.state
+
+    def render(self, screen):
+        if self.animator.done:
+            return
+
+        state = self.animator.state
+        x, y, _, _ = self._sprite_rect(state)
+        sprite = self.sprites[state]
+        screen.blit(sprite, (x, y))
@@ -33,40 +33,25 @@ class CellType(Enum):
 
     @property
     def is_draw_over(self):
-        return self == self.GREEN
+        return self is self.GREEN
+
+    # the properties below are looked up in the tables defined after the class
 
     @property
     def can_tank_run_here(self):
-        return self in (
-            self.FREE,
-            self.SKATE,
-            self.GREEN
-        )
+        return self in TANK_CAN_RUN_CELLS
 
     @property
     def solid(self):
-        return self in (
-            self.BRICK,
-            self.BRICK_TOP,
-            self.BRICK_LEFT,
-            self.BRICK_BOTTOM,
-            self.BRICK_RIGHT,
-            self.CONCRETE
-        )
+        return self in SOLID_CELLS
 
     @property
     def brick(self):
-        return self in (
-            self.BRICK,
-            self.BRICK_TOP,
-            self.BRICK_BOTTOM,
-            self.BRICK_LEFT,
-            self.BRICK_RIGHT
-        )
+        return self in BRICK_CELLS
 
     @property
     def is_half_brick(self):
-        return self.brick and self != self.BRICK
+        return self in HALF_BRICK_CELLS
 
     @classmethod
     def from_symbol(cls, s):
@@ -96,6 +81,25 @@ class CellType(Enum):
             return x, y, step, step
 
 
+BRICK_CELLS = frozenset((
+    CellType.BRICK,
+    CellType.BRICK_TOP,
+    CellType.BRICK_BOTTOM,
+    CellType.BRICK_LEFT,
+    CellType.BRICK_RIGHT
+))
+
+HALF_BRICK_CELLS = BRICK_CELLS - {CellType.BRICK}
+
+SOLID_CELLS = BRICK_CELLS | {CellType.CONCRETE}
+
+TANK_CAN_RUN_CELLS = frozenset((
+    CellType.FREE,
+    CellType.SKATE,
+    CellType.GREEN
+))
+
+
 class Field(GameObject):
     BACKGROUND_COLOR = (0, 0, 0)
 
@@ -104,6 +108,7 @@ class Field(GameObject):
         GameObject.position.fset(self, p)
         self.map.position = p
         self.oc_map.position = p
+        self.projectile_map.position = p
 
     def __init__(self, cells_width=FIELD_WIDTH, cells_height=FIELD_HEIGHT):
         super().__init__()
@@ -114,7 +119,10 @@ class Field(GameObject):
         self._step = ATLAS().real_sprite_size
 
         self.map = DiscreteMap(self.position, self._step, cells_width, cells_height)
+        # tanks and the base
         self.oc_map = OccupancyMap(self.position, self._step // 2, cells_width * 2, cells_height * 2)
+        # projectiles are tracked apart, so they never block tanks
+        self.projectile_map = OccupancyMap(self.position, self._step // 2, cells_width * 2, cells_height * 2)
 
         self.position = (40, 40)
         self.size = (self._step * self.width, self._step * self.height)
@@ -123,6 +131,51 @@ class Field(GameObject):
             t: ATLAS().image_at(*t.sprite_location, 1, 1, colorkey=None) for t in CellType
         }
 
+        # pre-rendered terrain: the ground layer is drawn under everything, the overlay (green) above the tanks
+        self._ground_layer = None
+        self._overlay_layer = None
+        self._dirty_cells = set()
+        self._changed_screen_rects = []
+        self.map.add_listener(self._on_cell_changed)
+
+        self.overlay = FieldOverlay(self)
+
+    def _on_cell_changed(self, col, row, old_cell, new_cell):
+        self._dirty_cells.add((col, row))
+
+    def _draw_cell(self, col, row):
+        cell = self.map.get_cell_by_col_row(col, row)
+        dest = col * self._step, row * self._step
+        rect = (*dest, self._step, self._step)
+
+        self._ground_layer.fill(self.BACKGROUND_COLOR, rect)
+        self._overlay_layer.fill(FieldOverlay.TRANSPARENT_COLOR, rect)
+
+        if cell is not None and cell != cell.FREE:
+            layer = self._overlay_layer if cell.is_draw_over else self._ground_layer
+            layer.blit(self._sprites[cell], dest)
+
+    def _update_layers(self):
+        if self._ground_layer is None:
+            self._ground_layer = pygame.Surface(self.size)
+            self._overlay_layer = pygame.Surface(self.size)
+            self._overlay_layer.set_colorkey(FieldOverlay.TRANSPARENT_COLOR)
+            self._dirty_cells = {(col, row) for col in range(self.width) for row in range(self.height)}
+
+        x0, y0 = self.position
+        for col, row in self._dirty_cells:
+            self._draw_cell(col, row)
+            self._changed_screen_rects.append((x0 + col * self._step, y0 + row * self._step, self._step, self._step))
+        self._dirty_cells.clear()
+
+    @property
+    def screen_rects(self):
+        return tuple(self.rect),
+
+    def take_dirty_rects(self):
+        rects, self._changed_screen_rects = self._changed_screen_rects, []
+        return rects
+
     def load_from_file(self, filename):
         with open(filename, 'r') as f:
             lines = f.readlines()
@@ -142,49 +195,31 @@ class Field(GameObject):
         return [*self.position, self._step * self.width, self._step * self.height]
 
     def render(self, screen):
-        pygame.draw.rect(screen, self.BACKGROUND_COLOR, self.rect)
-
-        for col in range(self.width):
-            for row in range(self.height):
-                cell = self.map.get_cell_by_col_row(col, row)
-                if cell != cell.FREE:
-                    coords = self.map.coord_by_col_and_row(col, row)
-                    screen.blit(self._sprites[cell], coords)
+        self._update_layers()
+        screen.blit(self._ground_layer, self.position)
 
         if FIELD_DEBUG:
             self.oc_map.render(screen)
 
     def intersect_rect(self, test_rect):
         x1, y1, w, h = test_rect
-        x2 = x1 + w
-        y2 = y1 + h
-
-        check_pts = (
-            (x1, y1),
-            (x2, y1),
-            (x1, y2),
-            (x2, y2)
-        )
-
-        rmax = cmax = -1
-        rmin, cmin = self.height, self.width
-
-        for x, y in check_pts:
-            col, row = self.map.col_row_from_coords(x, y)
-            rmax = max(rmax, row)
-            rmin = min(rmin, row)
-            cmax = max(cmax, col)
-            cmin = min(cmin, col)
-
-        for c in range(cmin, cmax + 1):
-            for r in range(rmin, rmax + 1):
-                if not self.map.inside_col_row(c, r):
-                    return True
-
-                cell = self.map.get_cell_by_col_row(c, r)
-
-                if not cell.can_tank_run_here:
-                    x, y = self.map.coord_by_col_and_row(c, r)
+        cmin, rmin = self.map.col_row_from_coords(x1, y1)
+        cmax, rmax = self.map.col_row_from_coords(x1 + w, y1 + h)
+
+        if cmin < 0 or rmin < 0 or cmax >= self.width or rmax >= self.height:
+            return True
+
+        cells = self.map._cells
+        for start, stop in self.map.column_slices(cmin, cmax, rmin, rmax):
+            if TANK_CAN_RUN_CELLS.issuperset(cells[start:stop]):
+                continue
+
+            # slow path only for the columns with obstacles
+            col = start // self.height
+            for row in range(rmin, rmax + 1):
+                cell = cells[start + row - rmin]
+                if cell not in TANK_CAN_RUN_CELLS:
+                    x, y = self.map.coord_by_col_and_row(col, row)
                     abs_cell_rect = cell.calculate_rect(x, y, self._step)
                     if rect_intersection(test_rect, abs_cell_rect):
                         return True
@@ -252,3 +287,24 @@ class Field(GameObject):
         lx, ly = self.map.coord_by_col_and_row(x, y)
         bb = lx - self._step, ly - self._step, self._step * 2, self._step * 2
         return self.oc_map.test_rect(bb)
+
+
+class FieldOverlay(GameObject):
+    """
+    The cells which are drawn over the tanks (green), it must be added to the scene after tanks and projectiles
+    """
+
+    # the colorkey of the overlay layer, a color the atlas does not have
+    TRANSPARENT_COLOR = (255, 0, 255)
+
+    def __init__(self, field: Field):
+        super().__init__()
+        self.field = field
+
+    @property
+    def screen_rects(self):
+        return tuple(self.field.rect),
+
+    def render(self, screen):
+        self.field._update_layers()
+        screen.blit(self.field._overlay_layer, self.field.position)
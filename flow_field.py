@@ -0,0 +1,141 @@
+import heapq
+from math import inf
+
+from field import Field, BRICK_CELLS, HALF_BRICK_CELLS, TANK_CAN_RUN_CELLS
+from util import Direction
+
+
+class FlowField:
+    """
+    Cost of the way to the nearest of the targets from every place a tank can stand, for all the enemies at once.
+    A tank (2x2 cells) stands on a corner of the cells, so the nodes are corners (col, row),
+    each one costs STEP_COST plus the bricks under the tank there: bricks can be shot through, they do not block.
+    Other cells the tank can not run on (concrete) block.
+    It is computed (Dijkstra from all the targets) when asked after a change of the map or of the targets
+    """
+
+    STEP_COST = 1
+    BRICK_COST = 4
+    HALF_BRICK_COST = 2
+
+    def __init__(self, field: Field):
+        self.field = field
+        self.step = field.map.step
+
+        # nodes are stored flat: index = col * rows + row, for all corners 0..width x 0..height,
+        # the corners on the border are blocked, so the neighbours of a node are never out of the list
+        self.cols, self.rows = field.map.width + 1, field.map.height + 1
+        self._costs = [None] * (self.cols * self.rows)  # None: blocked
+        for col in range(1, self.cols - 1):
+            for row in range(1, self.rows - 1):
+                self._update_node(col, row)
+
+        self._targets = ()
+        self._dist = None
+        self._dirty = True
+        field.map.add_listener(self._on_cell_changed)
+
+    def detach(self):
+        self.field.map.remove_listener(self._on_cell_changed)
+
+    def _on_cell_changed(self, col, row, old_cell, new_cell):
+        # only the four corners around the cell have changed
+        for node_col in (col, col + 1):
+            for node_row in (row, row + 1):
+                if 0 < node_col < self.cols - 1 and 0 < node_row < self.rows - 1:
+                    self._update_node(node_col, node_row)
+        self._dirty = True
+
+    @property
+    def targets(self):
+        """
+        Corners (col, row) the way goes to, the nearest one from every place
+        """
+        return self._targets
+
+    @targets.setter
+    def targets(self, corners):
+        # inside the border, where a tank can be
+        corners = tuple((min(max(col, 1), self.cols - 2), min(max(row, 1), self.rows - 2)) for col, row in corners)
+        if corners != self._targets:
+            self._targets = corners
+            self._dirty = True
+
+    def corner_of(self, x, y):
+        """
+        :return: (col, row) of the corner nearest to the point
+        """
+        xs, ys = self.field.position
+        return round((x - xs) / self.step), round((y - ys) / self.step)
+
+    def _cell_cost(self, cell):
+        if cell in TANK_CAN_RUN_CELLS:
+            return 0
+        elif cell in HALF_BRICK_CELLS:
+            return self.HALF_BRICK_COST
+        elif cell in BRICK_CELLS:
+            return self.BRICK_COST
+        return None
+
+    def _update_node(self, col, row):
+        field_map = self.field.map
+        cost = self.STEP_COST
+        for c, r in ((col - 1, row - 1), (col, row - 1), (col - 1, row), (col, row)):
+            cell_cost = self._cell_cost(field_map.get_cell_by_col_row(c, r))
+            if cell_cost is None:
+                cost = None
+                break
+            cost += cell_cost
+        self._costs[col * self.rows + row] = cost
+
+    def _index(self, corner):
+        col, row = corner
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return col * self.rows + row
+        return None
+
+    def _compute(self):
+        self._dirty = False
+        self._dist = dist = [inf] * len(self._costs)
+        targets = {self._index(corner) for corner in self._targets}
+        costs = self._costs
+        rows = self.rows
+        for target in targets:
+            dist[target] = 0
+        queue = [(0, target) for target in sorted(targets)]
+        while queue:
+            d, node = heapq.heappop(queue)
+            if d > dist[node]:
+                continue
+            # moving from a neighbour to this node costs the cost of this node;
+            # a target itself may be blocked (the base stands there), the way only has to come next to it
+            nd = d + (self.STEP_COST if node in targets else costs[node])
+            for neighbour in (node - 1, node - rows, node + 1, node + rows):
+                if costs[neighbour] is not None and nd < dist[neighbour]:
+                    dist[neighbour] = nd
+                    heapq.heappush(queue, (nd, neighbour))
+
+    def distance(self, corner):
+        """
+        :return: cost of the way from the corner to the nearest target, inf if there is no way
+        """
+        if self._dirty:
+            self._compute()
+        index = self._index(corner)
+        return inf if index is None else self._dist[index]
+
+    def best_directions(self, corner):
+        """
+        :return: list of the directions (in the declaration order) to the neighbour corners closest to a target,
+        empty if the corner is a target or there is no way
+        """
+        best, best_d = [], self.distance(corner)
+        col, row = corner
+        for d in Direction:
+            vx, vy = d.vector
+            nd = self.distance((col + vx, row + vy))
+            if nd < best_d:
+                best, best_d = [d], nd
+            elif nd == best_d and best:
+                best.append(d)
+        return best
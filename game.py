@@ -1,7 +1,8 @@
 import pygame
 from field import Field
-from projectile import Projectile
+from projectile import Projectile, StoredProjectile
 from tank import Tank
+from config import *
 from util import *
 from ui import *
 from explosion import Explosion
@@ -10,68 +11,146 @@ from bonus import Bonus, BonusType
 from ai import EnemyFractionAI
 from bonus_field_protect import FieldProtector
 from score_node import ScoreLayer
+from spatial_hash import SpatialHash
+from dirty_rects import DirtyRectTracker
+from profiler import NullProfiler
+from ecs import movement_system
+import controls
+import snapshot
 import random
+import itertools
+from collections import Counter
+from contextlib import contextmanager
 
 
 class Game:
-    def __init__(self):
-        self.r = random.Random()
+    TICK = 1.0 / 60.0
+
+    PLAYER_COLORS = (Tank.Color.YELLOW, Tank.Color.GREEN)
+
+    def __init__(self, clock: Clock = None, seed=None, level=1, swept_projectiles=False, profiler=None, ecs=False,
+                 ai_mode=EnemyFractionAI.MODE_RANDOM, sight_fire=False, players=1, versus=False):
+        # every animator and timer of this game reads this clock
+        self.clock = Clock() if clock is None else clock
+
+        # all the randomness of the game goes through this generator, so a seeded game is reproducible
+        self.r = random.Random(seed)
+        self.seed = seed
+        self.level = level
+        self.ticks = 0
+        self.kills = Counter()
+
+        # the tanks of the players and where they go; together against the enemies or, versus, also against each other
+        self.player_tanks = [None] * players
+        self.player_directions = [None] * players
+        self.versus = versus
+        self.frags = [0] * players  # the other players killed by every player
+
+        self.profiler = NullProfiler() if profiler is None else profiler
+
+        # test all the way passed by projectiles, not only where they are after the move
+        self.swept_projectiles = swept_projectiles
 
         self.scene = GameObject()
 
+        # broad-phase for collisions: the base, mature tanks and bonuses
+        self.world = SpatialHash()
+
         # field --
         self.field = Field()
-        self.field.load_from_file('data/level1.txt')
+        self.field.load_from_file(LEVEL_FILE.format(level))
         self.scene.add_child(self.field)
 
-        self.field_protector = FieldProtector(self.field)
+        self.field_protector = FieldProtector(self.field, self.clock)
 
         self.my_base = MyBase()
         self.my_base.position = self.field.map.coord_by_col_and_row(12, 24)
         self.scene.add_child(self.my_base)
+        self.field.oc_map.place(self.my_base, self.my_base.bounding_rect)
+        self.world.update(self.my_base)
 
         # tanks --
         self.tanks = GameObject()
+        self.tanks.add_view('mature', lambda t: not t.is_spawning)
+        self.tanks.add_view('enemies', lambda t: t.fraction == Tank.ENEMY)
+        self.tanks.add_view('mature_enemies', lambda t: not t.is_spawning and t.fraction == Tank.ENEMY)
+        self.tanks.add_view('friends', lambda t: t.fraction == Tank.FRIEND)
         self.scene.add_child(self.tanks)
 
-        self.make_my_tank()
+        for player in range(players):
+            self.make_player_tank(player)
 
-        self.ai = EnemyFractionAI(self.field, self.tanks)
+        self.ai = EnemyFractionAI(self.field, self.tanks, self.clock, self.r, mode=ai_mode, base=self.my_base,
+                                  sight_fire=sight_fire)
 
         # projectiles --
         self.projectiles = GameObject()
+        # with ecs the projectiles are facades of the rows of this store
+        self.projectile_store = StoredProjectile.make_store() if ecs else None
         self.scene.add_child(self.projectiles)
 
+        self.scene.add_child(self.field.overlay)
+
         # bonuses --
         self.bonues = GameObject()
         self.scene.add_child(self.bonues)
 
         self.score = 0
-        self.score_layer = ScoreLayer()
+        self.score_layer = ScoreLayer(self.clock)
         self.scene.add_child(self.score_layer)
 
-        self.freeze_timer = Timer(10)
+        # explosions --
+        self.explosions = GameObject()
+        self.scene.add_child(self.explosions)
+
+        self.freeze_timer = Timer(self.clock, 10)
         self.freeze_timer.done = True
 
         # else --
-        self.font_debug = pygame.font.Font(None, 18)
+        self._font_debug = None
+        self.dirty_rects = DirtyRectTracker((GAME_WIDTH, GAME_HEIGHT))
+        self._label_rects = []
 
         # to test bonus
         self.make_bonus(*self.field.map.coord_by_col_and_row(13, 22), BonusType.TOP_TANK)
 
     def respawn_tank(self, t: Tank):
         is_friend = self.is_friend(t)
-        pos = random.choice(self.field.respawn_points(not is_friend))
+        points = self.field.respawn_points(not is_friend)
+        if is_friend and len(self.player_tanks) > 1 and t in self.player_tanks:
+            # every player has its own place
+            pos = points[self.player_tanks.index(t) % len(points)]
+        else:
+            pos = self.r.choice(points)
         t.place(self.field.get_center_of_cell(*pos))
+        if t in self.world:
+            self.world.update(t)
         if is_friend:
             t.tank_type = t.Type.LEVEL_1
 
-    def make_my_tank(self):
-        self.my_tank = Tank(Tank.FRIEND, Tank.Color.YELLOW, Tank.Type.LEVEL_1)
-        self.respawn_tank(self.my_tank)
-        self.my_tank.activate_shield()
-        self.tanks.add_child(self.my_tank)
-        self.my_tank_move_to_direction = None
+    def make_player_tank(self, player=0):
+        tank = Tank(self.clock, Tank.FRIEND, self.PLAYER_COLORS[player], Tank.Type.LEVEL_1)
+        self.player_tanks[player] = tank
+        self.respawn_tank(tank)
+        tank.activate_shield()
+        self.tanks.add_child(tank)
+        self.player_directions[player] = None
+
+    @property
+    def my_tank(self):
+        return self.player_tanks[0]
+
+    @my_tank.setter
+    def my_tank(self, tank):
+        self.player_tanks[0] = tank
+
+    @property
+    def my_tank_move_to_direction(self):
+        return self.player_directions[0]
+
+    @my_tank_move_to_direction.setter
+    def my_tank_move_to_direction(self, direction):
+        self.player_directions[0] = direction
 
     @property
     def frozen_enemy_time(self):
@@ -82,6 +161,8 @@ class Game:
             self.make_bonus(*t.center_point)
 
         if t.fraction == t.ENEMY:
+            self.kills[t.tank_type] += 1
+
             if t.tank_type == t.Type.ENEMY_SIMPLE:
                 ds = 100
             elif t.tank_type == t.Type.ENEMY_FAST:
@@ -97,18 +178,19 @@ class Game:
             self.score_layer.add(*t.center_point, ds)
 
     def make_bonus(self, x, y, t=None):
-        bonus = Bonus(BonusType.random() if t is None else t, x, y)
+        bonus = Bonus(BonusType.random(self.r) if t is None else t, x, y)
         self.bonues.add_child(bonus)
+        self.world.update(bonus)
 
     def switch_my_tank(self):
         tank = self.my_tank
         t, d, p = tank.tank_type, tank.direction, tank.position
-        tank.remove_from_parent()
+        self.remove_tank(tank)
 
         types = list(Tank.Type)
         current_index = types.index(t)
         next_type = types[(current_index + 1) % len(types)]
-        tank = Tank(Tank.Color.PLAIN, next_type)
+        tank = Tank(self.clock, Tank.FRIEND, Tank.Color.PLAIN, next_type)
         tank.position = tank.old_position = p
         tank.direction = d
         tank.shielded = True
@@ -117,7 +199,7 @@ class Game:
         self.my_tank = tank
 
     def make_explosion(self, x, y, expl_type):
-        self.scene.add_child(Explosion(x, y, expl_type))
+        self.explosions.add_child(Explosion.acquire(self.clock, x, y, expl_type))
 
     def is_friend(self, tank):
         return tank.fraction == tank.FRIEND
@@ -131,8 +213,25 @@ class Game:
 
         if tank.try_fire():
             power = Projectile.POWER_HIGH if tank.tank_type.can_crash_concrete else Projectile.POWER_NORMAL
-            projectile = Projectile(*tank.gun_point, tank.direction, sender=tank, power=power)
-            self.projectiles.add_child(projectile)
+            self.spawn_projectile(*tank.gun_point, tank.direction, power, sender=tank)
+
+    def spawn_projectile(self, x, y, d: Direction, power=Projectile.POWER_NORMAL, sender=None):
+        if self.projectile_store is None:
+            projectile = Projectile.acquire(x, y, d, power, sender)
+        else:
+            projectile = StoredProjectile.acquire(self.projectile_store, x, y, d, power, sender)
+        self.projectiles.add_child(projectile)
+        return projectile
+
+    def apply_input(self, bits, player=0):
+        """
+        Controls of the player for the next step
+        :param bits: bitmask of controls.UP, DOWN, LEFT, RIGHT, FIRE
+        :param player: index of the player, in a multiplayer game the inputs go in the order of the players
+        """
+        self.player_directions[player] = controls.direction_of(bits)
+        if bits & controls.FIRE:
+            self.fire(self.player_tanks[player])
 
     def move_tank(self, direction: Direction, tank=None):
         tank = self.my_tank if tank is None else tank
@@ -141,9 +240,8 @@ class Game:
 
     def apply_bonus(self, t: Tank, bonus: BonusType):
         if bonus == bonus.DESTRUCTION:
-            for t in self.tanks:
-                if not t.is_spawning and t.fraction == Tank.ENEMY:
-                    self.kill_tank(t)
+            for t in self.tanks.view('mature_enemies'):
+                self.kill_tank(t)
         elif bonus == bonus.CASK:
             t.shielded = True
         elif bonus == bonus.UPGRADE:
@@ -158,42 +256,61 @@ class Game:
             print(f'Bonus {bonus} not implemented yet.')
 
     def update_bonuses(self):
-        for b in self.bonues:  # type: Bonus
-            if b.intersects_rect(self.my_tank.bounding_rect):
-                b.remove_from_parent()
-                self.apply_bonus(self.my_tank, b.type)
+        for tank in self.player_tanks:
+            tank_rect = tank.bounding_rect
+            for b in self.world.query_rect(tank_rect):
+                if isinstance(b, Bonus) and b.intersects_rect(tank_rect):
+                    b.remove_from_parent()
+                    self.world.remove(b)
+                    self.apply_bonus(tank, b.type)
 
     @property
     def all_mature_tanks(self):
-        return (t for t in self.tanks if not t.is_spawning)
+        return self.tanks.view('mature')
+
+    @property
+    def all_friends(self):
+        return self.tanks.view('friends')
 
     @property
     def is_game_over(self):
         return self.my_base.broken
 
+    def remove_tank(self, t: Tank):
+        # its cells stay taken until the footprints of the tanks are placed on the next tick
+        t.remove_from_parent()
+        self.world.remove(t)
+
     def update_tanks(self):
-        for tank in self.all_mature_tanks:
-            self.field.oc_map.fill_rect(tank.bounding_rect, tank, only_if_empty=True)
+        for tank in self.tanks:  # type: Tank
+            tank.update()
+
+        # a cell wanted by several tanks is of the first one of them,
+        # only the cells of the tanks that have moved since the last tick are rewritten
+        with self.profiler.section('oc_map'):
+            self.field.oc_map.place_group((tank, tank.bounding_rect) for tank in self.all_mature_tanks)
 
         if not self.is_game_over:
-            if self.my_tank_move_to_direction is None:
-                self.my_tank.stop()
-                self.my_tank.align()
-            else:
-                self.move_tank(self.my_tank_move_to_direction, self.my_tank)
+            for tank, direction in zip(self.player_tanks, self.player_directions):
+                if direction is None:
+                    tank.stop()
+                    tank.align()
+                else:
+                    self.move_tank(direction, tank)
 
         self.freeze_timer.tick()
         if self.frozen_enemy_time:
             self.ai.stop_all_moving()
         else:
-            self.ai.update()
+            with self.profiler.section('ai.update'):
+                self.ai.update()
 
         for tank in self.all_mature_tanks:
             if tank.want_to_fire:
                 self.fire(tank)
 
             if tank.to_destroy:
-                tank.remove_from_parent()
+                self.remove_tank(tank)
 
             bb = tank.bounding_rect
             if not self.field.oc_map.test_rect(bb, good_values=(None, tank)):
@@ -204,20 +321,34 @@ class Game:
             if push_back:
                 tank.undo_move()
 
+        # the projectiles are tested against the final positions of this tick
+        for tank in self.all_mature_tanks:
+            self.world.update(tank)
+
     def is_player_tank(self, t: Tank):
-        return t is self.my_tank
+        return any(t is tank for tank in self.player_tanks)
 
-    def hit_tank(self, t: Tank):
+    def is_hostile(self, sender, t: Tank):
+        """
+        :return: True if a projectile of the sender hurts the tank
+        """
+        if sender.fraction != t.fraction:
+            return True
+        return self.versus and self.is_player_tank(sender) and self.is_player_tank(t)
+
+    def hit_tank(self, t: Tank, sender=None):
         destroy = False
         if self.is_friend(t):
             destroy = True
+            if sender is not None and sender is not t and self.is_player_tank(sender):
+                self.frags[self.player_tanks.index(sender)] += 1
             self.respawn_tank(t)
         else:
             t.hit = True
             self.ai.update_one_tank(t)
             if t.to_destroy:
                 destroy = True
-                t.remove_from_parent()
+                self.remove_tank(t)
                 self._on_destroyed_tank(t)
 
         if destroy:
@@ -229,8 +360,9 @@ class Game:
         if self.is_friend(t):
             self.respawn_tank(t)
         else:
+            self.kills[t.tank_type] += 1
             self.ai.update_one_tank(t)
-            t.remove_from_parent()
+            self.remove_tank(t)
 
     def make_game_over(self):
         self.my_base.broken = True
@@ -239,70 +371,175 @@ class Game:
         self.scene.add_child(go)
         
     def update_projectiles(self):
+        projectile_map = self.field.projectile_map
         for p in self.projectiles:  # type: Projectile
             r = extend_rect((*p.position, 0, 0), 2)
-            self.field.oc_map.fill_rect(r, p)
+            projectile_map.place(p, r)
+
+        # a dict as an ordered set: the projectiles leave the map in a reproducible order
+        remove_projectiles_waitlist = {}
 
-        remove_projectiles_waitlist = set()
+        store = self.projectile_store
+        if store is not None:
+            movement_system(store)
 
         for p in self.projectiles:  # type: Projectile
-            p.update()
-
-            something = self.field.oc_map.get_cell_by_coords(*p.position)
-            if something and something is not p and isinstance(something, Projectile):
-                remove_projectiles_waitlist.add(p)
-                remove_projectiles_waitlist.add(something)
-
-            was_stricken_object = False
-            x, y = p.position
-            if self.field.check_hit(p):
-                was_stricken_object = True
-                self.make_explosion(*p.position, Explosion.TYPE_SUPER_SHORT)
-            elif self.my_base.check_hit(x, y):
-                self.make_game_over()
-                was_stricken_object = True
-                self.make_explosion(*self.my_base.center_point, Explosion.TYPE_FULL)
-            else:
-                for t in self.all_mature_tanks:  # type : Tank
-                    if t is not p.sender and t.check_hit(x, y):
-                        was_stricken_object = True
-                        if not t.shielded and p.sender.fraction != t.fraction:
-                            self.make_explosion(*p.position, Explosion.TYPE_SHORT)
-                            self.hit_tank(t)
-                        break
+            if store is None:
+                p.update()
 
-            if was_stricken_object:
-                remove_projectiles_waitlist.add(p)
+            positions = p.sweep() if self.swept_projectiles else (p.position,)
+            for position in positions:
+                p.position = position
+                if self._check_projectile_hit(p, projectile_map, remove_projectiles_waitlist):
+                    break
+
+            if not p.on_screen:
+                remove_projectiles_waitlist[p] = None
 
         for p in remove_projectiles_waitlist:
             p.remove_from_parent()
+            projectile_map.remove(p)
+            p.release()
+
+    def _check_projectile_hit(self, p: Projectile, projectile_map, remove_projectiles_waitlist):
+        something = projectile_map.get_cell_by_coords(*p.position)
+        if something and something is not p and isinstance(something, Projectile):
+            remove_projectiles_waitlist[p] = None
+            remove_projectiles_waitlist[something] = None
+
+        was_stricken_object = False
+        x, y = p.position
+        candidates = self.world.query_point(x, y)
+        if self.field.check_hit(p):
+            was_stricken_object = True
+            self.make_explosion(*p.position, Explosion.TYPE_SUPER_SHORT)
+        elif self.my_base in candidates and self.my_base.check_hit(x, y):
+            self.make_game_over()
+            was_stricken_object = True
+            self.make_explosion(*self.my_base.center_point, Explosion.TYPE_FULL)
+        else:
+            for t in candidates:  # type : Tank
+                if isinstance(t, Tank) and t is not p.sender and t.check_hit(x, y):
+                    was_stricken_object = True
+                    if not t.shielded and self.is_hostile(p.sender, t):
+                        self.make_explosion(*p.position, Explosion.TYPE_SHORT)
+                        self.hit_tank(t, p.sender)
+                    break
 
-    def update(self):
-        self.field.oc_map.clear()
-        self.field.oc_map.fill_rect(self.my_base.bounding_rect, self.my_base)
+        if was_stricken_object:
+            remove_projectiles_waitlist[p] = None
+
+        return p in remove_projectiles_waitlist
 
-        self.field_protector.update()
-        self.score_layer.update()
+    def update_explosions(self):
+        for e in self.explosions:  # type: Explosion
+            e.update()
 
-        self.update_tanks()
-        self.update_bonuses()
-        self.update_projectiles()
+    def update(self):
+        self.ticks += 1
+
+        profiler = self.profiler
+        with profiler.section('update'):
+            self.field_protector.update()
+            self.score_layer.update()
+
+            with profiler.section('update_tanks'):
+                self.update_tanks()
+            with profiler.section('update_bonuses'):
+                self.update_bonuses()
+            with profiler.section('update_projectiles'):
+                self.update_projectiles()
+            self.update_explosions()
+
+    def step(self, dt=TICK):
+        """
+        Advance the game clock by dt and run one tick of the simulation.
+        Requires a manually driven clock (FixedClock); rendering is not needed
+        :param dt: simulated time of the tick in seconds
+        """
+        if not isinstance(self.clock, FixedClock):
+            raise TypeError('Game.step() needs a game with a FixedClock, a wall clock can not be advanced: '
+                            'use Game(clock=FixedClock()) or call update() in real time')
+        self.clock.advance(dt)
+        self.update()
+
+    def snapshot(self) -> bytes:
+        """
+        The state of the simulation, see snapshot.py
+        """
+        return snapshot.take(self)
+
+    def restore(self, data: bytes):
+        """
+        Brings the simulation back to the state of the snapshot (of this level), requires a FixedClock
+        """
+        snapshot.restore(self, data)
 
     # ---- render ----
 
-    def render(self, screen):
-        self.scene.visit(screen)
+    @property
+    def font_debug(self):
+        if self._font_debug is None:
+            self._font_debug = pygame.font.Font(None, 18)
+        return self._font_debug
+
+    @contextmanager
+    def _interpolated_positions(self, alpha):
+        # moving objects are shown between their positions at the previous and the current step
+        moving = [obj for obj in itertools.chain(self.tanks, self.projectiles) if obj.prev_position != obj.position]
+        positions = [obj.position for obj in moving]
+        for obj in moving:
+            obj.position = lerp_position(obj.prev_position, obj.position, alpha)
+        try:
+            yield
+        finally:
+            for obj, position in zip(moving, positions):
+                obj.position = position
+
+    def _render_scene(self, screen):
+        profiler = self.profiler
+        with profiler.section('scene.visit'):
+            # the children one by one, to time the field on its own
+            for child in self.scene:
+                if child is self.field:
+                    with profiler.section('field.render'):
+                        child.visit(screen)
+                else:
+                    child.visit(screen)
+        with self.profiler.section('dirty_rects'):
+            return self.dirty_rects.collect(self.scene)
+
+    def render(self, screen, alpha=1.0):
+        """
+        Renders the whole scene to the screen surface
+        :param alpha: 0..1, how far the time of the frame is from the previous step to the current one
+        :return: list of the changed rects of the screen or None if the whole screen has to be updated
+        """
+        if alpha < 1.0:
+            with self._interpolated_positions(alpha):
+                dirty = self._render_scene(screen)
+        else:
+            dirty = self._render_scene(screen)
 
         score_label = self.font_debug.render(str(self.score), 1, (255, 255, 255))
-        screen.blit(score_label, (GAME_WIDTH - 50, 5))
+        score_rect = screen.blit(score_label, (GAME_WIDTH - 50, 5))
 
         # - 1 because the scene is not literally an object
         dbg_text = f'Objects: {self.scene.total_children - 1}'
+        if self.versus:
+            dbg_text = f'Frags: {":".join(map(str, self.frags))} ' + dbg_text
         if self.is_game_over:
             dbg_text = 'Press R to restart! ' + dbg_text
 
         dbg_label = self.font_debug.render(dbg_text, 1, (255, 255, 255))
-        screen.blit(dbg_label, (5, 5))
+        dbg_rect = screen.blit(dbg_label, (5, 5))
+
+        # the labels are cheap to update every frame, along with the place of the previous (maybe longer) text
+        label_rects = [score_rect, dbg_rect]
+        if dirty is not None:
+            dirty += [pygame.Rect(r) for r in label_rects + self._label_rects]
+        self._label_rects = label_rects
+        return dirty
 
     # --- test ---
 
@@ -0,0 +1,128 @@
+from bisect import bisect_left, bisect_right
+from math import floor, inf
+
+from field import Field, BRICK_CELLS, SOLID_CELLS
+from util import Direction
+
+
+class SightLines:
+    """
+    What a tank can shoot from where it stands: the solid cells of every row and column of the map
+    as sorted lists, cached and rebuilt only for the rows and columns where cells have changed.
+    Bricks stop a projectile but can be shot through, so the targets behind bricks (the base) are tested
+    against the other solid cells only
+    """
+
+    def __init__(self, field: Field):
+        self.field = field
+        self.step = field.map.step
+        w, h = field.map.width, field.map.height
+        # None: to rebuild; else (sorted cols/rows of solid cells, ... of the solid cells except bricks)
+        self._rows = [None] * h
+        self._cols = [None] * w
+        field.map.add_listener(self._on_cell_changed)
+
+        # half of the width of the trace of a projectile, see Projectile.split_for_aim
+        self.spread = int(self.step / 1.4)
+
+        # set by the owner: the rects of the targets to shoot at in the open and through the bricks
+        self.targets = []
+        self.targets_behind_bricks = []
+
+    def detach(self):
+        self.field.map.remove_listener(self._on_cell_changed)
+
+    def _on_cell_changed(self, col, row, old_cell, new_cell):
+        self._rows[row] = None
+        self._cols[col] = None
+
+    @staticmethod
+    def _blockers(cells):
+        solid = [i for i, cell in enumerate(cells) if cell in SOLID_CELLS]
+        hard = [i for i in solid if cells[i] not in BRICK_CELLS]
+        return solid, hard
+
+    def _row(self, row):
+        blockers = self._rows[row]
+        if blockers is None:
+            field_map = self.field.map
+            cells = [field_map.get_cell_by_col_row(col, row) for col in range(field_map.width)]
+            blockers = self._rows[row] = self._blockers(cells)
+        return blockers
+
+    def _col(self, col):
+        blockers = self._cols[col]
+        if blockers is None:
+            field_map = self.field.map
+            h = field_map.height
+            blockers = self._cols[col] = self._blockers(field_map._cells[col * h:(col + 1) * h])
+        return blockers
+
+    def _distances(self, x, y, direction: Direction):
+        """
+        :return: how far (in pixels) a projectile from (x, y) flies to the first solid cell
+        and to the first solid cell which is not a brick
+        """
+        field_map = self.field.map
+        x0, y0 = field_map.position
+        step = self.step
+        vx, vy = direction.vector
+
+        if vx:
+            # the rows swept by the projectile
+            lines = range(max(floor((y - self.spread - y0) / step), 0),
+                          min(floor((y + self.spread - y0) / step), field_map.height - 1) + 1)
+            get_line, along, origin = self._row, x, x0
+        else:
+            lines = range(max(floor((x - self.spread - x0) / step), 0),
+                          min(floor((x + self.spread - x0) / step), field_map.width - 1) + 1)
+            get_line, along, origin = self._col, y, y0
+        forward = (vx or vy) > 0
+
+        result = []
+        for kind in (0, 1):
+            distance = inf
+            for line in lines:
+                blockers = get_line(line)[kind]
+                if forward:
+                    i = bisect_left(blockers, floor((along - origin) / step))
+                    if i < len(blockers):
+                        distance = min(distance, origin + blockers[i] * step - along)
+                else:
+                    i = bisect_right(blockers, floor((along - 1 - origin) / step))
+                    if i:
+                        distance = min(distance, along - origin - (blockers[i - 1] + 1) * step)
+            result.append(max(distance, 0))
+        return result
+
+    def _distance_to_rect(self, x, y, direction: Direction, rect):
+        """
+        :return: how far the rect is in front of (x, y) along the direction, inf if the projectile misses it
+        """
+        rx, ry, rw, rh = rect
+        vx, vy = direction.vector
+        spread = self.spread
+        if vx:
+            if not (ry < y + spread and ry + rh > y - spread):
+                return inf
+            distance = rx - x if vx > 0 else x - (rx + rw)
+            behind = rx + rw <= x if vx > 0 else rx >= x
+        else:
+            if not (rx < x + spread and rx + rw > x - spread):
+                return inf
+            distance = ry - y if vy > 0 else y - (ry + rh)
+            behind = ry + rh <= y if vy > 0 else ry >= y
+        return inf if behind else max(distance, 0)
+
+    def can_hit(self, x, y, direction: Direction):
+        """
+        :return: True if a projectile fired from (x, y) along the direction reaches any of the targets
+        """
+        to_solid, to_hard = self._distances(x, y, direction)
+        for rect in self.targets:
+            if self._distance_to_rect(x, y, direction, rect) < to_solid:
+                return True
+        for rect in self.targets_behind_bricks:
+            if self._distance_to_rect(x, y, direction, rect) < to_hard:
+                return True
+        return False
@@ -0,0 +1,189 @@
+"""
+Load generator for server.py: many clients in one process, each one plays its own match with random inputs
+and decodes the states it gets (a spectator, its frames). At the end it shows what the server managed,
+from its counters:
+
+    python3 server.py --port 7000
+    python3 loadgen.py --port 7000 --matches 40 --seconds 10
+
+'matches per core' is how many matches one core of the server could run at its tick rate with this load:
+the steps done per second by the tick rate, by the share of a core the server has taken
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import controls
+import snapshot
+from server import (MESSAGE, JOIN, INPUT, WELCOME, STATE, KIND_JOIN, KIND_INPUT, KIND_STATS, KIND_WELCOME, KIND_STATE,
+                    KIND_FRAME, NEW_MATCH, SPECTATOR, message, read_message, decode_state)
+from spectate import SpectatorView, SpectateError, is_keyframe
+
+DIRECTIONS = (0, controls.UP, controls.DOWN, controls.LEFT, controls.RIGHT)
+
+
+class Totals:
+    def __init__(self):
+        self.states = 0
+        self.keyframes = 0
+        self.bytes = 0
+        self.frames = 0
+        self.frame_bytes = 0
+        self.errors = 0
+
+
+class Bot:
+    """
+    One client: joins (or makes) a match, sends inputs at the tick rate and reads the states
+    """
+    TURN_CHANCE = 0.03
+    FIRE_CHANCE = 0.05
+
+    def __init__(self, host, port, rng: random.Random, totals: Totals, input_rate=60):
+        self.host = host
+        self.port = port
+        self.rng = rng
+        self.totals = totals
+        self.input_period = 1.0 / input_rate
+        self.match_id = None
+        self.player = None
+        self.state = None  # the last snapshot got
+        self.view = None  # of a spectator
+
+    async def run(self, match_id=NEW_MATCH, players=1, joined: asyncio.Future = None):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(message(KIND_JOIN, JOIN.pack(match_id, players)))
+        kind, body = await read_message(reader)
+        if kind != KIND_WELCOME:
+            raise ValueError(f'expected a welcome, got a message of kind {kind}')
+        self.match_id, self.player = WELCOME.unpack(body)[:2]
+        if self.player == SPECTATOR:
+            self.view = SpectatorView()
+        if joined is not None:
+            joined.set_result(self.match_id)
+
+        sender = asyncio.create_task(self._send_inputs(writer))
+        try:
+            while True:
+                kind, body = await read_message(reader)
+                if kind == KIND_STATE:
+                    self._on_state(body)
+                elif kind == KIND_FRAME:
+                    self._on_frame(body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+    def _on_state(self, body):
+        totals = self.totals
+        totals.bytes += MESSAGE.size + len(body)
+        try:
+            _, self.state = decode_state(body, self.state)
+        except ValueError:
+            totals.errors += 1
+            return
+        if not self.state.startswith(snapshot.MAGIC):
+            totals.errors += 1
+        totals.states += 1
+        if STATE.unpack_from(body)[1]:
+            totals.keyframes += 1
+
+    def _on_frame(self, body):
+        totals = self.totals
+        totals.bytes += MESSAGE.size + len(body)
+        totals.frame_bytes += MESSAGE.size + len(body)
+        try:
+            self.view.apply(body)
+        except SpectateError:
+            totals.errors += 1
+            return
+        totals.frames += 1
+        if is_keyframe(body):
+            totals.keyframes += 1
+
+    async def _send_inputs(self, writer: asyncio.StreamWriter):
+        rng = self.rng
+        direction = 0
+        while True:
+            if rng.random() < self.TURN_CHANCE:
+                direction = rng.choice(DIRECTIONS)
+            bits = direction | (controls.FIRE if rng.random() < self.FIRE_CHANCE else 0)
+            writer.write(message(KIND_INPUT, INPUT.pack(bits)))
+            await asyncio.sleep(self.input_period)
+
+
+async def server_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(KIND_STATS))
+    kind, body = await read_message(reader)
+    writer.close()
+    return json.loads(body)
+
+
+async def load(args):
+    totals = Totals()
+    rng = random.Random(args.seed)
+    tasks = []
+    for _ in range(args.matches):
+        joined = asyncio.get_running_loop().create_future()
+        first = Bot(args.host, args.port, random.Random(rng.random()), totals, args.input_rate)
+        tasks.append(asyncio.create_task(first.run(NEW_MATCH, args.players, joined)))
+        match_id = await joined
+        for _ in range(args.players - 1 + args.spectators):
+            bot = Bot(args.host, args.port, random.Random(rng.random()), totals, args.input_rate)
+            tasks.append(asyncio.create_task(bot.run(match_id)))
+
+    await asyncio.sleep(args.warmup)
+    before, states_before, bytes_before = await server_stats(args.host, args.port), totals.states, totals.bytes
+    frames_before, frame_bytes_before = totals.frames, totals.frame_bytes
+    t0 = time.perf_counter()
+    await asyncio.sleep(args.seconds)
+    after = await server_stats(args.host, args.port)
+    elapsed = time.perf_counter() - t0
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    def rate(name):
+        return (after[name] - before[name]) / (after['elapsed'] - before['elapsed'])
+
+    tick_rate = after['tick_rate']
+    cpu = rate('cpu')
+    steps = rate('steps')
+    step_time = (after['step_time'] - before['step_time']) / max(after['steps'] - before['steps'], 1)
+    print(f'{after["matches"]} matches, {after["clients"]} clients, {elapsed:.1f} s')
+    print(f'server: {rate("ticks"):.1f} ticks/s (of {tick_rate}), {steps / max(after["matches"], 1):.1f} steps/s '
+          f'per match, {rate("skipped"):.0f} skipped and {rate("throttled"):.0f} throttled steps/s, '
+          f'{step_time * 1e3:.2f} ms per step, {cpu:.0%} of a core')
+    print(f'states: {(totals.states - states_before) / elapsed:.0f}/s got, {rate("states_dropped"):.0f}/s dropped '
+          f'for slow clients, {(totals.bytes - bytes_before) / elapsed / 1024:.1f} KB/s, '
+          f'{totals.keyframes} keyframes, {totals.errors} errors')
+    frames = totals.frames - frames_before
+    if frames:
+        print(f'spectators: {frames / elapsed:.0f} frames/s got, '
+              f'{(totals.frame_bytes - frame_bytes_before) / frames:.1f} B per frame')
+    if cpu:
+        print(f'matches per core at {tick_rate} Hz: {steps / tick_rate / cpu:.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load server.py with bots and measure its capacity.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--matches', type=int, default=10)
+    parser.add_argument('--players', type=int, default=1, help='per match, 1 or 2')
+    parser.add_argument('--spectators', type=int, default=0, help='per match')
+    parser.add_argument('--input-rate', type=int, default=60, help='inputs per second of every bot')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds before measuring')
+    parser.add_argument('--seconds', type=float, default=10.0, help='of measuring')
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(load(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
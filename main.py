@@ -1,15 +1,120 @@
+import argparse
 import pygame
+import random
+import time
 from pygame.locals import *
+from ai import EnemyFractionAI
 from game import Game
 from config import *
-from util import Direction
+from util import Direction, FixedClock
+from profiler import FrameProfiler
+from replay import Replay, MAX_SEED
+from netplay import RollbackSession, UdpTransport, parse_address
+import controls
 
+# the keys of the players here: for every direction the keys to go there, and the fire key
+ARROWS = {Direction.UP: (K_UP,), Direction.DOWN: (K_DOWN,), Direction.LEFT: (K_LEFT,), Direction.RIGHT: (K_RIGHT,)}
+WASD = {Direction.UP: (K_w,), Direction.DOWN: (K_s,), Direction.LEFT: (K_a,), Direction.RIGHT: (K_d,)}
+ANY_KEYS = {d: ARROWS[d] + WASD[d] for d in ARROWS}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Battle City.')
+    # main loop --
+    parser.add_argument('--fps', type=int, default=60, help='frames rendered per second, 0 = no limit')
+    parser.add_argument('--tick-rate', type=int, default=60, help='simulation steps per second')
+    parser.add_argument('--max-frame-skip', type=int, default=5,
+                        help='max simulation steps in one frame to catch up under load')
+    parser.add_argument('--interpolate', action='store_true',
+                        help='smooth movement between simulation steps when the frame rate is above the tick rate')
+    # simulation --
+    parser.add_argument('--ecs', action='store_true', help='projectiles in column storage, moved in one batch')
+    parser.add_argument('--ai', choices=EnemyFractionAI.MODES, default=EnemyFractionAI.MODE_RANDOM,
+                        help='enemies: random (turns at random) or flow (to the base and the player)')
+    parser.add_argument('--sight-fire', action='store_true',
+                        help='enemies fire only at the player or the base on the line of fire')
+    # players --
+    parser.add_argument('--players', type=int, choices=(1, 2), default=1,
+                        help='2: the second player on the same keyboard or over the network')
+    parser.add_argument('--versus', action='store_true', help='the players can shoot each other')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='of the match, the same on both sides of a network game')
+    # network game, see netplay.py --
+    parser.add_argument('--net-peer', default=None, help='host:port of the other player')
+    parser.add_argument('--net-port', type=int, default=7777, help='local UDP port')
+    parser.add_argument('--net-player', type=int, choices=(0, 1), default=0,
+                        help='which of the two tanks is played here')
+    parser.add_argument('--net-input-delay', type=int, default=RollbackSession.INPUT_DELAY,
+                        help='steps, the same on both sides')
+    # replays, profiling --
+    parser.add_argument('--record', default=None, help='save the inputs of the match to replay it, see replay.py')
+    parser.add_argument('--profile', action='store_true', help='time the subsystems and show the overlay')
+    parser.add_argument('--profile-out', default=None, help='save the timings to .csv or .json on exit')
+    # read by config.py --
+    for flag in ('--debug', '--field-debug', '--projectile-debug'):
+        parser.add_argument(flag, action='store_true')
+    args = parser.parse_args(argv)
+    if args.seed is not None and not 0 <= args.seed <= MAX_SEED:
+        parser.error(f'--seed must be 0..{MAX_SEED}, the replays keep it in 64 bits')
+    if args.tick_rate <= 0:
+        parser.error('--tick-rate must be above 0')
+    if args.max_frame_skip < 1:
+        parser.error('--max-frame-skip must be at least 1, or the game never steps')
+    if args.record and (args.players == 2 or args.net_peer):
+        parser.error('--record: only single player matches can be replayed')
+    return args
+
+
+def local_keys(args):
+    """
+    :return: for every player here (direction keys, fire key)
+    """
+    if args.net_peer or args.players == 1:
+        return [(ANY_KEYS, K_SPACE)]
+    return [(WASD, K_SPACE), (ARROWS, K_RETURN)]
+
+
+def new_game(args, profiler=None):
+    # the game runs on its own clock, advanced by fixed steps, so the speed does not depend on the frame rate;
+    # the seed is known, so the match can be replayed; over the network both sides need the same one
+    seed = args.seed if args.seed is not None else 0 if args.net_peer else random.randrange(1 << 32)
+    return Game(clock=FixedClock(), seed=seed, profiler=profiler, ecs=args.ecs, ai_mode=args.ai,
+                sight_fire=args.sight_fire, players=2 if args.net_peer else args.players, versus=args.versus)
+
+
+def new_recording(game, args):
+    return Replay.of_game(game, args.tick_rate) if args.record else None
+
+
+def direction_of_keys(keys, direction_keys):
+    for direction, codes in direction_keys.items():
+        if any(keys[code] for code in codes):
+            return direction
+    return None
+
+
+def main():
+    args = parse_args()
+    profiler = FrameProfiler() if args.profile or args.profile_out else None
+    keys_of_players = local_keys(args)
 
-if __name__ == '__main__':
     pygame.init()
     screen = pygame.display.set_mode((GAME_WIDTH, GAME_HEIGHT))
+    frame_clock = pygame.time.Clock()
+
+    game = new_game(args, profiler)
+    recording = new_recording(game, args)
+    fire = [False] * len(keys_of_players)
+
+    step_time = 1.0 / args.tick_rate
 
-    game = Game()
+    # over the network the session steps the game with the inputs of both players
+    session = None
+    if args.net_peer:
+        session = RollbackSession(game, args.net_player, UdpTransport(args.net_port, parse_address(args.net_peer)),
+                                  input_delay=args.net_input_delay, step_time=step_time)
+    accumulator = 0.0
+    last_time = time.monotonic()
 
     running = True
     while running:
@@ -17,38 +122,86 @@ if __name__ == '__main__':
             if event.type == QUIT:
                 running = False
             elif event.type == KEYDOWN:
-                if event.key == K_t:
-                    game.switch_my_tank()
-                elif event.key == K_ESCAPE:
+                for player, (_, fire_key) in enumerate(keys_of_players):
+                    if event.key == fire_key:
+                        fire[player] = True
+                if event.key == K_ESCAPE:
                     running = False
-                elif event.key == K_SPACE:
-                    game.fire()
+                elif session is not None or recording is not None:
+                    # the game of the other side can not be changed from here, the replay knows only the inputs
+                    # and is one match
+                    pass
+                elif event.key == K_t:
+                    game.switch_my_tank()
                 elif event.key == K_r:
-                    game = Game()
+                    game = new_game(args, profiler)
                 elif event.key == K_p:
                     game.testus()
 
         keys = pygame.key.get_pressed()
+        directions = [direction_of_keys(keys, direction_keys) for direction_keys, _ in keys_of_players]
+
+        # simulate all the steps due by now, but no more than --max-frame-skip in a frame:
+        # if the machine can't keep up, the game slows down instead of freezing in catching up
+        current_time = time.monotonic()
+        accumulator += current_time - last_time
+        last_time = current_time
+
+        steps = 0
+        while accumulator >= step_time and steps < args.max_frame_skip:
+            # the input goes to the game (and the recording) step by step, a shot only in one step
+            if session is not None:
+                if not session.advance(controls.bits_of(directions[0], fire[0])):
+                    # too far ahead of the other player: wait for its inputs
+                    accumulator = 0.0
+                    break
+                fire[0] = False
+            else:
+                for player, direction in enumerate(directions):
+                    bits = controls.bits_of(direction, fire[player])
+                    fire[player] = False
+                    game.apply_input(bits, player)
+                    if recording is not None:
+                        recording.record(bits)
+                game.step(step_time)
+            accumulator -= step_time
+            steps += 1
+        if steps == args.max_frame_skip:
+            accumulator = min(accumulator, step_time)
 
-        if keys[pygame.K_UP] or keys[pygame.K_w]:
-            game.my_tank_move_to_direction = Direction.UP
-        elif keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            game.my_tank_move_to_direction = Direction.DOWN
-        elif keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            game.my_tank_move_to_direction = Direction.LEFT
-        elif keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            game.my_tank_move_to_direction = Direction.RIGHT
-        else:
-            game.my_tank_move_to_direction = None
-        
         screen.fill((128, 128, 128))
 
-        game.update()
-        game.render(screen)
+        alpha = accumulator / step_time if args.interpolate else 1.0
+        dirty_rects = game.render(screen, alpha)
+
+        if args.profile:
+            overlay_rect = profiler.render(screen)
+            if dirty_rects is not None:
+                dirty_rects.append(overlay_rect)
 
         if DEBUG:
             pygame.draw.circle(screen, (0, 255, 255), game.my_tank.gun_point, 4, 1)
+            dirty_rects = None
+
+        if dirty_rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty_rects)
+
+        if args.fps:
+            frame_clock.tick(args.fps)
+
+    if args.profile_out:
+        profiler.dump(args.profile_out)
+
+    if recording is not None:
+        recording.save(args.record)
 
-        pygame.display.flip()
+    if session is not None:
+        session.transport.close()
 
     pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,14 @@ class MyBase(GameObject):
         size = ATLAS().real_sprite_size * 2 - 1
         self.size = (size, size)
 
+    @property
+    def screen_rects(self):
+        return (*self.position, self._normal_img.get_width(), self._normal_img.get_height()),
+
+    @property
+    def render_state(self):
+        return self.broken
+
     def render(self, screen):
         img = self._broken_img if self.broken else self._normal_img
         screen.blit(img, self.position)
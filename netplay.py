@@ -0,0 +1,340 @@
+"""
+Two players over the network with rollback. Both peers simulate the whole match (the same seed and options,
+players=2) and send each other only their inputs, every input for a step input_delay steps ahead.
+When the input of the other player for a step has not arrived yet, it is predicted (the last known direction,
+no fire) and the game goes on; if the real input turns out different, the game is restored from the snapshot
+of that step and simulated again up to the current step, within the same frame.
+No more than max_rollback steps are simulated ahead of the inputs of the other player: then the game waits.
+
+    session = RollbackSession(game, player=0, transport=UdpTransport(7777, ('192.168.0.2', 7777)))
+    every step: session.advance(controls.bits_of(direction, fire))
+
+Check it headless, both peers in one process:
+
+    python3 netplay.py --latency 6 --loss 0.1
+
+Packets: INPUTS and the inputs, a byte each; CHECKSUM of the state of a step to find desyncs
+"""
+import argparse
+import os
+import random
+import socket
+import struct
+import time
+import zlib
+
+import controls
+
+# kind, the last step of the receiver's inputs the sender has (all before it too), first step, number of inputs
+INPUTS = struct.Struct('<BiiB')
+# kind, step, crc32 of the snapshot of the game before the step
+CHECKSUM = struct.Struct('<BiI')
+
+KIND_INPUTS = 1
+KIND_CHECKSUM = 2
+
+
+class Transport:
+    """
+    Unreliable datagrams to the other peer: a packet may be lost or come late
+    """
+
+    def send(self, packet: bytes):
+        raise NotImplementedError
+
+    def receive(self):
+        """
+        :return: list of the packets arrived since the last call, never waits
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class LoopbackTransport(Transport):
+    """
+    Both ends in one process, for tests and bots: a packet is received after `latency` calls of receive()
+    of the other end, a `loss` share of the packets is lost
+    """
+
+    def __init__(self, latency=0, loss=0.0, rng=None):
+        self.latency = latency
+        self.loss = loss
+        self.rng = random.Random() if rng is None else rng
+        self.peer = None
+        self._inbox = []  # [calls of receive() to wait, packet]
+
+    @classmethod
+    def pair(cls, latency=0, loss=0.0, seed=None):
+        a = cls(latency, loss, random.Random(seed))
+        b = cls(latency, loss, random.Random(None if seed is None else seed + 1))
+        a.peer, b.peer = b, a
+        return a, b
+
+    def send(self, packet: bytes):
+        if self.loss and self.rng.random() < self.loss:
+            return
+        self.peer._inbox.append([self.latency, bytes(packet)])
+
+    def receive(self):
+        arrived = [packet for wait, packet in self._inbox if wait <= 0]
+        self._inbox = [[wait - 1, packet] for wait, packet in self._inbox if wait > 0]
+        return arrived
+
+
+class UdpTransport(Transport):
+    MAX_PACKET = 1024
+
+    def __init__(self, port, peer_address, host=''):
+        peer_host, peer_port = peer_address
+        self.peer_address = socket.gethostbyname(peer_host), peer_port
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+
+    def send(self, packet: bytes):
+        try:
+            self.socket.sendto(packet, self.peer_address)
+        except OSError:
+            # the peer may be not up yet: the inputs go again with the next packets
+            pass
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                packet, address = self.socket.recvfrom(self.MAX_PACKET)
+            except BlockingIOError:
+                break
+            except OSError:
+                # an error of a previous send (the port of the peer is closed), not of this one
+                continue
+            if address == self.peer_address:
+                packets.append(packet)
+        return packets
+
+    def close(self):
+        self.socket.close()
+
+
+def parse_address(text):
+    """
+    'host:port' -> (host, port)
+    """
+    host, _, port = text.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class RollbackSession:
+    """
+    One peer of a two player match: feeds the game with the inputs of both players, step by step
+    """
+
+    INPUT_DELAY = 2
+    MAX_ROLLBACK = 8
+    MAX_INPUTS_IN_PACKET = 255
+    CHECKSUM_INTERVAL = 60
+
+    def __init__(self, game, player, transport: Transport, input_delay=INPUT_DELAY, max_rollback=MAX_ROLLBACK,
+                 step_time=None):
+        if len(game.player_tanks) != 2:
+            raise ValueError('a rollback session needs a game of 2 players')
+        self.game = game
+        self.player = player
+        self.remote = 1 - player
+        self.transport = transport
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.step_time = game.TICK if step_time is None else step_time
+
+        # the first input_delay steps have no input on both sides
+        start = game.ticks
+        self.local_inputs = {t: 0 for t in range(start, start + input_delay)}  # step -> bits
+        self.remote_inputs = dict(self.local_inputs)
+        self.confirmed = start + input_delay - 1  # the last step with the remote input known for it and all before
+        self.acked = self.confirmed  # the last step with the local input known by the peer for it and all before
+
+        self.predicted = {}  # step -> remote input guessed for it
+        self.snapshots = {}  # step -> the state before it, for the steps that may be simulated again
+
+        self.checksums = {}  # step -> crc32 of the state before it, here and of the peer
+        self.remote_checksums = {}
+        self.desync_step = None  # the first step where the states of the peers differ
+
+        # stats --
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+
+    @property
+    def ahead(self):
+        """
+        Number of steps simulated with predicted input
+        """
+        return self.game.ticks - 1 - self.confirmed
+
+    def advance(self, bits):
+        """
+        One step of the game, the local input is taken for the step input_delay steps later
+        :return: False if the game waits for the inputs of the other player, the input is not taken then
+        """
+        self.poll()
+        if self.ahead >= self.max_rollback:
+            self.stalls += 1
+            self.send()
+            return False
+
+        t = self.game.ticks
+        self.local_inputs[t + self.input_delay] = bits & controls.ALL
+        self.send()
+        self._simulate(t)
+        return True
+
+    def poll(self):
+        """
+        Takes the arrived packets, goes back and simulates again if a prediction was wrong
+        """
+        rollback_to = None
+        for packet in self.transport.receive():
+            kind = packet[0]
+            if kind == KIND_INPUTS and len(packet) >= INPUTS.size:
+                _, ack, first, n = INPUTS.unpack_from(packet)
+                self.acked = max(self.acked, ack)
+                for t, bits in enumerate(packet[INPUTS.size:INPUTS.size + n], first):
+                    if t <= self.confirmed or t in self.remote_inputs:
+                        continue
+                    self.remote_inputs[t] = bits
+                    predicted = self.predicted.pop(t, None)
+                    if predicted is not None and predicted != bits and (rollback_to is None or t < rollback_to):
+                        rollback_to = t
+            elif kind == KIND_CHECKSUM and len(packet) == CHECKSUM.size:
+                _, t, crc = CHECKSUM.unpack(packet)
+                self.remote_checksums[t] = crc
+
+        while self.confirmed + 1 in self.remote_inputs:
+            self.confirmed += 1
+
+        if rollback_to is not None:
+            self._rollback(rollback_to)
+        self._check_states()
+        self._forget()
+
+    def send(self):
+        first = self.acked + 1
+        n = min(max(self.local_inputs, default=self.acked) - first + 1, self.MAX_INPUTS_IN_PACKET)
+        inputs = bytes(self.local_inputs[t] for t in range(first, first + n))
+        self.transport.send(INPUTS.pack(KIND_INPUTS, self.confirmed, first, n) + inputs)
+
+    def _prediction(self):
+        # the player goes on the same way, a shot is rarely in two steps in a row
+        return self.remote_inputs.get(self.confirmed, 0) & ~controls.FIRE
+
+    def _simulate(self, t):
+        game = self.game
+        remote = self.remote_inputs.get(t)
+        final = t - 1 <= self.confirmed  # the state before the step does not depend on predictions
+        checkpoint = t % self.CHECKSUM_INTERVAL == 0
+        state = game.snapshot() if remote is None or checkpoint else None
+        # kept to go back to this step, or to check the state when it is final; a previous one is out of date
+        if remote is None or (checkpoint and not final):
+            self.snapshots[t] = state
+        else:
+            self.snapshots.pop(t, None)
+        if remote is None:
+            remote = self.predicted[t] = self._prediction()
+        if checkpoint and final and t not in self.checksums:
+            self._add_checksum(t, state)
+
+        inputs = [0, 0]
+        inputs[self.player] = self.local_inputs[t]
+        inputs[self.remote] = remote
+        for player, player_bits in enumerate(inputs):
+            game.apply_input(player_bits, player)
+        game.step(self.step_time)
+
+    def _rollback(self, t):
+        game = self.game
+        now = game.ticks
+        game.restore(self.snapshots[t])
+        self.rollbacks += 1
+        while game.ticks < now:
+            self._simulate(game.ticks)
+            self.resimulated += 1
+
+    def _add_checksum(self, t, data):
+        crc = zlib.crc32(data)
+        self.checksums[t] = crc
+        self.transport.send(CHECKSUM.pack(KIND_CHECKSUM, t, crc))
+
+    def _check_states(self):
+        # the states of the steps simulated with predictions that turned out right
+        for t, data in self.snapshots.items():
+            if t % self.CHECKSUM_INTERVAL == 0 and t - 1 <= self.confirmed and t not in self.checksums:
+                self._add_checksum(t, data)
+
+        for t in [t for t in self.remote_checksums if t in self.checksums]:
+            if self.remote_checksums.pop(t) != self.checksums.pop(t) and self.desync_step is None:
+                self.desync_step = t
+
+    def _forget(self):
+        confirmed = self.confirmed
+        for t in [t for t in self.snapshots if t <= confirmed]:
+            del self.snapshots[t]
+        # the remote inputs of the steps to simulate (again), the last confirmed one to predict from
+        for t in [t for t in self.remote_inputs if t < min(confirmed, self.game.ticks)]:
+            del self.remote_inputs[t]
+        # the local inputs still to send or to simulate again
+        done = min(self.acked, confirmed, self.game.ticks - 1)
+        for t in [t for t in self.local_inputs if t <= done]:
+            del self.local_inputs[t]
+        # the checksums the peer has lost
+        old = confirmed - 16 * self.CHECKSUM_INTERVAL
+        for checksums in (self.checksums, self.remote_checksums):
+            for t in [t for t in checksums if t < old]:
+                del checksums[t]
+
+
+def main():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    from game import Game
+    from util import FixedClock
+
+    parser = argparse.ArgumentParser(description='Play a two player match between two bots in one process, '
+                                                 'over a loopback transport with latency and loss.')
+    parser.add_argument('--steps', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=int, default=4, help='in steps')
+    parser.add_argument('--loss', type=float, default=0.0, help='share of the lost packets')
+    parser.add_argument('--input-delay', type=int, default=RollbackSession.INPUT_DELAY)
+    parser.add_argument('--versus', action='store_true')
+    args = parser.parse_args()
+
+    transports = LoopbackTransport.pair(args.latency, args.loss, seed=args.seed)
+    sessions = [RollbackSession(Game(clock=FixedClock(), seed=args.seed, players=2, versus=args.versus), player,
+                                transport, input_delay=args.input_delay)
+                for player, transport in enumerate(transports)]
+    bots = [random.Random(args.seed * 2 + player) for player in range(2)]
+    directions = [0, controls.UP, controls.DOWN, controls.LEFT, controls.RIGHT]
+    bits = [0, 0]
+
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        for player, session in enumerate(sessions):
+            rng = bots[player]
+            if rng.random() < 0.05:
+                bits[player] = rng.choice(directions)
+            session.advance(bits[player] | (controls.FIRE if rng.random() < 0.05 else 0))
+    elapsed = time.perf_counter() - t0
+
+    for player, session in enumerate(sessions):
+        print(f'player {player}: step {session.game.ticks}, {session.rollbacks} rollbacks, '
+              f'{session.resimulated} steps simulated again, {session.stalls} stalls, '
+              f'desync: {"none" if session.desync_step is None else "at step %d" % session.desync_step}')
+    steps = sum(session.game.ticks + session.resimulated for session in sessions)
+    print(f'{steps} steps in {elapsed:.2f} s, {steps / elapsed:.0f} steps per second')
+
+
+if __name__ == '__main__':
+    main()
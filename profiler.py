@@ -0,0 +1,142 @@
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+
+class _Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class FrameProfiler:
+    """
+    Times named sections of every tick/frame and keeps rolling percentiles over the last WINDOW samples
+
+        with profiler.section('update_tanks'):
+            ...
+    """
+
+    WINDOW = 600
+    PERCENTILES = (50, 95, 99)
+
+    OVERLAY_REFRESH = 30  # frames between the overlay text updates, sorting samples is not free
+    OVERLAY_COLOR = (255, 255, 0)
+    OVERLAY_BACKGROUND = (0, 0, 0)
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._samples = {}  # name -> deque of seconds, in the order of the first appearance
+        self._sections = {}
+        self._font = None
+        self._overlay = None
+        self._frames_to_refresh = 0
+
+    def section(self, name):
+        section = self._sections.get(name)
+        if section is None:
+            section = self._sections[name] = _Section(self, name)
+        return section
+
+    def record(self, name, seconds):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentiles(self, name):
+        """
+        :return: dict {percent: milliseconds}
+        """
+        samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return {p: 0.0 for p in self.PERCENTILES}
+        last = len(samples) - 1
+        return {p: samples[round(last * p / 100)] * 1000.0 for p in self.PERCENTILES}
+
+    def summary(self):
+        result = {}
+        for name, samples in self._samples.items():
+            stats = {f'p{p}_ms': round(v, 4) for p, v in self.percentiles(name).items()}
+            stats['mean_ms'] = round(sum(samples) / len(samples) * 1000.0, 4)
+            stats['samples'] = len(samples)
+            result[name] = stats
+        return result
+
+    def dump(self, filename):
+        """
+        Saves the summary as CSV or JSON, depending on the extension of the file
+        """
+        summary = self.summary()
+        if filename.endswith('.csv'):
+            with open(filename, 'w', newline='') as f:
+                writer = None
+                for name, stats in summary.items():
+                    if writer is None:
+                        writer = csv.DictWriter(f, fieldnames=['section', *stats])
+                        writer.writeheader()
+                    writer.writerow({'section': name, **stats})
+        else:
+            with open(filename, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+    def _make_overlay(self):
+        if self._font is None:
+            self._font = pygame.font.Font(None, 16)
+
+        lines = ['section           p50    p95    p99 ms']
+        for name in self._samples:
+            p = self.percentiles(name)
+            lines.append(f'{name[:16]:<16} {p[50]:6.2f} {p[95]:6.2f} {p[99]:6.2f}')
+
+        labels = [self._font.render(line, 1, self.OVERLAY_COLOR) for line in lines]
+        line_height = self._font.get_linesize()
+        overlay = pygame.Surface((max(label.get_width() for label in labels) + 4, line_height * len(labels) + 4))
+        overlay.fill(self.OVERLAY_BACKGROUND)
+        for i, label in enumerate(labels):
+            overlay.blit(label, (2, 2 + i * line_height))
+        return overlay
+
+    def render(self, screen, position=(5, 25)):
+        """
+        Draws the timing table over the game
+        :return: the rect of the screen painted
+        """
+        if self._overlay is None or self._frames_to_refresh <= 0:
+            self._overlay = self._make_overlay()
+            self._frames_to_refresh = self.OVERLAY_REFRESH
+        self._frames_to_refresh -= 1
+        return screen.blit(self._overlay, position)
+
+
+class NullProfiler(FrameProfiler):
+    """
+    Does nothing, the default one
+    """
+
+    class _NullSection:
+        def __enter__(self):
+            ...
+
+        def __exit__(self, *_):
+            ...
+
+    _null_section = _NullSection()
+
+    def section(self, name):
+        return self._null_section
+
+    def record(self, name, seconds):
+        ...
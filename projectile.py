@@ -1,32 +1,62 @@
 from util import *
 from config import *
+from functools import lru_cache
+from ecs import ColumnStore, MOTION_COMPONENTS
 import pygame
 
 
-class Projectile(GameObject):
+class Projectile(Entity):
+    __slots__ = ('sender', 'direction', 'power', 'sprite', 'prev_position')
+
     CENTRAL_SHIFT_X = -8
     CENTRAL_SHIFT_Y = -15
     SPEED = 8
 
+    # no obstacle is thinner than a half brick (half of a cell), so a sweep with such steps can not skip it
+    SWEEP_STEP = 8
+
     SHIFT_BACK = -2
 
     POWER_NORMAL = 1
     POWER_HIGH = 2
 
+    pool = Pool()
+
     def __init__(self, x, y, d: Direction, power=POWER_NORMAL, sender=None):
         super().__init__()
+        self._setup(x, y, d, power, sender)
 
+    def _setup(self, x, y, d: Direction, power, sender):
         self.sender = sender
-        self.position = x, y
+        self.position = self.prev_position = x, y
         self.direction = d
         self.power = power
-
-        self.sprite = {
-            (0, -1): ATLAS().image_at(40, 12, 1, 2),
-            (-1, 0): ATLAS().image_at(41, 12, 1, 2),
-            (0, 1): ATLAS().image_at(42, 12, 1, 2),
-            (1, 0): ATLAS().image_at(43, 12, 1, 2)
-        }[d.vector]
+        self.sprite = self.sprite_table(ATLAS())[d]
+
+    @classmethod
+    def acquire(cls, x, y, d: Direction, power=POWER_NORMAL, sender=None):
+        """
+        A projectile from the pool (or a new one), give it back with release() when it is removed
+        """
+        p = cls.pool.take()
+        if p is None:
+            return cls(x, y, d, power, sender)
+        p._setup(x, y, d, power, sender)
+        return p
+
+    def release(self):
+        self.sender = None
+        self.pool.give_back(self)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def sprite_table(atlas):
+        return {
+            Direction.UP: atlas.image_at(40, 12, 1, 2),
+            Direction.LEFT: atlas.image_at(41, 12, 1, 2),
+            Direction.DOWN: atlas.image_at(42, 12, 1, 2),
+            Direction.RIGHT: atlas.image_at(43, 12, 1, 2)
+        }
 
     @property
     def on_screen(self):
@@ -41,13 +71,21 @@ class Projectile(GameObject):
             w, h = h, w
         return x - w, y - h, w * 2, h * 2
 
-    def render(self, screen: pygame.Surface):
+    @property
+    def sprite_position(self):
         x, y = self.position
         sbx, sby = self.direction.vector
         sbx *= self.SHIFT_BACK
         sby *= self.SHIFT_BACK
-        screen.blit(self.sprite, (x + self.CENTRAL_SHIFT_X - sbx,
-                                  y + self.CENTRAL_SHIFT_Y - sby))
+        return x + self.CENTRAL_SHIFT_X - sbx, y + self.CENTRAL_SHIFT_Y - sby
+
+    @property
+    def screen_rects(self):
+        return (*self.sprite_position, self.sprite.get_width(), self.sprite.get_height()),
+
+    def render(self, screen: pygame.Surface):
+        x, y = self.position
+        screen.blit(self.sprite, self.sprite_position)
 
         if PROJECTILE_DEBUG:
             # pygame.draw.rect(screen, (255, 0, 0), self.bounding_rect)
@@ -55,13 +93,22 @@ class Projectile(GameObject):
             #     pygame.draw.circle(screen, (0, 100, 0), (x, y), 5)
             pygame.draw.circle(screen, (0, 200, 0), (x, y), 4)
 
-        if not self.on_screen:
-            self.remove_from_parent()
-
     def update(self):
+        self.prev_position = self.position
         vx, vy = self.direction.vector
         self.move(vx * self.SPEED, vy * self.SPEED)
 
+    def sweep(self, max_step=SWEEP_STEP):
+        """
+        Positions passed by the last update, no more than max_step apart
+        :return: list of (x, y) from the first step after prev_position up to the current position
+        """
+        x0, y0 = self.prev_position
+        x1, y1 = self.position
+        dx, dy = x1 - x0, y1 - y0
+        n = max(1, -(-max(abs(dx), abs(dy)) // max_step))
+        return [(x0 + dx * i // n, y0 + dy * i // n) for i in range(1, n + 1)]
+
     def split_for_aim(self):
         """разбивает снаряд на 3 виртуальных для равномерности разрушения"""
         x, y = self.position
@@ -75,5 +122,57 @@ class Projectile(GameObject):
             (x - px, y - py)
         )
 
-    def __hash__(self):
-        return id(self)
+
+class StoredProjectile(Projectile):
+    """
+    Projectile whose position lives in the columns of a ColumnStore, so ecs.movement_system moves all of them at once
+    """
+    __slots__ = ('store', 'row')
+
+    pool = Pool()
+
+    def __init__(self, store: ColumnStore, x, y, d: Direction, power=Projectile.POWER_NORMAL, sender=None):
+        self.store = store
+        self.row = None
+        super().__init__(x, y, d, power, sender)
+
+    @staticmethod
+    def make_store():
+        return ColumnStore(*MOTION_COMPONENTS)
+
+    def _setup(self, x, y, d: Direction, power, sender):
+        vx, vy = d.vector
+        self.row = self.store.spawn(self, x=x, y=y, prev_x=x, prev_y=y, vx=vx * self.SPEED, vy=vy * self.SPEED)
+        super()._setup(x, y, d, power, sender)
+
+    @classmethod
+    def acquire(cls, store: ColumnStore, x, y, d: Direction, power=Projectile.POWER_NORMAL, sender=None):
+        p = cls.pool.take()
+        if p is None:
+            return cls(store, x, y, d, power, sender)
+        p.store = store
+        p._setup(x, y, d, power, sender)
+        return p
+
+    def release(self):
+        self.store.kill(self.row)
+        self.row = None
+        super().release()
+
+    @property
+    def position(self):
+        row = self.row
+        return self.store.x[row], self.store.y[row]
+
+    @position.setter
+    def position(self, p):
+        self.store.x[self.row], self.store.y[self.row] = p
+
+    @property
+    def prev_position(self):
+        row = self.row
+        return self.store.prev_x[row], self.store.prev_y[row]
+
+    @prev_position.setter
+    def prev_position(self, p):
+        self.store.prev_x[self.row], self.store.prev_y[self.row] = p
@@ -0,0 +1,197 @@
+"""
+Replays: the seed and the options of a match and the input of the player in every step.
+The simulation is deterministic, so that is enough to play the match again, headless and as fast as it goes.
+
+Record a match (the debug keys and the restart are off while recording):
+
+    python3 main.py --record match.replay
+
+Play it back and show the result (at a given step with --seek):
+
+    python3 replay.py match.replay
+    python3 replay.py match.replay --seek 3600
+
+File: HEADER, then the inputs as runs of (bits, number of steps) in RUN
+"""
+import argparse
+import os
+import struct
+import time
+
+import controls
+from ai import EnemyFractionAI
+from game import Game
+from util import FixedClock
+
+MAGIC = b'BCRP'
+VERSION = 1
+
+# magic, version, seed, level, tick rate, flags
+HEADER = struct.Struct('<4sBQBHB')
+MAX_SEED = (1 << 64) - 1  # the seed is kept unsigned
+RUN = struct.Struct('<BH')
+
+FLAG_SWEPT_PROJECTILES = 1
+FLAG_SIGHT_FIRE = 2
+FLAG_AI_FLOW = 4
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Replay:
+    def __init__(self, seed, level=1, tick_rate=60, flags=0, inputs=None):
+        # at the start, not when the match is over and saved
+        if not 0 <= seed <= MAX_SEED:
+            raise ReplayError(f'seed {seed} can not be recorded, it must be 0..{MAX_SEED}')
+        self.seed = seed
+        self.level = level
+        self.tick_rate = tick_rate
+        self.flags = flags
+        self.inputs = bytearray() if inputs is None else inputs  # bits of every step
+
+    def __len__(self):
+        return len(self.inputs)
+
+    @classmethod
+    def of_game(cls, game, tick_rate):
+        if len(game.player_tanks) != 1:
+            raise ReplayError('only single player matches can be recorded')
+        flags = 0
+        if game.swept_projectiles:
+            flags |= FLAG_SWEPT_PROJECTILES
+        if game.ai.sight is not None:
+            flags |= FLAG_SIGHT_FIRE
+        if game.ai.mode == game.ai.MODE_FLOW:
+            flags |= FLAG_AI_FLOW
+        return cls(game.seed, game.level, tick_rate, flags)
+
+    def new_game(self, **kwargs):
+        """
+        A game in the state of the start of the match
+        """
+        return Game(clock=FixedClock(), seed=self.seed, level=self.level,
+                    swept_projectiles=bool(self.flags & FLAG_SWEPT_PROJECTILES),
+                    sight_fire=bool(self.flags & FLAG_SIGHT_FIRE),
+                    ai_mode=EnemyFractionAI.MODE_FLOW if self.flags & FLAG_AI_FLOW else EnemyFractionAI.MODE_RANDOM,
+                    players=1, versus=False, **kwargs)
+
+    @property
+    def step_time(self):
+        return 1.0 / self.tick_rate
+
+    def record(self, bits):
+        self.inputs.append(bits & controls.ALL)
+
+    def to_bytes(self):
+        chunks = [HEADER.pack(MAGIC, VERSION, self.seed, self.level, self.tick_rate, self.flags)]
+        inputs = self.inputs
+        i, n = 0, len(inputs)
+        while i < n:
+            bits, run = inputs[i], 1
+            while i + run < n and inputs[i + run] == bits and run < 0xFFFF:
+                run += 1
+            chunks.append(RUN.pack(bits, run))
+            i += run
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise ReplayError('not a replay: too short')
+        magic, version, seed, level, tick_rate, flags = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError('not a replay')
+        if version != VERSION:
+            raise ReplayError(f'replay version {version} is not supported')
+        if (len(data) - HEADER.size) % RUN.size:
+            raise ReplayError('replay is truncated')
+
+        inputs = bytearray()
+        for bits, run in RUN.iter_unpack(data[HEADER.size:]):
+            inputs += bytes((bits,)) * run
+        return cls(seed, level, tick_rate, flags, inputs)
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayPlayer:
+    """
+    Plays a replay in a headless game, step by step or as fast as possible.
+    Keeps a snapshot of the game every SNAPSHOT_INTERVAL steps played, to seek back without playing from the start
+    """
+
+    SNAPSHOT_INTERVAL = 600
+
+    def __init__(self, replay: Replay):
+        self.replay = replay
+        self.game = None
+        self.snapshots = {}  # step -> snapshot of the game after it
+        self.restart()
+
+    def restart(self):
+        self.game = self.replay.new_game()
+
+    @property
+    def tick(self):
+        return self.game.ticks
+
+    @property
+    def done(self):
+        return self.tick >= len(self.replay)
+
+    def step(self):
+        self.game.apply_input(self.replay.inputs[self.tick])
+        self.game.step(self.replay.step_time)
+        if self.tick % self.SNAPSHOT_INTERVAL == 0 and self.tick not in self.snapshots:
+            self.snapshots[self.tick] = self.game.snapshot()
+
+    def seek(self, tick):
+        """
+        Brings the game to the state after the given number of steps (the end of the replay at most)
+        """
+        tick = min(tick, len(self.replay))
+        # the nearest snapshot before the step, if it saves playing from here (or there is no way back)
+        saved = max((t for t in self.snapshots if t <= tick), default=None)
+        if saved is not None and (tick < self.tick or saved > self.tick):
+            self.game.restore(self.snapshots[saved])
+        elif tick < self.tick:
+            self.restart()
+        while self.tick < tick:
+            self.step()
+
+    def run(self):
+        self.seek(len(self.replay))
+
+
+def main():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    parser = argparse.ArgumentParser(description='Play a replay headless and show the result.')
+    parser.add_argument('filename')
+    parser.add_argument('--seek', type=int, default=None, help='stop after this step')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.filename)
+    t0 = time.perf_counter()
+    player = ReplayPlayer(replay)
+    player.seek(len(replay) if args.seek is None else args.seek)
+    elapsed = time.perf_counter() - t0
+
+    game = player.game
+    print(f'seed {replay.seed}, level {replay.level}, {len(replay)} steps at {replay.tick_rate} per second')
+    print(f'step {player.tick}: score {game.score}, kills {sum(game.kills.values())}, '
+          f'game over: {game.is_game_over}')
+    print(f'played in {elapsed:.2f} s, {player.tick / elapsed if elapsed else 0:.0f} steps per second')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,20 @@
-from util import GameObject, ArmedTimer
+from util import GameObject, ArmedTimer, Clock
 from config import *
 import pygame
 from collections import namedtuple
 
 
-ScoreNode = namedtuple('ScoreNode', ('x', 'y', 'sprite', 'timer'))
+ScoreNode = namedtuple('ScoreNode', ('x', 'y', 'score', 'sprite', 'timer'))
 
 
 class ScoreLayer(GameObject):
     SCORE_STAY_TIME = 1.0
 
-    def __init__(self):
+    def __init__(self, clock: Clock):
         super().__init__()
+        self.clock = clock
         self._entities = []
+        self._listeners = []
 
         a = ATLAS()
 
@@ -29,22 +31,38 @@ class ScoreLayer(GameObject):
             500: score_sprite(44, 20),
         }
 
+    def add_listener(self, listener):
+        """
+        The listener is called as listener(x, y, score) with the arguments of every add() of a score it can show
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
     def add(self, x, y, score):
         if score not in self._sprites:
             print(f"I can't show this score: {score}")
             return
 
+        for listener in self._listeners:
+            listener(x, y, score)
+
         x -= self._dx
         y += self._dx
 
         self._entities.append(ScoreNode(
-            x, y,
+            x, y, score,
             self._sprites[score],
-            ArmedTimer(self.SCORE_STAY_TIME)
+            ArmedTimer(self.clock, self.SCORE_STAY_TIME)
         ))
 
+    @property
+    def screen_rects(self):
+        return tuple((x, y, sprite.get_width(), sprite.get_height()) for x, y, _, sprite, _ in self._entities)
+
     def render(self, screen: pygame.Surface):
-        for x, y, sprite, _ in self._entities:
+        for x, y, _, sprite, _ in self._entities:
             screen.blit(sprite, (x, y))
 
     def update(self):
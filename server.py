@@ -0,0 +1,426 @@
+"""
+Headless server of many matches in one process: every match is a Game stepped by one scheduler at a fixed rate,
+the players send their inputs over TCP and get the state of their match as deltas of its snapshots,
+the spectators get the much smaller frames of what they see (spectate.py).
+
+    python3 server.py --port 7000
+    python3 loadgen.py --port 7000 --matches 40 --seconds 10
+
+Messages: MESSAGE (length of the body, kind), then the body
+    from a client: JOIN (match id or NEW_MATCH, players of a new match), INPUT (bits), STATS
+    from the server: WELCOME (match id, player or SPECTATOR, seed, level, players, step),
+                     STATE (step, keyframe) and zlib of the snapshot or of its XOR with the one sent before,
+                     FRAME (to a spectator) a keyframe or a delta of spectate.py,
+                     STATS (JSON of the counters)
+Under load the server degrades instead of falling behind: the matches that do not fit into the time of a tick
+wait for the next one (and go first then), a match too slow for its budget runs at half rate,
+a client that does not read fast enough misses states and gets a keyframe when it catches up.
+"""
+import os
+
+# no window: the matches are not rendered, must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import sys
+import time
+import traceback
+import zlib
+from itertools import count
+
+import controls
+from game import Game
+from spectate import SpectatorEncoder, SpectateError
+from util import FixedClock
+
+# length of the body, kind
+MESSAGE = struct.Struct('<IB')
+# match id or NEW_MATCH, players of a new match
+JOIN = struct.Struct('<HB')
+INPUT = struct.Struct('<B')
+# match id, player or SPECTATOR, seed, level, players, step
+WELCOME = struct.Struct('<HBQBBI')
+# step, keyframe
+STATE = struct.Struct('<I?')
+
+KIND_JOIN = 1
+KIND_INPUT = 2
+KIND_STATS = 3
+KIND_WELCOME = 4
+KIND_STATE = 5
+KIND_FRAME = 6
+
+NEW_MATCH = 0xFFFF
+SPECTATOR = 0xFF
+MAX_MESSAGE = 1 << 20
+
+
+def message(kind, body=b''):
+    return MESSAGE.pack(len(body), kind) + body
+
+
+async def read_message(reader: asyncio.StreamReader):
+    """
+    :return: (kind, body), raises asyncio.IncompleteReadError when the connection is closed
+    """
+    length, kind = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    if length > MAX_MESSAGE:
+        raise ValueError(f'message of {length} bytes is too long')
+    return kind, await reader.readexactly(length)
+
+
+def xor_bytes(data, previous):
+    """
+    XOR of data with previous, which is cut or padded with zeros to the length of data
+    """
+    n = len(data)
+    previous = previous[:n].ljust(n, b'\0')
+    return (int.from_bytes(data, 'little') ^ int.from_bytes(previous, 'little')).to_bytes(n, 'little')
+
+
+def encode_state(step, data, previous=None):
+    """
+    :param previous: the snapshot sent before, None for a keyframe
+    :return: the body of a STATE message
+    """
+    keyframe = previous is None
+    payload = data if keyframe else xor_bytes(data, previous)
+    return STATE.pack(step, keyframe) + zlib.compress(payload, 1)
+
+
+def decode_state(body, previous=None):
+    """
+    :param previous: the snapshot got before, needed unless the state is a keyframe
+    :return: (step, snapshot)
+    """
+    step, keyframe = STATE.unpack_from(body)
+    payload = zlib.decompress(body[STATE.size:])
+    if keyframe:
+        return step, payload
+    if previous is None:
+        raise ValueError('a delta without the state before it')
+    return step, xor_bytes(payload, previous)
+
+
+class Client:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.match = None
+        self.player = SPECTATOR
+        self.needs_keyframe = True
+
+    def send(self, data):
+        self.writer.write(data)
+
+    @property
+    def backlog(self):
+        """
+        Bytes written and not sent yet
+        """
+        return self.writer.transport.get_write_buffer_size()
+
+
+class Match:
+    def __init__(self, match_id, seed, players=1, level=1):
+        self.id = match_id
+        self.seed = seed
+        self.game = Game(clock=FixedClock(), seed=seed, level=level, players=players)
+        self.clients = []
+        self.inputs = [0] * players
+        self.free_players = list(range(players))
+
+        self.previous = None  # the snapshot of the last broadcast
+        self.spectate = None  # SpectatorEncoder, from the first spectator on
+        self.broadcasts = 0
+        self.cost = 0.0  # moving average of the time of a step, seconds
+        self.skipped = 0
+        self.throttled = 0
+
+    def set_input(self, player, bits):
+        # a shot waits for the next step even if other input comes before it
+        self.inputs[player] = (bits & controls.ALL) | (self.inputs[player] & controls.FIRE)
+
+    def step(self, dt):
+        game = self.game
+        for player, bits in enumerate(self.inputs):
+            game.apply_input(bits, player)
+        self.inputs = [bits & ~controls.FIRE for bits in self.inputs]
+        game.step(dt)
+
+
+class MatchServer:
+    TICK_BUDGET = 0.8  # share of a tick all the matches may take
+    MATCH_BUDGET = 0.25  # share of a tick one match may take, a slower one runs at half rate
+    COST_SMOOTHING = 0.05
+    MAX_LAG = 5  # ticks the scheduler catches up at most, more is dropped
+    KEYFRAME_INTERVAL = 120  # broadcasts
+    MAX_BACKLOG = 64 * 1024  # bytes not sent to a client yet, then its states are skipped
+
+    def __init__(self, tick_rate=60, broadcast_every=1, level=1, seed=None):
+        self.period = 1.0 / tick_rate
+        self.tick_rate = tick_rate
+        self.broadcast_every = broadcast_every
+        self.level = level
+        self.rng = random.Random(seed)
+
+        self.matches = {}  # id -> Match
+        self._order = []  # the matches in the order of stepping: the ones skipped in the last tick first
+        self._ids = count(1)
+
+        # counters --
+        self.ticks = 0
+        self.steps = 0
+        self.skipped = 0
+        self.throttled = 0
+        self.step_time = 0.0
+        self.busy_time = 0.0
+        self.states_sent = 0
+        self.states_dropped = 0
+        self.spectate_errors = 0
+        self.match_errors = 0
+        self.bytes_sent = 0
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+
+    # --- matches ---
+
+    def new_match(self, players=1):
+        match_id = next(self._ids) % NEW_MATCH
+        while match_id in self.matches:
+            match_id = next(self._ids) % NEW_MATCH
+        match = Match(match_id, self.rng.randrange(1 << 32), players, self.level)
+        self.matches[match_id] = match
+        self._order.append(match)
+        return match
+
+    def join(self, client: Client, match_id=NEW_MATCH, players=1):
+        match = self.matches.get(match_id)
+        if match is None:
+            match = self.new_match(max(1, min(players, len(Game.PLAYER_COLORS))))
+        client.match = match
+        client.player = match.free_players.pop(0) if match.free_players else SPECTATOR
+        client.needs_keyframe = True
+        if client.player == SPECTATOR and match.spectate is None:
+            match.spectate = SpectatorEncoder(match.game)
+        match.clients.append(client)
+        game = match.game
+        client.send(message(KIND_WELCOME, WELCOME.pack(match.id, client.player, match.seed, game.level,
+                                                       len(game.player_tanks), game.ticks)))
+
+    def leave(self, client: Client):
+        match = client.match
+        if match is None:
+            return
+        match.clients.remove(client)
+        if client.player != SPECTATOR:
+            match.inputs[client.player] = 0
+            match.free_players.append(client.player)
+        client.match = None
+        if not match.clients:
+            del self.matches[match.id]
+            self._order.remove(match)
+
+    def close_match(self, match: Match):
+        """
+        Drops the match and disconnects its clients
+        """
+        for client in match.clients:
+            client.match = None
+            client.writer.close()
+        match.clients = []
+        if match.spectate is not None:
+            match.spectate.close()
+        del self.matches[match.id]
+
+    # --- scheduler ---
+
+    def tick(self):
+        """
+        Steps and broadcasts the matches that fit into the budget of the tick
+        """
+        started = time.perf_counter()
+        deadline = started + self.period * self.TICK_BUDGET
+        match_budget = self.period * self.MATCH_BUDGET
+        stepped, waiting = [], []
+        for match in self._order:
+            if stepped and time.perf_counter() > deadline:
+                match.skipped += 1
+                self.skipped += 1
+                waiting.append(match)
+                continue
+            if match.cost > match_budget and self.ticks % 2:
+                match.throttled += 1
+                self.throttled += 1
+                stepped.append(match)
+                continue
+
+            t0 = time.perf_counter()
+            try:
+                match.step(self.period)
+            except Exception:
+                # a broken match is closed, the others go on
+                self.match_errors += 1
+                print(f'match {match.id} failed at step {match.game.ticks}, closed', file=sys.stderr)
+                traceback.print_exc()
+                self.close_match(match)
+                continue
+            cost = time.perf_counter() - t0
+            match.cost += (cost - match.cost) * self.COST_SMOOTHING
+            self.step_time += cost
+            self.steps += 1
+            if match.game.ticks % self.broadcast_every == 0:
+                self.broadcast(match)
+            stepped.append(match)
+
+        self._order = waiting + stepped
+        self.ticks += 1
+        self.busy_time += time.perf_counter() - started
+
+    def broadcast(self, match: Match):
+        data = match.game.snapshot()
+        step = match.game.ticks
+        keyframe = match.previous is None or match.broadcasts % self.KEYFRAME_INTERVAL == 0
+        # the frame of every step sent goes to the spectators who have the one before
+        frame_delta, frame_key = self.spectator_frames(match, keyframe)
+        # made once for all the clients of the match, when needed
+        delta = key = None
+        for client in match.clients:
+            if client.backlog > self.MAX_BACKLOG:
+                # it will not know the state the next delta is made from
+                client.needs_keyframe = True
+                self.states_dropped += 1
+                continue
+            if client.player == SPECTATOR:
+                if frame_delta is None:
+                    continue
+                if keyframe or client.needs_keyframe:
+                    out = frame_key
+                    client.needs_keyframe = False
+                else:
+                    out = frame_delta
+            elif keyframe or client.needs_keyframe:
+                if key is None:
+                    key = message(KIND_STATE, encode_state(step, data))
+                out = key
+                client.needs_keyframe = False
+            else:
+                if delta is None:
+                    delta = message(KIND_STATE, encode_state(step, data, match.previous))
+                out = delta
+            client.send(out)
+            self.states_sent += 1
+            self.bytes_sent += len(out)
+        match.previous = data
+        match.broadcasts += 1
+
+    def spectator_frames(self, match: Match, keyframe):
+        """
+        :return: the messages of the delta and the keyframe of the step for the spectators of the match,
+        the keyframe only when one of them needs it; None, None when the match has no stream this step.
+        A failed encoder stops only the stream of its match: it is made anew and every spectator waits for a keyframe
+        """
+        if match.spectate is None:
+            return None, None
+        spectators = [client for client in match.clients if client.player == SPECTATOR]
+        try:
+            frame_delta = message(KIND_FRAME, match.spectate.delta())
+            frame_key = None
+            if keyframe or any(client.needs_keyframe for client in spectators):
+                frame_key = message(KIND_FRAME, match.spectate.keyframe())
+        except SpectateError:
+            self.spectate_errors += 1
+            match.spectate.close()
+            match.spectate = SpectatorEncoder(match.game)
+            for client in spectators:
+                client.needs_keyframe = True
+            return None, None
+        return frame_delta, frame_key
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self.tick()
+            next_tick += self.period
+            now = loop.time()
+            if now - next_tick > self.period * self.MAX_LAG:
+                # too far behind to catch up: go on from now, the matches run slower
+                next_tick = now
+            await asyncio.sleep(max(next_tick - now, 0))
+
+    # --- network ---
+
+    def stats(self):
+        elapsed = time.perf_counter() - self._started
+        return {
+            'elapsed': elapsed,
+            'cpu': time.process_time() - self._cpu_started,
+            'tick_rate': self.tick_rate,
+            'matches': len(self.matches),
+            'clients': sum(len(m.clients) for m in self.matches.values()),
+            'ticks': self.ticks,
+            'steps': self.steps,
+            'skipped': self.skipped,
+            'throttled': self.throttled,
+            'step_time': self.step_time,
+            'busy_time': self.busy_time,
+            'states_sent': self.states_sent,
+            'states_dropped': self.states_dropped,
+            'spectate_errors': self.spectate_errors,
+            'match_errors': self.match_errors,
+            'bytes_sent': self.bytes_sent,
+        }
+
+    def on_message(self, client: Client, kind, body):
+        if kind == KIND_JOIN:
+            if client.match is not None:
+                self.leave(client)
+            self.join(client, *JOIN.unpack(body))
+        elif kind == KIND_INPUT:
+            if client.match is not None and client.player != SPECTATOR:
+                client.match.set_input(client.player, INPUT.unpack(body)[0])
+        elif kind == KIND_STATS:
+            client.send(message(KIND_STATS, json.dumps(self.stats()).encode()))
+
+    async def on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = Client(writer)
+        try:
+            while True:
+                kind, body = await read_message(reader)
+                self.on_message(client, kind, body)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+            pass
+        finally:
+            self.leave(client)
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.on_client, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Host many headless matches, see loadgen.py to load it.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7000)
+    parser.add_argument('--tick-rate', type=int, default=60)
+    parser.add_argument('--broadcast-every', type=int, default=1, help='send the state every N steps')
+    parser.add_argument('--level', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None, help='of the seeds of the matches')
+    args = parser.parse_args()
+
+    server = MatchServer(args.tick_rate, args.broadcast_every, args.level, args.seed)
+    print(f'serving on {args.host}:{args.port} at {args.tick_rate} steps per second')
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
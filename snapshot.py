@@ -0,0 +1,421 @@
+"""
+The whole state of a game simulation as a compact binary buffer:
+
+    data = game.snapshot()
+    ...
+    game.restore(data)  # the game continues exactly as it would have after the snapshot
+
+Sprites, surfaces and caches are not saved, they are made again from the saved state.
+Objects referring to each other (tanks, projectiles, the maps they occupy) are saved as codes:
+indices in the table [None, base, *tanks, *projectiles, *bonuses] of the moment of the snapshot.
+The parts of a fixed size go first, so the snapshots of two close moments differ at the same places
+and their XOR is mostly zeros, see server.py
+"""
+import struct
+
+from ai import TankAI
+from bonus import Bonus, BonusType
+from bonus_field_protect import FieldProtector
+from explosion import Explosion
+from field import CellType
+from score_node import ScoreNode
+from tank import Tank
+from ui import GameOverLabel
+from util import Direction, ArmedTimer, FixedClock
+
+MAGIC = b'BCSS'
+VERSION = 5
+
+# magic, version, ticks, clock time, score, game over labels, base broken, level, players
+HEADER = struct.Struct('<4sBIdIB?BB')
+KILLS = struct.Struct(f'<{len(Tank.Type)}H')
+# delay, state, last time, done
+ANIMATOR = struct.Struct('<dBd?')
+COUNT = struct.Struct('<H')
+# tank code, direction, frags
+PLAYER = struct.Struct('<HBH')
+CODE = struct.Struct('<H')
+POINT = struct.Struct('<hh')
+RECT = struct.Struct('<hhhh')
+# protector state
+PROTECTOR = struct.Struct('<B')
+# enemy queue index, max enemies, then the corners the player flow goes to as a count of POINTs
+FRACTION = struct.Struct('<HH')
+# fraction, color, type, direction, speed, position, previous position, old position, flags
+TANK = struct.Struct('<BBBBB6hB')
+# fire at, turn at, spawn at, last corner
+TANK_AI = struct.Struct('<dddhh')
+# position, previous position, direction, power, sender code, sender fraction
+PROJECTILE = struct.Struct('<4hBBHB')
+# type, position
+BONUS = struct.Struct('<Bhh')
+# position, number of frames
+EXPLOSION = struct.Struct('<hhB')
+# position, score
+SCORE = struct.Struct('<hhH')
+# index of a cell, code
+CELL = struct.Struct('<HH')
+# version, gauss_next present, gauss_next
+RNG = struct.Struct('<B?d')
+RNG_KEY = struct.Struct('<625I')
+
+NONE = 0xFF
+NO_CORNER = -1
+
+CELL_TYPES = list(CellType)
+TANK_TYPES = list(Tank.Type)
+COLORS = list(Tank.Color)
+DIRECTIONS = list(Direction)
+BONUS_TYPES = list(BonusType)
+FRACTIONS = [Tank.FRIEND, Tank.ENEMY]
+PROTECTOR_STATES = [FieldProtector.NOT_PROTECTED, FieldProtector.PROTECTED, FieldProtector.BLINKING]
+
+(F_SPAWNING, F_HIT, F_TO_DESTROY, F_BONUS, F_MOVING, F_WANT_TO_FIRE, F_SHIELDED, F_AI) = (1 << i for i in range(8))
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _GoneTank:
+    """
+    Stands for the tank which fired a projectile and is not in the game any more: only its fraction matters
+    """
+    __slots__ = ('fraction',)
+
+    def __init__(self, fraction):
+        self.fraction = fraction
+
+
+class _Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def pack(self, fmt: struct.Struct, *values):
+        self.buffer += fmt.pack(*values)
+
+    def animator(self, a):
+        self.buffer += ANIMATOR.pack(a.delay, a.state, a.last_time, a.done)
+
+    def codes(self, codes):
+        self.buffer += COUNT.pack(len(codes))
+        self.buffer += struct.pack(f'<{len(codes)}H', *codes)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt: struct.Struct):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def count(self):
+        return self.unpack(COUNT)[0]
+
+    def animator(self, a):
+        a.delay, a.state, a.last_time, a.done = self.unpack(ANIMATOR)
+
+    def codes(self):
+        n = self.count()
+        fmt = struct.Struct(f'<{n}H')
+        return self.unpack(fmt)
+
+
+def _corner(corner):
+    return (NO_CORNER, NO_CORNER) if corner is None else corner
+
+
+def _from_corner(col, row):
+    return None if col == NO_CORNER else (col, row)
+
+
+# --- saving ---
+
+def take(game) -> bytes:
+    w = _Writer()
+    tanks = list(game.tanks)
+    projectiles = list(game.projectiles)
+    bonuses = list(game.bonues)
+    objects = [None, game.my_base, *tanks, *projectiles, *bonuses]
+    code_of = {id(obj): i for i, obj in enumerate(objects)}
+
+    def code(obj):
+        return code_of.get(id(obj), 0)
+
+    labels = sum(1 for obj in game.scene if isinstance(obj, GameOverLabel))
+    w.pack(HEADER, MAGIC, VERSION, game.ticks, game.clock.now(), game.score, labels, game.my_base.broken, game.level,
+           len(game.player_tanks))
+    w.pack(KILLS, *(game.kills[t] for t in TANK_TYPES))
+    w.animator(game.freeze_timer)
+
+    # field --
+    w.buffer += bytes(NONE if c is None else CELL_TYPES.index(c) for c in game.field.map._cells)
+    protector = game.field_protector
+    w.pack(PROTECTOR, PROTECTOR_STATES.index(protector._state))
+    for a in (protector._blink_animator, protector._protected_timer, protector._blink_timer):
+        w.animator(a)
+
+    # randomness --
+    version, key, gauss_next = game.r.getstate()
+    w.pack(RNG, version, gauss_next is not None, gauss_next or 0.0)
+    w.pack(RNG_KEY, *key)
+
+    # tanks --
+    w.pack(COUNT, len(tanks))
+    for t in tanks:
+        _take_tank(w, t)
+    for tank, direction, frags in zip(game.player_tanks, game.player_directions, game.frags):
+        w.pack(PLAYER, code(tank), NONE if direction is None else DIRECTIONS.index(direction), frags)
+
+    # enemies --
+    ai = game.ai
+    player_targets = ai.flow_to_player.targets if ai.flow_to_player is not None else ()
+    w.pack(FRACTION, ai.enemy_queue_index, ai.MAX_ENEMIES)
+    w.pack(COUNT, len(player_targets))
+    for corner in player_targets:
+        w.pack(POINT, *corner)
+    w.animator(ai.spawn_timer)
+    w.codes([code(t) for t in ai.spawn_points.values()])
+    sight_targets = ([], []) if ai.sight is None else (ai.sight.targets, ai.sight.targets_behind_bricks)
+    for rects in sight_targets:
+        w.pack(COUNT, len(rects))
+        for rect in rects:
+            w.pack(RECT, *rect)
+
+    # projectiles, bonuses, explosions, scores --
+    w.pack(COUNT, len(projectiles))
+    for p in projectiles:
+        w.pack(PROJECTILE, *p.position, *p.prev_position, DIRECTIONS.index(p.direction), p.power,
+               code(p.sender), FRACTIONS.index(p.sender.fraction))
+
+    w.pack(COUNT, len(bonuses))
+    for b in bonuses:
+        w.pack(BONUS, BONUS_TYPES.index(b.type), *b.position)
+
+    explosions = list(game.explosions)
+    w.pack(COUNT, len(explosions))
+    for e in explosions:
+        w.pack(EXPLOSION, *e.position, e.animator.max_states)
+        w.animator(e.animator)
+
+    scores = game.score_layer._entities
+    w.pack(COUNT, len(scores))
+    for node in scores:
+        w.pack(SCORE, node.x, node.y, node.score)
+        w.animator(node.timer)
+
+    # collisions --
+    for oc_map in (game.field.oc_map, game.field.projectile_map):
+        _take_occupancy(w, oc_map, code)
+    w.codes([code(obj) for obj in sorted(game.world._serials, key=game.world._serials.get)])
+
+    return bytes(w.buffer)
+
+
+def _take_tank(w: _Writer, t: Tank):
+    ai = getattr(t, 'ai', None)
+    flags = 0
+    for flag, value in ((F_SPAWNING, t.is_spawning), (F_HIT, t.hit), (F_TO_DESTROY, t.to_destroy),
+                        (F_BONUS, t.is_bonus), (F_MOVING, t.moving), (F_WANT_TO_FIRE, t.want_to_fire),
+                        (F_SHIELDED, t.shielded), (F_AI, ai is not None)):
+        if value:
+            flags |= flag
+    w.pack(TANK, FRACTIONS.index(t.fraction), COLORS.index(t.color), TANK_TYPES.index(t.tank_type),
+           DIRECTIONS.index(t.direction), t.speed, *t.position, *t.prev_position, *t.old_position, flags)
+    for a in (t._bonus_animator, t.move_animator, t._shield_timer, t._shield_animator, t._spawn_animator,
+              t.fire_timer):
+        w.animator(a)
+    if ai is not None:
+        w.pack(TANK_AI, ai.fire_at, ai.dir_at, ai.spawn_at, *_corner(ai._last_corner))
+
+
+def _take_occupancy(w: _Writer, oc_map, code):
+    # the tanks removed during the tick have no code, their cells are freed by the next place_group anyway
+    footprints = [(code(obj), cell_range) for obj, cell_range in oc_map._footprints.items() if code(obj)]
+    w.pack(COUNT, len(footprints))
+    for c, cell_range in footprints:
+        w.pack(CODE, c)
+        w.pack(RECT, *cell_range)
+    w.codes([c for c in map(code, oc_map._shadowed) if c])
+    w.codes([c for c in map(code, oc_map._group) if c])
+    cells = [(i, code(c)) for i, c in enumerate(oc_map._cells) if c is not None]
+    w.pack(COUNT, len(cells))
+    for cell in cells:
+        w.pack(CELL, *cell)
+
+
+# --- restoring ---
+
+def restore(game, data):
+    r = _Reader(data)
+    magic, version, ticks, clock_time, score, labels, broken, level, players = r.unpack(HEADER)
+    if magic != MAGIC:
+        raise SnapshotError('not a snapshot')
+    if version != VERSION:
+        raise SnapshotError(f'snapshot version {version} is not supported')
+    if level != game.level:
+        raise SnapshotError(f'snapshot of level {level} can not be restored in a game of level {game.level}')
+    if players != len(game.player_tanks):
+        raise SnapshotError(f'snapshot of {players} players can not be restored in a game '
+                            f'of {len(game.player_tanks)} players')
+
+    # everything is made again below with the clock of the snapshot
+    if not isinstance(game.clock, FixedClock):
+        raise SnapshotError('a snapshot can only be restored in a game with a FixedClock')
+    game.clock.time = clock_time
+    _clear(game)
+
+    game.ticks = ticks
+    game.score = score
+    game.my_base.broken = broken
+    for _ in range(labels):
+        label = GameOverLabel()
+        label.place_at_center(game.field)
+        game.scene.add_child(label)
+    game.kills.clear()
+    for t, n in zip(TANK_TYPES, r.unpack(KILLS)):
+        if n:
+            game.kills[t] = n
+    r.animator(game.freeze_timer)
+
+    # field --
+    field_map = game.field.map
+    n_cells = field_map.width * field_map.height
+    cells = r.data[r.offset:r.offset + n_cells]
+    r.offset += n_cells
+    for i, c in enumerate(cells):
+        # the listeners (the layers of the field, the AI caches) learn about the changed cells only
+        field_map.set_cell_col_row(i // field_map.height, i % field_map.height, None if c == NONE else CELL_TYPES[c])
+    protector = game.field_protector
+    protector._state = PROTECTOR_STATES[r.unpack(PROTECTOR)[0]]
+    for a in (protector._blink_animator, protector._protected_timer, protector._blink_timer):
+        r.animator(a)
+
+    # set at the end: making the objects below may take random numbers
+    version, has_gauss, gauss_next = r.unpack(RNG)
+    rng_state = version, r.unpack(RNG_KEY), gauss_next if has_gauss else None
+
+    # tanks --
+    ai = game.ai
+    tanks = [_restore_tank(r, ai, game.field) for _ in range(r.count())]
+    for t in tanks:
+        game.tanks.add_child(t)
+    objects = [None, game.my_base, *tanks]
+    for player in range(players):
+        c, direction, game.frags[player] = r.unpack(PLAYER)
+        game.player_tanks[player] = objects[c]
+        game.player_directions[player] = None if direction == NONE else DIRECTIONS[direction]
+
+    # enemies --
+    ai.enemy_queue_index, ai.MAX_ENEMIES = r.unpack(FRACTION)
+    player_targets = [r.unpack(POINT) for _ in range(r.count())]
+    if ai.flow_to_player is not None:
+        ai.flow_to_player.targets = player_targets
+    r.animator(ai.spawn_timer)
+    for loc, c in zip(list(ai.spawn_points), r.codes()):
+        ai.spawn_points[loc] = objects[c]
+    sight_targets = [[r.unpack(RECT) for _ in range(r.count())] for _ in range(2)]
+    if ai.sight is not None:
+        ai.sight.targets, ai.sight.targets_behind_bricks = sight_targets
+
+    # projectiles, bonuses, explosions, scores --
+    for _ in range(r.count()):
+        x, y, px, py, d, power, sender, fraction = r.unpack(PROJECTILE)
+        sender = objects[sender] if sender else _GoneTank(FRACTIONS[fraction])
+        p = game.spawn_projectile(x, y, DIRECTIONS[d], power, sender)
+        p.prev_position = px, py
+        objects.append(p)
+
+    for _ in range(r.count()):
+        t, x, y = r.unpack(BONUS)
+        bonus = Bonus(BONUS_TYPES[t], 0, 0)
+        bonus.position = x, y
+        game.bonues.add_child(bonus)
+        objects.append(bonus)
+
+    for _ in range(r.count()):
+        x, y, n = r.unpack(EXPLOSION)
+        e = Explosion.acquire(game.clock, x, y)
+        r.animator(e.animator)
+        e.animator.max_states = n
+        game.explosions.add_child(e)
+
+    scores = []
+    for _ in range(r.count()):
+        x, y, value = r.unpack(SCORE)
+        timer = ArmedTimer(game.clock, game.score_layer.SCORE_STAY_TIME)
+        r.animator(timer)
+        scores.append(ScoreNode(x, y, value, game.score_layer._sprites[value], timer))
+    game.score_layer._entities = scores
+
+    # collisions --
+    for oc_map in (game.field.oc_map, game.field.projectile_map):
+        _restore_occupancy(r, oc_map, objects)
+    for c in r.codes():
+        game.world.update(objects[c])
+
+    game.r.setstate(rng_state)
+
+    if r.offset != len(r.data):
+        raise SnapshotError('snapshot has extra data')
+
+    game.dirty_rects.invalidate()
+
+
+def _clear(game):
+    for t in list(game.tanks):
+        game.remove_tank(t)
+    for p in list(game.projectiles):
+        p.remove_from_parent()
+        p.release()
+    for b in list(game.bonues):
+        b.remove_from_parent()
+    for e in list(game.explosions):
+        e.remove_from_parent()
+    for obj in list(game.scene):
+        if isinstance(obj, GameOverLabel):
+            obj.remove_from_parent()
+    game.field.oc_map.clear()
+    game.field.projectile_map.clear()
+    game.world.clear()
+
+
+def _restore_tank(r: _Reader, ai, field) -> Tank:
+    fraction, color, tank_type, direction, speed, x, y, px, py, ox, oy, flags = r.unpack(TANK)
+    t = Tank(ai.clock, FRACTIONS[fraction], COLORS[color], TANK_TYPES[tank_type])
+    t._direction = DIRECTIONS[direction]
+    t.speed = speed
+    t.position = x, y
+    t.prev_position = px, py
+    t.old_position = ox, oy
+    t.is_spawning = bool(flags & F_SPAWNING)
+    t.hit = bool(flags & F_HIT)
+    t.to_destroy = bool(flags & F_TO_DESTROY)
+    t.is_bonus = bool(flags & F_BONUS)
+    t.moving = bool(flags & F_MOVING)
+    t.want_to_fire = bool(flags & F_WANT_TO_FIRE)
+    t._shielded = bool(flags & F_SHIELDED)
+    for a in (t._bonus_animator, t.move_animator, t._shield_timer, t._shield_animator, t._spawn_animator,
+              t.fire_timer):
+        r.animator(a)
+    if flags & F_AI:
+        # the random numbers taken by TankAI() are given back with the state of the generator at the end
+        t.ai = TankAI(t, field, ai.rng, ai._flow_for(t.tank_type), ai.sight)
+        t.ai.fire_at, t.ai.dir_at, t.ai.spawn_at, col, row = r.unpack(TANK_AI)
+        t.ai._last_corner = _from_corner(col, row)
+    return t
+
+
+def _restore_occupancy(r: _Reader, oc_map, objects):
+    for _ in range(r.count()):
+        c, = r.unpack(CODE)
+        oc_map._footprints[objects[c]] = r.unpack(RECT)
+    oc_map._shadowed = dict.fromkeys(objects[c] for c in r.codes())
+    oc_map._group = {objects[c]: rank for rank, c in enumerate(r.codes())}
+    cells = oc_map._cells
+    for _ in range(r.count()):
+        i, c = r.unpack(CELL)
+        cells[i] = objects[c]
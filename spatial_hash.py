@@ -0,0 +1,88 @@
+from math import floor
+from itertools import count
+
+
+class SpatialHash:
+    """
+    Broad-phase for collisions: a uniform grid of buckets,
+    every object is listed in the buckets its bounding rect touches.
+    Queries return the candidates in the order they were first inserted, so the result is deterministic
+    """
+
+    def __init__(self, cell_size=32):
+        self.cell_size = cell_size
+        self._buckets = {}  # (bx, by) -> {obj: serial}
+        self._ranges = {}  # obj -> (min_bx, max_bx, min_by, max_by)
+        self._serials = {}  # obj -> serial
+        self._counter = count()
+
+    def _range_of_rect(self, rect):
+        x, y, w, h = rect
+        s = self.cell_size
+        return floor(x / s), floor((x + w) / s), floor(y / s), floor((y + h) / s)
+
+    @staticmethod
+    def _keys(bucket_range):
+        min_bx, max_bx, min_by, max_by = bucket_range
+        return [(bx, by) for bx in range(min_bx, max_bx + 1) for by in range(min_by, max_by + 1)]
+
+    def __contains__(self, obj):
+        return obj in self._ranges
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def update(self, obj, rect=None):
+        """
+        Inserts the object or moves it to its new rect (obj.bounding_rect by default)
+        """
+        new_range = self._range_of_rect(obj.bounding_rect if rect is None else rect)
+        old_range = self._ranges.get(obj)
+        if old_range == new_range:
+            return
+
+        if old_range is not None:
+            self._unlink(obj, old_range)
+        else:
+            self._serials[obj] = next(self._counter)
+
+        self._ranges[obj] = new_range
+        serial = self._serials[obj]
+        for key in self._keys(new_range):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = {}
+            bucket[obj] = serial
+
+    def remove(self, obj):
+        old_range = self._ranges.pop(obj, None)
+        if old_range is not None:
+            self._unlink(obj, old_range)
+            del self._serials[obj]
+
+    def _unlink(self, obj, bucket_range):
+        for key in self._keys(bucket_range):
+            bucket = self._buckets[key]
+            del bucket[obj]
+            if not bucket:
+                del self._buckets[key]
+
+    def query_point(self, x, y):
+        s = self.cell_size
+        bucket = self._buckets.get((floor(x / s), floor(y / s)))
+        if not bucket:
+            return []
+        return sorted(bucket, key=bucket.get)
+
+    def query_rect(self, rect):
+        candidates = {}
+        for key in self._keys(self._range_of_rect(rect)):
+            bucket = self._buckets.get(key)
+            if bucket:
+                candidates.update(bucket)
+        return sorted(candidates, key=candidates.get)
+
+    def clear(self):
+        self._buckets.clear()
+        self._ranges.clear()
+        self._serials.clear()
@@ -0,0 +1,759 @@
+"""
+A stream of what a spectator sees, only what has changed at every step, bit-packed:
+
+    encoder = SpectatorEncoder(game)
+    every step (or every broadcast): delta = encoder.delta()
+    to a new spectator, after the delta of the step: encoder.keyframe()
+
+    view = SpectatorView()
+    view.apply(frame)  # a keyframe first, then the deltas of the next steps
+    view.render(screen)
+
+A delta holds the changed cells of the field, the tanks that appeared, moved, changed their look or were removed,
+the projectiles fired and removed (they fly straight at a known speed, so the view moves them by itself),
+the bonuses, the new explosions and scores, and the score, base and frags when they change.
+Tanks, projectiles and bonuses are known by ids from tables kept by both sides, an id is used again after its
+object is removed. The ids are varuints, so any number of objects fits.
+A keyframe holds the whole field and all the objects with their ids, but not the explosions and scores
+on the screen: they are short and a view keeps its own ones over a keyframe.
+
+Check it headless and compare with the snapshots of server.py:
+
+    python3 spectate.py --steps 3600 --enemies 5
+"""
+import argparse
+import os
+import heapq
+import random
+
+import pygame
+
+import controls
+from bonus import Bonus, BonusType
+from config import GAME_WIDTH, GAME_HEIGHT
+from dirty_rects import DirtyRectTracker
+from explosion import Explosion
+from field import Field, CellType
+from game import Game
+from my_base import MyBase
+from projectile import Projectile
+from score_node import ScoreLayer
+from tank import Tank
+from ui import GameOverLabel
+from util import GameObject, Direction, FixedClock
+
+CELL_CODES = [None, *CellType]
+CELL_CODE_OF = {c: i for i, c in enumerate(CELL_CODES)}
+DIRECTIONS = list(Direction)
+COLORS = list(Tank.Color)
+TANK_TYPES = list(Tank.Type)
+FRACTIONS = [Tank.FRIEND, Tank.ENEMY]
+BONUS_TYPES = list(BonusType)
+EXPLOSION_TYPES = [Explosion.TYPE_FULL, Explosion.TYPE_SHORT, Explosion.TYPE_SUPER_SHORT]
+# an explosion is known by the number of its frames
+EXPLOSION_TYPE_OF_STATES = {n: t for t, n in Explosion._n_states.items()}
+SCORES = [100, 200, 300, 400, 500]
+
+TICK_BITS = 32
+COL_BITS = ROW_BITS = 5
+CELL_BITS = 4
+POSITION_BITS = 12  # signed
+STEP_BITS = 4  # signed, a move of a tank in a step
+# ids are varuints of chunks of so many bits, the usual number of objects fits into one chunk
+TANK_ID_CHUNK = 4
+PROJECTILE_ID_CHUNK = 5
+BONUS_ID_CHUNK = 3
+# the look of a tank: direction, move state, color, type, spawning, spawn state, shield, shield state
+LOOK_BITS = (2, 1, 2, 3, 1, 2, 1, 1)
+
+
+class SpectateError(Exception):
+    pass
+
+
+class BitWriter:
+    """
+    Fields of any number of bits, the first one in the lowest bits of the first byte
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._bits = 0
+
+    def uint(self, value, bits):
+        if not 0 <= value < 1 << bits:
+            raise SpectateError(f'{value} does not fit into {bits} bits')
+        self._value |= value << self._bits
+        self._bits += bits
+
+    def int(self, value, bits):
+        if not -(1 << bits - 1) <= value < 1 << bits - 1:
+            raise SpectateError(f'{value} does not fit into {bits} signed bits')
+        self.uint(value & ((1 << bits) - 1), bits)
+
+    def flag(self, value):
+        self.uint(1 if value else 0, 1)
+
+    def uints(self, values, bits):
+        """
+        Many fields of the same size at once (the whole field of a keyframe)
+        """
+        if values and not 0 <= min(values) <= max(values) < 1 << bits:
+            raise SpectateError(f'values do not fit into {bits} bits')
+        if 8 % bits:
+            value = 0
+            for v in reversed(values):
+                value = value << bits | v
+        else:
+            # a few fields in every byte, no shifts of the whole value
+            per_byte = 8 // bits
+            padded = bytes(values) + bytes(-len(values) % per_byte)
+            packed = padded[0::per_byte]
+            for k in range(1, per_byte):
+                packed = bytes(a | b << k * bits for a, b in zip(packed, padded[k::per_byte]))
+            value = int.from_bytes(packed, 'little')
+        self._value |= value << self._bits
+        self._bits += bits * len(values)
+
+    def varuint(self, value, chunk=3):
+        """
+        Small numbers in a few bits: chunks of bits, each one followed by a flag of one more chunk
+        """
+        if value < 0:
+            raise SpectateError(f'{value} is negative')
+        mask = (1 << chunk) - 1
+        while True:
+            self.uint(value & mask, chunk)
+            value >>= chunk
+            self.flag(value)
+            if not value:
+                break
+
+    def point(self, position):
+        x, y = position
+        self.int(x, POSITION_BITS)
+        self.int(y, POSITION_BITS)
+
+    def to_bytes(self):
+        return self._value.to_bytes((self._bits + 7) // 8, 'little')
+
+
+class BitReader:
+    def __init__(self, data):
+        self._value = int.from_bytes(data, 'little')
+        self._bits = len(data) * 8
+        self._offset = 0
+
+    def uint(self, bits):
+        if self._offset + bits > self._bits:
+            raise SpectateError('frame is too short')
+        value = (self._value >> self._offset) & ((1 << bits) - 1)
+        self._offset += bits
+        return value
+
+    def int(self, bits):
+        value = self.uint(bits)
+        return value - (1 << bits) if value >> bits - 1 else value
+
+    def flag(self):
+        return self.uint(1) == 1
+
+    def uints(self, n, bits):
+        chunk = self.uint(n * bits)
+        mask = (1 << bits) - 1
+        if 8 % bits:
+            return [(chunk >> i * bits) & mask for i in range(n)]
+        # a few fields in every byte, no shifts of the whole chunk
+        shifts = range(0, 8, bits)
+        return [(byte >> shift) & mask for byte in chunk.to_bytes((n * bits + 7) // 8, 'little')
+                for shift in shifts][:n]
+
+    def varuint(self, chunk=3):
+        value, shift = 0, 0
+        while True:
+            value |= self.uint(chunk) << shift
+            shift += chunk
+            if not self.flag():
+                return value
+
+    def point(self):
+        return self.int(POSITION_BITS), self.int(POSITION_BITS)
+
+
+def is_keyframe(frame: bytes):
+    return bool(frame[0] & 1)
+
+
+def _tank_look(t: Tank):
+    shield = not t._shield_timer.done
+    return (DIRECTIONS.index(t.direction), t.move_animator.state, COLORS.index(t.color),
+            TANK_TYPES.index(t.tank_type), t.is_spawning, t._spawn_animator.state, shield,
+            t._shield_animator.state if shield else 0)
+
+
+def _write_look(w: BitWriter, look):
+    for value, bits in zip(look, LOOK_BITS):
+        w.uint(int(value), bits)
+
+
+def _read_look(r: BitReader):
+    return tuple(r.uint(bits) for bits in LOOK_BITS)
+
+
+class _Ids:
+    """
+    Ids of the objects of one kind, the smallest free one is given first, so the ids stay as small as they can
+    """
+
+    def __init__(self):
+        self.of = {}  # object -> id
+        # a heap of the ids given back, every id below len(self.of) + len(self._free) is either used or here
+        self._free = []
+
+    def take(self, obj):
+        i = self.of[obj] = heapq.heappop(self._free) if self._free else len(self.of)
+        return i
+
+    def give_back(self, obj):
+        heapq.heappush(self._free, self.of.pop(obj))
+
+
+# --- encoding ---
+
+class SpectatorEncoder:
+    """
+    Watches a game and makes the frames of its steps, call delta() for every step sent (or every step)
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.tick = game.ticks
+
+        self._cells = {}  # (col, row) -> cell changed since the last delta
+        # the codes of all the cells for keyframes, column by column as the map keeps them
+        self._cell_codes = bytearray(CELL_CODE_OF[c] for c in game.field.map._cells)
+        self._scores = []  # (x, y, score) added since the last delta
+        game.field.map.add_listener(self._on_cell_changed)
+        game.score_layer.add_listener(self._on_score)
+
+        # what the view knows after the last delta --
+        self._tank_ids = _Ids()
+        self._tanks = {}  # tank -> (position, look)
+        self._projectile_ids = _Ids()
+        self._projectiles = {}  # projectile -> (position, direction) the view has
+        self._bonus_ids = _Ids()
+        self._explosions = {}  # explosion -> (position, animator state)
+        self._status = None
+
+    def close(self):
+        self.game.field.map.remove_listener(self._on_cell_changed)
+        self.game.score_layer.remove_listener(self._on_score)
+
+    def _on_cell_changed(self, col, row, old_cell, new_cell):
+        self._cells[col, row] = new_cell
+        self._cell_codes[col * self.game.field.map.height + row] = CELL_CODE_OF[new_cell]
+
+    def _on_score(self, x, y, score):
+        self._scores.append((x, y, score))
+
+    def _game_status(self):
+        game = self.game
+        return game.score, game.my_base.broken, tuple(game.frags)
+
+    @staticmethod
+    def _write_status(w: BitWriter, status):
+        score, broken, frags = status
+        w.varuint(score, 7)
+        w.flag(broken)
+        for n in frags:
+            w.varuint(n)
+
+    def delta(self) -> bytes:
+        """
+        What has changed since the last delta, or a keyframe if the game has gone back to an earlier step (restored)
+        """
+        game = self.game
+        w = BitWriter()
+        w.flag(False)
+        elapsed = game.ticks - self.tick
+        self.tick = game.ticks
+        if elapsed < 0:
+            self._write_delta(w, 0)
+            return self.keyframe()
+        w.varuint(elapsed)
+        self._write_delta(w, elapsed)
+        return w.to_bytes()
+
+    def _write_delta(self, w: BitWriter, elapsed):
+        game = self.game
+
+        status = self._game_status()
+        w.flag(status != self._status)
+        if status != self._status:
+            self._write_status(w, status)
+            self._status = status
+
+        # field --
+        cells, self._cells = self._cells, {}
+        w.varuint(len(cells))
+        for (col, row), cell in cells.items():
+            w.uint(col, COL_BITS)
+            w.uint(row, ROW_BITS)
+            w.uint(CELL_CODE_OF[cell], CELL_BITS)
+
+        self._delta_tanks(w)
+        self._delta_projectiles(w, elapsed)
+        self._delta_bonuses(w)
+
+        # explosions, scores --
+        explosions = {e: (e.position, e.animator.state) for e in game.explosions}
+        new_explosions = []
+        for e, (position, state) in explosions.items():
+            last = self._explosions.get(e)
+            # one from the pool again has started anew
+            if last is None or last[0] != position or last[1] > state:
+                new_explosions.append(e)
+        self._explosions = explosions
+        w.varuint(len(new_explosions))
+        for e in new_explosions:
+            w.point(e.position)
+            w.uint(EXPLOSION_TYPES.index(EXPLOSION_TYPE_OF_STATES[e.animator.max_states]), 2)
+
+        scores, self._scores = self._scores, []
+        w.varuint(len(scores))
+        for x, y, score in scores:
+            w.point((x, y))
+            w.uint(SCORES.index(score), 3)
+
+    def _delta_tanks(self, w: BitWriter):
+        ids, known = self._tank_ids, self._tanks
+        tanks = list(self.game.tanks)
+        present = set(tanks)
+
+        removed = [t for t in known if t not in present]
+        w.varuint(len(removed))
+        for t in removed:
+            w.varuint(ids.of[t], TANK_ID_CHUNK)
+            ids.give_back(t)
+            del known[t]
+
+        spawned = [t for t in tanks if t not in known]
+        w.varuint(len(spawned))
+        for t in spawned:
+            ids.take(t)
+            known[t] = t.position, _tank_look(t)
+            self._write_tank(w, t)
+
+        changed = []
+        for t in tanks:
+            position, look = t.position, _tank_look(t)
+            last_position, last_look = known[t]
+            if position != last_position or look != last_look:
+                changed.append((t, last_position, look != last_look))
+                known[t] = position, look
+        w.varuint(len(changed))
+        for t, (lx, ly), look_changed in changed:
+            w.varuint(ids.of[t], TANK_ID_CHUNK)
+            x, y = t.position
+            dx, dy = x - lx, y - ly
+            w.flag(dx or dy)
+            if dx or dy:
+                small = all(-(1 << STEP_BITS - 1) <= d < 1 << STEP_BITS - 1 for d in (dx, dy))
+                w.flag(small)
+                if small:
+                    w.int(dx, STEP_BITS)
+                    w.int(dy, STEP_BITS)
+                else:
+                    w.point((x, y))
+            w.flag(look_changed)
+            if look_changed:
+                _write_look(w, known[t][1])
+
+    def _write_tank(self, w: BitWriter, t: Tank):
+        position, look = self._tanks[t]
+        w.varuint(self._tank_ids.of[t], TANK_ID_CHUNK)
+        w.uint(FRACTIONS.index(t.fraction), 1)
+        w.point(position)
+        _write_look(w, look)
+
+    def _delta_projectiles(self, w: BitWriter, elapsed):
+        ids, known = self._projectile_ids, self._projectiles
+        projectiles = list(self.game.projectiles)
+        present = set(projectiles)
+
+        # one given back to the pool and fired again since the last delta is a new one, unless it flies the same way
+        removed = [p for p, (_, direction) in known.items() if p not in present or p.direction is not direction]
+        w.varuint(len(removed))
+        for p in removed:
+            w.varuint(ids.of[p], PROJECTILE_ID_CHUNK)
+            ids.give_back(p)
+            del known[p]
+
+        # the view moves the projectiles it has, the ones somewhere else are sent again
+        corrected = []
+        for p, ((x, y), direction) in known.items():
+            vx, vy = direction.vector
+            step = Projectile.SPEED * elapsed
+            if p.position != (x + vx * step, y + vy * step):
+                corrected.append(p)
+            known[p] = p.position, direction
+        w.varuint(len(corrected))
+        for p in corrected:
+            w.varuint(ids.of[p], PROJECTILE_ID_CHUNK)
+            w.point(p.position)
+
+        spawned = [p for p in projectiles if p not in known]
+        w.varuint(len(spawned))
+        for p in spawned:
+            ids.take(p)
+            known[p] = p.position, p.direction
+            self._write_projectile(w, p)
+
+    def _write_projectile(self, w: BitWriter, p: Projectile):
+        w.varuint(self._projectile_ids.of[p], PROJECTILE_ID_CHUNK)
+        position, direction = self._projectiles[p]
+        w.point(position)
+        w.uint(DIRECTIONS.index(direction), 2)
+
+    def _delta_bonuses(self, w: BitWriter):
+        ids = self._bonus_ids
+        bonuses = list(self.game.bonues)
+        present = set(bonuses)
+
+        removed = [b for b in ids.of if b not in present]
+        w.varuint(len(removed))
+        for b in removed:
+            w.varuint(ids.of[b], BONUS_ID_CHUNK)
+            ids.give_back(b)
+
+        spawned = [b for b in bonuses if b not in ids.of]
+        w.varuint(len(spawned))
+        for b in spawned:
+            ids.take(b)
+            self._write_bonus(w, b)
+
+    def _write_bonus(self, w: BitWriter, b: Bonus):
+        w.varuint(self._bonus_ids.of[b], BONUS_ID_CHUNK)
+        w.uint(BONUS_TYPES.index(b.type), 3)
+        w.point(b.position)
+
+    def keyframe(self) -> bytes:
+        """
+        Everything the view has after the last delta, with the same ids
+        """
+        game = self.game
+        w = BitWriter()
+        w.flag(True)
+        w.uint(self.tick, TICK_BITS)
+        w.varuint(len(game.frags))
+        self._write_status(w, self._game_status() if self._status is None else self._status)
+
+        w.uints(self._cell_codes, CELL_BITS)
+
+        w.varuint(len(self._tanks))
+        for t in self._tanks:
+            self._write_tank(w, t)
+        w.varuint(len(self._projectiles))
+        for p in self._projectiles:
+            self._write_projectile(w, p)
+        w.varuint(len(self._bonus_ids.of))
+        for b in self._bonus_ids.of:
+            self._write_bonus(w, b)
+        return w.to_bytes()
+
+
+# --- decoding ---
+
+class SpectatorView:
+    """
+    The scene made of the frames of a SpectatorEncoder, rendered by the same objects as the game
+    """
+
+    def __init__(self, step_time=Game.TICK):
+        # the animations of the view (explosions, scores) run on their own clock
+        self.clock = FixedClock()
+        self.step_time = step_time
+        self.tick = None  # the step of the last frame, None before the first keyframe
+        self.score = 0
+        self.frags = []
+
+        self.scene = GameObject()
+        self.field = Field()
+        self.scene.add_child(self.field)
+        self.my_base = MyBase()
+        self.my_base.position = self.field.map.coord_by_col_and_row(12, 24)
+        self.scene.add_child(self.my_base)
+        self.tanks = GameObject()
+        self.scene.add_child(self.tanks)
+        self.projectiles = GameObject()
+        self.scene.add_child(self.projectiles)
+        self.scene.add_child(self.field.overlay)
+        self.bonuses = GameObject()
+        self.scene.add_child(self.bonuses)
+        self.score_layer = ScoreLayer(self.clock)
+        self.scene.add_child(self.score_layer)
+        self.explosions = GameObject()
+        self.scene.add_child(self.explosions)
+        self.game_over_label = GameOverLabel()
+        self.game_over_label.place_at_center(self.field)
+
+        self._tanks = {}  # id -> Tank
+        self._projectiles = {}  # id -> Projectile
+        self._bonuses = {}  # id -> Bonus
+
+        self._font = None
+        self.dirty_rects = DirtyRectTracker((GAME_WIDTH, GAME_HEIGHT))
+
+    def apply(self, frame: bytes):
+        """
+        Takes the frame of the next step sent, raises SpectateError for a frame the view can not take (a delta before
+        any keyframe, a broken one)
+        """
+        r = BitReader(frame)
+        keyframe = r.flag()
+        if not keyframe and self.tick is None:
+            raise SpectateError('a delta without a keyframe before it')
+        try:
+            if keyframe:
+                self._apply_keyframe(r)
+            else:
+                self._apply_delta(r)
+        except (KeyError, IndexError) as e:
+            # an id the view does not have, a code out of its table
+            raise SpectateError(f'frame does not match the view: {e!r}') from e
+
+    def _run(self, steps):
+        # the time of the game goes on for the short animations, as in Game.update
+        for _ in range(steps):
+            self.clock.advance(self.step_time)
+            self.score_layer.update()
+            for e in self.explosions:
+                e.update()
+
+    def _read_status(self, r: BitReader):
+        self.score = r.varuint(7)
+        broken = r.flag()
+        self.frags = [r.varuint() for _ in self.frags]
+        if broken != self.my_base.broken:
+            self.my_base.broken = broken
+            if broken:
+                self.scene.add_child(self.game_over_label)
+            else:
+                self.game_over_label.remove_from_parent()
+
+    def _apply_keyframe(self, r: BitReader):
+        tick = r.uint(TICK_BITS)
+        if self.tick is not None and tick > self.tick:
+            self._run(tick - self.tick)
+        self.tick = tick
+        self.frags = [0] * r.varuint()
+        self._read_status(r)
+
+        field_map = self.field.map
+        height = field_map.height
+        cells = field_map._cells
+        for i, code in enumerate(r.uints(len(cells), CELL_BITS)):
+            cell = CELL_CODES[code]
+            if cells[i] is not cell:
+                field_map.set_cell_col_row(i // height, i % height, cell)
+
+        for t in self._tanks.values():
+            t.remove_from_parent()
+        for p in self._projectiles.values():
+            p.remove_from_parent()
+            p.release()
+        for b in self._bonuses.values():
+            b.remove_from_parent()
+        self._tanks, self._projectiles, self._bonuses = {}, {}, {}
+        for _ in range(r.varuint()):
+            self._read_tank(r)
+        for _ in range(r.varuint()):
+            self._read_projectile(r)
+        for _ in range(r.varuint()):
+            self._read_bonus(r)
+
+        self.dirty_rects.invalidate()
+
+    def _apply_delta(self, r: BitReader):
+        elapsed = r.varuint()
+        self._run(elapsed)
+        self.tick += elapsed
+        if r.flag():
+            self._read_status(r)
+
+        field_map = self.field.map
+        for _ in range(r.varuint()):
+            col, row = r.uint(COL_BITS), r.uint(ROW_BITS)
+            field_map.set_cell_col_row(col, row, self._read_cell(r))
+
+        # tanks --
+        for _ in range(r.varuint()):
+            self._tanks.pop(r.varuint(TANK_ID_CHUNK)).remove_from_parent()
+        for _ in range(r.varuint()):
+            self._read_tank(r)
+        for _ in range(r.varuint()):
+            t = self._tanks[r.varuint(TANK_ID_CHUNK)]
+            if r.flag():
+                if r.flag():
+                    x, y = t.position
+                    t.position = x + r.int(STEP_BITS), y + r.int(STEP_BITS)
+                else:
+                    t.position = r.point()
+            if r.flag():
+                self._set_look(t, _read_look(r))
+
+        # projectiles --
+        for _ in range(r.varuint()):
+            p = self._projectiles.pop(r.varuint(PROJECTILE_ID_CHUNK))
+            p.remove_from_parent()
+            p.release()
+        for p in self._projectiles.values():
+            vx, vy = p.direction.vector
+            step = Projectile.SPEED * elapsed
+            p.move(vx * step, vy * step)
+        for _ in range(r.varuint()):
+            p = self._projectiles[r.varuint(PROJECTILE_ID_CHUNK)]
+            p.position = r.point()
+        for _ in range(r.varuint()):
+            self._read_projectile(r)
+
+        # bonuses --
+        for _ in range(r.varuint()):
+            self._bonuses.pop(r.varuint(BONUS_ID_CHUNK)).remove_from_parent()
+        for _ in range(r.varuint()):
+            self._read_bonus(r)
+
+        # explosions, scores --
+        for _ in range(r.varuint()):
+            x, y = r.point()
+            self.explosions.add_child(Explosion.acquire(self.clock, x, y, EXPLOSION_TYPES[r.uint(2)]))
+        for _ in range(r.varuint()):
+            x, y = r.point()
+            self.score_layer.add(x, y, SCORES[r.uint(3)])
+
+    @staticmethod
+    def _read_cell(r: BitReader):
+        return CELL_CODES[r.uint(CELL_BITS)]
+
+    def _read_tank(self, r: BitReader):
+        i = r.varuint(TANK_ID_CHUNK)
+        t = Tank(self.clock, FRACTIONS[r.uint(1)])
+        t.position = r.point()
+        self._set_look(t, _read_look(r))
+        self._tanks[i] = t
+        self.tanks.add_child(t)
+
+    @staticmethod
+    def _set_look(t: Tank, look):
+        direction, move_state, color, tank_type, spawning, spawn_state, shield, shield_state = look
+        t._direction = DIRECTIONS[direction]
+        t.move_animator.state = move_state
+        t.color = COLORS[color]
+        t.tank_type = TANK_TYPES[tank_type]
+        t.is_spawning = bool(spawning)
+        t._spawn_animator.state = spawn_state
+        t._shield_timer.done = not shield
+        t._shield_animator.state = shield_state
+
+    def _read_projectile(self, r: BitReader):
+        i = r.varuint(PROJECTILE_ID_CHUNK)
+        x, y = r.point()
+        p = Projectile.acquire(x, y, DIRECTIONS[r.uint(2)])
+        self._projectiles[i] = p
+        self.projectiles.add_child(p)
+
+    def _read_bonus(self, r: BitReader):
+        i = r.varuint(BONUS_ID_CHUNK)
+        b = Bonus(BONUS_TYPES[r.uint(3)], 0, 0)
+        b.position = r.point()
+        self._bonuses[i] = b
+        self.bonuses.add_child(b)
+
+    @property
+    def font(self):
+        if self._font is None:
+            self._font = pygame.font.Font(None, 18)
+        return self._font
+
+    def render(self, screen):
+        """
+        :return: list of the changed rects of the screen or None if the whole screen has to be updated
+        """
+        self.scene.visit(screen)
+        dirty = self.dirty_rects.collect(self.scene)
+
+        text = str(self.score)
+        if any(self.frags):
+            text = f'Frags: {":".join(map(str, self.frags))}  {text}'
+        label = self.font.render(text, 1, (255, 255, 255))
+        rect = screen.blit(label, (GAME_WIDTH - 10 - label.get_width(), 5))
+        if dirty is not None:
+            # the place of a longer text before is in the full width of the labels
+            dirty.append(pygame.Rect(0, rect.y, GAME_WIDTH, rect.h))
+        return dirty
+
+
+# --- check ---
+
+def main():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+    parser = argparse.ArgumentParser(description='Play a headless match with bots, stream it to a view and compare '
+                                                 'the size of the frames with the snapshot deltas of server.py.')
+    parser.add_argument('--steps', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--players', type=int, default=1)
+    parser.add_argument('--enemies', type=int, default=4, help='at once at most')
+    parser.add_argument('--keyframe-interval', type=int, default=120, help='steps')
+    args = parser.parse_args()
+
+    from server import encode_state
+
+    game = Game(clock=FixedClock(), seed=args.seed, players=args.players)
+    game.ai.MAX_ENEMIES = args.enemies
+    encoder = SpectatorEncoder(game)
+    encoder.delta()
+    view = SpectatorView()
+    view.apply(encoder.keyframe())
+    bots = [random.Random(args.seed * 2 + player) for player in range(args.players)]
+    directions = [0, controls.UP, controls.DOWN, controls.LEFT, controls.RIGHT]
+    bits = [0] * args.players
+
+    sizes = {'delta': 0, 'keyframe': 0, 'snapshot': 0}
+    keyframes = mismatches = 0
+    previous = game.snapshot()
+    for step in range(1, args.steps + 1):
+        for player, rng in enumerate(bots):
+            if rng.random() < 0.05:
+                bits[player] = rng.choice(directions)
+            game.apply_input(bits[player] | (controls.FIRE if rng.random() < 0.05 else 0), player)
+        game.step()
+
+        frame = encoder.delta()
+        if step % args.keyframe_interval == 0:
+            frame = encoder.keyframe()
+            keyframes += 1
+        sizes['keyframe' if is_keyframe(frame) else 'delta'] += len(frame)
+        view.apply(frame)
+        data = game.snapshot()
+        sizes['snapshot'] += len(encode_state(game.ticks, data, None if is_keyframe(frame) else previous))
+        previous = data
+
+        seen, shown = ((sorted((*t.position, t.direction.value) for t in scene.tanks),
+                        sorted(p.position for p in scene.projectiles), scene.field.map._cells)
+                       for scene in (game, view))
+        if seen != shown:
+            mismatches += 1
+
+    frames = args.steps
+    spectate = sizes['delta'] + sizes['keyframe']
+    print(f'{frames} steps, {keyframes} keyframes ({sizes["keyframe"] / max(keyframes, 1):.0f} B each), '
+          f'{sizes["delta"] / max(frames - keyframes, 1):.1f} B per delta')
+    print(f'spectator stream: {spectate / frames:.1f} B per step, {spectate / frames * 60 / 1024:.2f} KB/s at 60 Hz; '
+          f'snapshot deltas: {sizes["snapshot"] / frames:.1f} B per step '
+          f'({sizes["snapshot"] / max(spectate, 1):.1f}x)')
+    print(f'steps where the view differs from the game: {mismatches}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Sprite cache: all the sprites the game cuts from the atlas, already upsampled and cropped, in one file.
+SpriteSheet loads it in one read instead of scaling and scanning pixels at startup, the surfaces are made
+of the pixels in the file only for the sprites asked for.
+The cache is only used for the atlas (by its hash), sprite size and upsample it was built for.
+
+Build (or rebuild after changing the atlas):
+
+    python3 sprite_cache.py
+
+File: HEADER, an ENTRY for every sprite, then the pixels of the sprites (RGBX, 4 bytes a pixel)
+"""
+import hashlib
+import os
+import struct
+
+import pygame
+
+
+MAGIC = b'BCSC'
+CACHE_VERSION = 2
+
+# magic, version, atlas digest, sprite size, upsample, number of sprites
+HEADER = struct.Struct('<4sB40sBBH')
+# key of image_at: x, y, w, h, colorkey kind, colorkey, auto crop, square;
+# the sprite: width, height, colorkey kind, colorkey, rle, crop rect present, crop rect, offset of the pixels
+ENTRY = struct.Struct('<4HB4B??HHB4B??4hI')
+PIXEL_FORMAT = 'RGBX'
+PIXEL_SIZE = 4
+
+# colorkey kinds
+NO_COLORKEY = 0
+COLORKEY = 1
+FIRST_PIXEL = 2  # -1: the color of the top left pixel
+
+
+class CacheError(Exception):
+    pass
+
+
+def atlas_digest(data: bytes):
+    return hashlib.sha1(data).hexdigest()
+
+
+def _pack_colorkey(colorkey):
+    if colorkey is None:
+        return NO_COLORKEY, 0, 0, 0, 0
+    if colorkey == -1:
+        return FIRST_PIXEL, 0, 0, 0, 0
+    return (COLORKEY, *colorkey)
+
+
+def _unpack_colorkey(kind, *color):
+    if kind == NO_COLORKEY:
+        return None
+    if kind == FIRST_PIXEL:
+        return -1
+    return color
+
+
+def _read(data, digest, sprite_size, upsample):
+    """
+    :return: the sprites of the file, None if it is built for another atlas; raises CacheError if it is broken
+    """
+    try:
+        magic, version, atlas, cache_sprite_size, cache_upsample, n = HEADER.unpack_from(data)
+        entries = ENTRY.iter_unpack(data[HEADER.size:HEADER.size + n * ENTRY.size])
+    except struct.error:
+        raise CacheError('too short')
+    if magic != MAGIC:
+        raise CacheError('not a sprite cache')
+    if (version, atlas.decode('ascii', 'replace'), cache_sprite_size, cache_upsample) != \
+            (CACHE_VERSION, digest, sprite_size, upsample):
+        return None
+
+    # the surfaces are made of these slices later, the pixels are not copied
+    pixels = memoryview(data)[HEADER.size + n * ENTRY.size:]
+    sprites = {}
+    for (x, y, w, h, key_kind, kr, kg, kb, ka, auto_crop, square,
+         width, height, kind, r, g, b, a, rle, cropped, cx, cy, cw, ch, offset) in entries:
+        size = width * height * PIXEL_SIZE
+        if offset + size > len(pixels):
+            raise CacheError('the pixels of a sprite are cut off')
+        key = x, y, w, h, _unpack_colorkey(key_kind, kr, kg, kb, ka), auto_crop, square
+        sprites[key] = ((width, height), pixels[offset:offset + size], _unpack_colorkey(kind, r, g, b, a), rle,
+                        (cx, cy, cw, ch) if cropped else None)
+    return sprites
+
+
+def load(filename, digest, sprite_size, upsample):
+    """
+    :return: dict key of image_at -> (size, RGBX pixels, colorkey, rle, crop rect), empty if the cache does not fit
+    """
+    if not os.path.exists(filename):
+        return {}
+
+    try:
+        with open(filename, 'rb') as f:
+            sprites = _read(f.read(), digest, sprite_size, upsample)
+    except (OSError, CacheError):
+        print(f'Sprite cache {filename} is broken, ignored.')
+        return {}
+
+    if sprites is None:
+        print(f'Sprite cache {filename} is outdated, ignored. Rebuild it: python3 sprite_cache.py')
+        return {}
+    return sprites
+
+
+def save(sheet, filename):
+    """
+    Saves every sprite made by the sheet so far
+    """
+    entries, pixels = [], bytearray()
+    for (x, y, w, h, key_colorkey, auto_crop, square), (image, crop_rect) in sheet.made_sprites.items():
+        colorkey = image.get_colorkey()
+        rle = bool(colorkey is not None and not crop_rect)
+        entries.append(ENTRY.pack(x, y, w, h, *_pack_colorkey(key_colorkey), auto_crop, square,
+                                  *image.get_size(), *_pack_colorkey(colorkey), rle, bool(crop_rect),
+                                  *(crop_rect or (0, 0, 0, 0)), len(pixels)))
+        pixels += pygame.image.tostring(image, PIXEL_FORMAT)
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, CACHE_VERSION, sheet.digest.encode('ascii'), sheet.sprite_size, sheet.upsample,
+                            len(entries)))
+        f.write(b''.join(entries))
+        f.write(pixels)
+    return len(entries)
+
+
+def make_all_sprites():
+    """
+    Creates the objects of every kind and look, so the atlas cuts all the sprites of the game
+    """
+    from tank import Tank
+    from projectile import Projectile
+    from explosion import Explosion
+    from bonus import Bonus, BonusType
+    from my_base import MyBase
+    from score_node import ScoreLayer
+    from ui import GameOverLabel
+    from field import Field
+    from util import Direction, Clock
+
+    clock = Clock()
+
+    for color in Tank.Color:
+        for tank_type in Tank.Type:
+            Tank(clock, Tank.ENEMY, color, tank_type)
+    for d in Direction:
+        Projectile(0, 0, d)
+    Explosion(clock, 0, 0)
+    for bonus_type in BonusType:
+        Bonus(bonus_type, 0, 0)
+    MyBase()
+    ScoreLayer(clock)
+    GameOverLabel()
+    Field()
+
+
+def main():
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+
+    import config
+    # a sheet without the cache, so everything is made from scratch
+    sheet = config.SpriteSheet(config.ATLAS_FILE, upsample=config.ATLAS_UPSAMPLE, sprite_size=config.ATLAS_SPRITE_SIZE)
+    config._altas = sheet
+    make_all_sprites()
+
+    n = save(sheet, config.SPRITE_CACHE_FILE)
+    print(f'{n} sprites saved to {config.SPRITE_CACHE_FILE}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,51 @@
 import pygame
+import io
 from functools import lru_cache
 from util import COLOR_BLACK_KEY
+import sprite_cache
+
+
+def _convert(image: pygame.Surface):
+    # without a display (headless simulation) surfaces are kept in their original format
+    return image.convert() if pygame.display.get_surface() is not None else image
 
 
 class SpriteSheet:
-    def __init__(self, filename, sprite_size=8, upsample=1):
+    def __init__(self, filename, sprite_size=8, upsample=1, cache_file=None):
         self.sprite_size = sprite_size
         self.upsample = upsample
-        self.sheet = pygame.image.load(filename).convert()
+
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self._data = f.read()
+        self._sheet = None  # decoded when a sprite is not in the cache
+        self.digest = sprite_cache.atlas_digest(self._data)
+
+        # ready sprites from the cache file (see sprite_cache.py), if it is built for this very atlas
+        self._precomputed = {}
+        if cache_file is not None:
+            self._precomputed = sprite_cache.load(cache_file, self.digest, sprite_size, upsample)
+
+        # sprites made by this sheet: key -> (image, crop rect), the cache is built of them
+        self.made_sprites = {}
+
+        # (x, y, w, h, colorkey of the made image, square) -> crop rect
+        self._crop_rects = {
+            (x, y, w, h, colorkey, square): crop_rect
+            for (x, y, w, h, _, _, square), (_, _, colorkey, _, crop_rect) in self._precomputed.items() if crop_rect
+        }
+
+    @property
+    def sheet(self) -> pygame.Surface:
+        if self._sheet is None:
+            self._sheet = _convert(pygame.image.load(io.BytesIO(self._data), self.filename))
+        return self._sheet
 
     @staticmethod
     def crop(source_image: pygame.Surface, rect):
         _, _, w, h = rect
         old_colorkey = source_image.get_colorkey()
-        image = pygame.Surface((w, h)).convert()
+        image = _convert(pygame.Surface((w, h)))
         image.blit(source_image, (0, 0), rect)
         image.set_colorkey(old_colorkey)
         return image
@@ -21,9 +53,28 @@ class SpriteSheet:
     @lru_cache(maxsize=None)
     def image_at(self, x, y, w=1, h=1, colorkey=COLOR_BLACK_KEY, auto_crop=False,
                  square=False):
+        key = x, y, w, h, colorkey, auto_crop, square
+
+        cached = self._precomputed.get(key)
+        if cached is not None:
+            return self._image_from_cache(cached)
+
+        image, crop_rect = self._make_image(*key)
+        self.made_sprites[key] = image, crop_rect
+        return image
+
+    @staticmethod
+    def _image_from_cache(cached):
+        size, pixels, colorkey, rle, _ = cached
+        image = _convert(pygame.image.frombuffer(pixels, size, sprite_cache.PIXEL_FORMAT))
+        if colorkey is not None:
+            image.set_colorkey(colorkey, pygame.RLEACCEL if rle else 0)
+        return image
+
+    def _make_image(self, x, y, w, h, colorkey, auto_crop, square):
         s = self.sprite_size
         rect = pygame.Rect(x * s, y * s, w * s, h * s)
-        image = pygame.Surface(rect.size).convert()
+        image = _convert(pygame.Surface(rect.size))
         image.blit(self.sheet, (0, 0), rect)
 
         new_size = s * self.upsample
@@ -32,47 +83,48 @@ class SpriteSheet:
             image = pygame.transform.scale(image, (w * new_size, h * new_size))
 
         if colorkey is not None:
-            if colorkey is -1:
+            if colorkey == -1:
                 colorkey = image.get_at((0, 0))
             image.set_colorkey(colorkey, pygame.RLEACCEL)
 
+        crop_rect = None
         if auto_crop:
-            image = self.crop(image, self.find_crop_rect(image, square=square))
+            # -1 is resolved above, the key has the colorkey the image really has
+            crop_key = x, y, w, h, image.get_colorkey(), square
+            crop_rect = self._crop_rects.get(crop_key)
+            if crop_rect is None:
+                crop_rect = self._crop_rects[crop_key] = self.find_crop_rect(image, square=square)
+            image = self.crop(image, crop_rect)
 
-        return image
+        return image, crop_rect
+
+    @staticmethod
+    def _content_box(img, bg_color):
+        content = pygame.mask.from_threshold(img, bg_color, (1, 1, 1, 255))
+        content.invert()
+        boxes = content.get_bounding_rects()
+        return boxes[0].unionall(boxes[1:]) if boxes else None
 
     @staticmethod
     def find_crop_rect(img, bg_color=COLOR_BLACK_KEY, square=False):
         w, h = img.get_width(), img.get_height()
 
-        def scan_line(or_x, or_y, horizontal):
-            line_x = range(w) if horizontal else [or_x] * w
-            line_y = [or_y] * h if horizontal else range(h)
-            line_xy = zip(line_x, line_y)
-            return all(img.get_at((x, y)) == bg_color for x, y in line_xy)
-
-        left, right, top, bottom = 0, 0, 0, 0
-
-        while left < w:
-            if not scan_line(left, 0, horizontal=False):
-                break
-            left += 1
+        # the masks of the pixels which differ from bg_color, computed for the whole area at once.
+        # the columns are tested only in the first min(w, h) rows and the rows in the first min(w, h) columns,
+        # this is how the crop rects have always been calculated (same result for the square sprites)
+        side = min(w, h)
+        columns_box = SpriteSheet._content_box(img.subsurface((0, 0, w, side)), bg_color)
+        rows_box = SpriteSheet._content_box(img.subsurface((0, 0, side, h)), bg_color)
 
-        while right < w:
-            if not scan_line(w - 1 - right, 0, horizontal=False):
-                break
-            right += 1
-
-        while top < h:
-            if not scan_line(0, top, horizontal=True):
-                break
-            top += 1
-
-        while bottom < h:
-            if not scan_line(0, h - bottom - 1, horizontal=True):
-                break
-            bottom += 1
+        if columns_box is None:
+            left, right = w, w
+        else:
+            left, right = columns_box.left, w - columns_box.right
 
+        if rows_box is None:
+            top, bottom = h, h
+        else:
+            top, bottom = rows_box.top, h - rows_box.bottom
 
         crop_w = w - right - left
         crop_h = h - bottom - top
@@ -87,6 +139,7 @@ class SpriteSheet:
                 crop_w = crop_h
 
         return left, top, crop_w, crop_h
+
     @property
     def real_sprite_size(self):
         return self.sprite_size * self.upsample
@@ -1,6 +1,7 @@
 from config import *
 from util import *
 from math import ceil, floor
+from functools import lru_cache
 
 
 class Tank(GameObject):
@@ -73,14 +74,32 @@ class Tank(GameObject):
     def fire(self):
         self.want_to_fire = True
 
-    def _update_sprites(self):
-        atlas = ATLAS()
-        sprite_locations = {(d, s): self.get_sprite_location(self.color, self.tank_type, d, s)
-                            for d in Direction
-                            for s in self.POSSIBLE_MOVE_STATES}
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def sprite_set(atlas, color: Color, type: Type):
+        """
+        The sprites of all directions and move states of one look, shared by all the tanks of this look
+        :return: dict (direction, state) -> sprite
+        """
+        return {(d, s): atlas.image_at(*Tank.get_sprite_location(color, type, d, s), auto_crop=True, square=False)
+                for d in Direction
+                for s in Tank.POSSIBLE_MOVE_STATES}
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def effect_sprites(atlas):
+        """
+        :return: shield sprites, spawn sprites
+        """
+        shield = (
+            atlas.image_at(32, 18, 2, 2),
+            atlas.image_at(34, 18, 2, 2)
+        )
+        spawn = tuple(atlas.image_at(xi, 12, 2, 2) for xi in range(32, 40, 2))
+        return shield, spawn
 
-        self.sprites = {key: atlas.image_at(*location, auto_crop=True, square=False)
-                        for key, location in sprite_locations.items()}
+    def _update_sprites(self):
+        self.sprites = self.sprite_set(ATLAS(), self._color, self._tank_type)
 
     @property
     def color(self):
@@ -88,12 +107,29 @@ class Tank(GameObject):
 
     @color.setter
     def color(self, color):
-        self._color = color
-        self._update_sprites()
+        if color is not self._color:
+            self._color = color
+            self._update_sprites()
+
+    @property
+    def is_spawning(self):
+        return self._is_spawning
+
+    @is_spawning.setter
+    def is_spawning(self, spawning):
+        self._is_spawning = spawning
+        # the parent keeps the views of mature tanks
+        if self._parent is not None:
+            self._parent.reindex(self)
 
-    def __init__(self, fraction, color=Color.YELLOW, tank_type=Type.LEVEL_1, fire_delay=0.5):
+    def __init__(self, clock: Clock, fraction, color=Color.YELLOW, tank_type=Type.LEVEL_1, fire_delay=0.5):
+        """
+        :param clock: of the game, for the animations and timers of the tank
+        """
         super().__init__()
 
+        self.clock = clock
+
         self.fraction = fraction
         self.speed = self.SPEED_NORMAL
         self._direction = Direction.UP
@@ -107,12 +143,13 @@ class Tank(GameObject):
         self.to_destroy = False
 
         self.is_bonus = False
-        self._bonus_animator = Animator(delay=0.5, max_states=2)
+        self._bonus_animator = Animator(clock, delay=0.5, max_states=2)
 
         self.moving = False
-        self.move_animator = Animator(delay=0.1, max_states=2)
+        self.move_animator = Animator(clock, delay=0.1, max_states=2)
 
         self.remember_position()
+        self.prev_position = self.position
 
         self.want_to_fire = False
 
@@ -127,19 +164,12 @@ class Tank(GameObject):
                 print(k, w, h)
 
         self._shielded = False
-        self._shield_timer = Timer(self.SHIELD_TIME)
-        self._shield_animator = Animator(delay=0.04, max_states=2)
-        self._shield_sprites = (
-            atlas.image_at(32, 18, 2, 2),
-            atlas.image_at(34, 18, 2, 2)
-        )
-
-        self._spawn_sprites = [
-            atlas.image_at(xi, 12, 2, 2) for xi in range(32, 40, 2)
-        ]
-        self._spawn_animator = Animator(delay=0.1, max_states=len(self._spawn_sprites))
+        self._shield_timer = Timer(clock, self.SHIELD_TIME)
+        self._shield_animator = Animator(clock, delay=0.04, max_states=2)
+        self._shield_sprites, self._spawn_sprites = self.effect_sprites(atlas)
+        self._spawn_animator = Animator(clock, delay=0.1, max_states=len(self._spawn_sprites))
 
-        self.fire_timer = Timer(fire_delay, paused=True)
+        self.fire_timer = Timer(clock, fire_delay, paused=True)
 
     @property
     def shielded(self):
@@ -149,7 +179,7 @@ class Tank(GameObject):
     def shielded(self, v):
         self._shielded = v
         if self._shielded:
-            self._shield_timer = Timer(self.SHIELD_TIME)
+            self._shield_timer = Timer(self.clock, self.SHIELD_TIME)
             self._shield_timer.start()
         else:
             self._shield_timer.stop()
@@ -183,6 +213,25 @@ class Tank(GameObject):
     def sprite_key(self):
         return self.direction, self.POSSIBLE_MOVE_STATES[self.move_animator.state]
 
+    def update(self):
+        self.prev_position = self.position
+
+        # animate sprite when moving
+        if self.moving:
+            self.move_animator()
+
+        if self.is_bonus:
+            state = self._bonus_animator()
+            self.color = Tank.Color.PURPLE if state == 0 else Tank.Color.PLAIN
+
+        if not self._shield_timer.tick():
+            self._shield_animator()
+        else:
+            self._shielded = False
+
+        if self._is_spawning:
+            self._spawn_animator()
+
     def render(self, screen):
         sprite = self.sprites[self.sprite_key]
 
@@ -192,30 +241,33 @@ class Tank(GameObject):
         ctx = sprite.get_width() // 2
         cty = sprite.get_height() // 2
 
-        if not self.is_spawning:
+        if not self._is_spawning:
             screen.blit(sprite, (x - ctx, y - cty))
 
-        # animate sprite when moving
-        if self.moving:
-            self.move_animator()
-
-        if self.is_bonus:
-            state = self._bonus_animator()
-            self.color = Tank.Color.PURPLE if state == 0 else Tank.Color.PLAIN
-
         # it is size of a half of full 2x2 sprite, effects have full size unlike tanks
         half_full_size = ATLAS().real_sprite_size
 
-        if not self._shield_timer.tick():
-            shield_sprite = self._shield_sprites[self._shield_animator()]
+        if not self._shield_timer.done:
+            shield_sprite = self._shield_sprites[self._shield_animator.state]
             screen.blit(shield_sprite, (x - half_full_size, y - half_full_size))
-        else:
-            self._shielded = False
 
-        if self.is_spawning:
-            spawn_sprite = self._spawn_sprites[self._spawn_animator()]
+        if self._is_spawning:
+            spawn_sprite = self._spawn_sprites[self._spawn_animator.state]
             screen.blit(spawn_sprite, (x - half_full_size, y - half_full_size))
 
+    @property
+    def screen_rects(self):
+        # shield and spawn effects are full 2x2 sprites around the center, the tank sprite is smaller
+        half_full_size = ATLAS().real_sprite_size
+        x, y = self.position
+        return (x - half_full_size, y - half_full_size, half_full_size * 2, half_full_size * 2),
+
+    @property
+    def render_state(self):
+        return (self.sprite_key, self._color, self._tank_type, self._is_spawning,
+                None if self._shield_timer.done else self._shield_animator.state,
+                self._spawn_animator.state)
+
     def activate_shield(self):
         self.shielded = self.SHIELD_TIME
 
@@ -254,7 +306,7 @@ class Tank(GameObject):
         return point_in_rect(x, y, self.bounding_rect)
 
     def place(self, position):
-        self.position = tuple(position)
+        self.position = self.prev_position = tuple(position)
         self.remember_position()
 
     def move_tank(self, direction: Direction):
@@ -0,0 +1,5 @@
+import os
+
+# the game reads its data relative to the root of the repository
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
@@ -0,0 +1,41 @@
+from collections import Counter
+
+import pytest
+
+from ai import EnemyFractionAI
+from game import Game
+from util import FixedClock
+
+
+def play(seed, ticks=1200, **options):
+    """
+    :return: the enemies (position, direction) and the projectiles after every tick, the player stands still
+    """
+    game = Game(clock=FixedClock(), seed=seed, **options)
+    game.ai.MAX_ENEMIES = 6
+    states = []
+    for _ in range(ticks):
+        game.step()
+        states.append(([(t.position, t.direction) for t in game.ai.all_enemies],
+                       [p.position for p in game.projectiles]))
+    return states
+
+
+@pytest.mark.parametrize('mode', EnemyFractionAI.MODES)
+@pytest.mark.parametrize('sight_fire', [False, True])
+def test_seeded_enemies_repeat(mode, sight_fire):
+    assert play(4, ai_mode=mode, sight_fire=sight_fire) == play(4, ai_mode=mode, sight_fire=sight_fire)
+    assert play(4, ai_mode=mode, sight_fire=sight_fire) != play(5, ai_mode=mode, sight_fire=sight_fire)
+
+
+def test_sight_fire_wastes_fewer_projectiles():
+    blind = sum(len(projectiles) for _, projectiles in play(7, 3000))
+    aimed = sum(len(projectiles) for _, projectiles in play(7, 3000, sight_fire=True))
+    assert aimed < blind
+
+
+def test_random_enemies_turn_every_way_and_fire():
+    states = play(7, 3000)
+    directions = Counter(d for enemies, _ in states for _, d in enemies)
+    assert len(directions) == 4
+    assert sum(1 for _, projectiles in states if projectiles) > 100
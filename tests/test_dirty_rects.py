@@ -0,0 +1,88 @@
+from dirty_rects import DirtyRectTracker
+from util import Entity, GameObject
+
+SCREEN = (400, 300)
+
+
+class Box(Entity):
+    """
+    Paints its bounding rect, the frame is its look
+    """
+    __slots__ = ('frame',)
+
+    def __init__(self, x, y, w=10, h=10):
+        super().__init__()
+        self.position = x, y
+        self.size = w, h
+        self.frame = 0
+
+    @property
+    def screen_rects(self):
+        return self.bounding_rect,
+
+    @property
+    def render_state(self):
+        return self.frame
+
+
+def scene_of(*boxes):
+    scene = GameObject()
+    for box in boxes:
+        scene.add_child(box)
+    tracker = DirtyRectTracker(SCREEN)
+    assert tracker.collect(scene) is None  # the first frame is flipped whole
+    return scene, tracker
+
+
+def test_still_scene_has_nothing_to_update():
+    scene, tracker = scene_of(Box(0, 0), Box(50, 50))
+    assert tracker.collect(scene) == []
+
+
+def test_moved_object_updates_where_it_was_and_is():
+    box = Box(0, 0)
+    scene, tracker = scene_of(box, Box(50, 50))
+    box.position = 5, 0
+    assert sorted(map(tuple, tracker.collect(scene))) == [(0, 0, 10, 10), (5, 0, 10, 10)]
+    assert tracker.collect(scene) == []
+
+
+def test_new_look_in_place():
+    box = Box(20, 20)
+    scene, tracker = scene_of(box)
+    box.frame = 1
+    assert list(map(tuple, tracker.collect(scene))) == [(20, 20, 10, 10), (20, 20, 10, 10)]
+
+
+def test_appeared_and_removed_objects():
+    old = Box(0, 0)
+    scene, tracker = scene_of(old)
+    new = Box(30, 30)
+    scene.add_child(new)
+    old.remove_from_parent()
+    assert sorted(map(tuple, tracker.collect(scene))) == [(0, 0, 10, 10), (30, 30, 10, 10)]
+
+
+def test_nested_objects_and_extra_rects():
+    box = Box(0, 0)
+    layer = GameObject()
+    layer.add_child(box)
+    scene, tracker = scene_of(layer)
+    box.position = 0, 5
+    rects = tracker.collect(scene, extra_rects=[(100, 100, 1, 1)])
+    assert sorted(map(tuple, rects)) == [(0, 0, 10, 10), (0, 5, 10, 10), (100, 100, 1, 1)]
+
+
+def test_large_change_flips_the_whole_screen():
+    big = Box(0, 0, 300, 200)
+    scene, tracker = scene_of(big)
+    # old and new rects: 2 * 300 * 200, more than a half of the screen
+    big.position = 1, 0
+    assert tracker.collect(scene) is None
+
+
+def test_invalidate():
+    scene, tracker = scene_of(Box(0, 0))
+    tracker.invalidate()
+    assert tracker.collect(scene) is None
+    assert tracker.collect(scene) == []
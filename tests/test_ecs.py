@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from game import Game
+from util import FixedClock, Direction
+
+
+def play(seed, ticks, **options):
+    """
+    :return: the tanks, the projectiles, the cells and the score after every tick
+    """
+    game = Game(clock=FixedClock(), seed=seed, level=1 + seed % 2, **options)
+    game.ai.MAX_ENEMIES = 10
+    rng = random.Random(seed)
+    states = []
+    for i in range(ticks):
+        if i % 30 == 0:
+            game.my_tank_move_to_direction = rng.choice([None, *Direction])
+        if i % 8 == 0:
+            game.fire()
+        game.step()
+        states.append(([(t.position, t.tank_type, t.direction) for t in game.tanks],
+                       [(p.position, p.direction, p.power) for p in game.projectiles],
+                       list(game.field.map._cells), game.score, game.is_game_over))
+    return states
+
+
+@pytest.mark.parametrize('seed', [1, 2, 6])
+@pytest.mark.parametrize('swept', [False, True])
+def test_same_game_with_column_storage(seed, swept):
+    objects = play(seed, 1500, swept_projectiles=swept)
+    columns = play(seed, 1500, swept_projectiles=swept, ecs=True)
+    diverged = next((step for step, (a, b) in enumerate(zip(objects, columns)) if a != b), None)
+    assert diverged is None, f'diverged at step {diverged}'
+    # projectiles flew in many steps and broke walls
+    assert sum(1 for _, projectiles, *_ in objects if projectiles) > 300
+    assert objects[-1][2] != objects[0][2]
@@ -0,0 +1,9 @@
+from config import ATLAS
+from field import FieldOverlay
+
+
+def test_overlay_colorkey_is_not_in_the_atlas():
+    # a color of the atlas would make those pixels of the green cells see-through
+    sheet = ATLAS().sheet
+    colors = {tuple(sheet.get_at((x, y)))[:3] for x in range(sheet.get_width()) for y in range(sheet.get_height())}
+    assert FieldOverlay.TRANSPARENT_COLOR not in colors
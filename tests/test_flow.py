@@ -0,0 +1,74 @@
+
+from math import inf
+
+from ai import EnemyFractionAI
+from field import Field, CellType
+from flow_field import FlowField
+from game import Game
+from util import FixedClock, Direction
+
+
+def open_field(width, height):
+    field = Field(width, height)
+    for col in range(width):
+        for row in range(height):
+            field.map.set_cell_col_row(col, row, CellType.FREE)
+    return field
+
+
+def corridor(flow):
+    """
+    :return: the distances along the only row of corners of a field two cells high
+    """
+    return [flow.distance((col, 1)) for col in range(1, flow.cols - 1)]
+
+
+def test_bricks_cost_and_concrete_blocks():
+    field = open_field(6, 2)
+    flow = FlowField(field)
+    flow.targets = [(1, 1)]
+    assert corridor(flow) == [0, 1, 2, 3, 4]
+
+    # the two corners next to the brick cost more; going into a node costs the cost of the node
+    field.map.set_cell_col_row(2, 0, CellType.BRICK)
+    assert corridor(flow) == [0, 1, 1 + 5, 1 + 5 + 5, 1 + 5 + 5 + 1]
+    field.map.set_cell_col_row(2, 0, CellType.BRICK_BOTTOM)
+    assert corridor(flow) == [0, 1, 1 + 3, 1 + 3 + 3, 1 + 3 + 3 + 1]
+
+    # shot away
+    field.map.set_cell_col_row(2, 0, CellType.FREE)
+    assert corridor(flow) == [0, 1, 2, 3, 4]
+
+    # blocks the corners at both ends of its top edge
+    field.map.set_cell_col_row(3, 1, CellType.CONCRETE)
+    assert corridor(flow) == [0, 1, inf, inf, inf]
+    assert flow.best_directions((5, 1)) == []
+    assert flow.best_directions((2, 1)) == [Direction.LEFT]
+
+
+def test_blocked_target_is_reached_next_to_it():
+    field = open_field(6, 2)
+    # the base stands on the target
+    field.map.set_cell_col_row(0, 0, CellType.CONCRETE)
+    flow = FlowField(field)
+    flow.targets = [(1, 1)]
+    assert corridor(flow) == [0, 1, 2, 3, 4]
+    assert flow.best_directions((2, 1)) == [Direction.LEFT]
+
+
+def test_way_to_the_nearest_target():
+    flow = FlowField(open_field(8, 4))
+    flow.targets = [(1, 2), (7, 2)]
+    assert [flow.distance((col, 2)) for col in range(1, 8)] == [0, 1, 2, 3, 2, 1, 0]
+    assert flow.best_directions((3, 2)) == [Direction.LEFT]
+    assert flow.best_directions((5, 2)) == [Direction.RIGHT]
+    assert flow.best_directions((1, 2)) == []
+
+
+def test_hunters_go_to_every_player():
+    game = Game(clock=FixedClock(), seed=2, players=2, ai_mode=EnemyFractionAI.MODE_FLOW)
+    game.step()
+    flow = game.ai.flow_to_player
+    assert sorted(flow.targets) == sorted(flow.corner_of(*t.position) for t in game.player_tanks)
+    for t in game.player_tanks:
+        assert flow.distance(flow.corner_of(*t.position)) == 0
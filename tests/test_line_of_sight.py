@@ -0,0 +1,67 @@
+import pytest
+
+from field import CellType
+from line_of_sight import SightLines
+from tests.test_flow import open_field
+from util import Direction
+
+
+@pytest.fixture
+def sight():
+    """
+    An open field of 10x5 cells, the target in the cell (8, 2)
+    """
+    sight = SightLines(open_field(10, 5))
+    sight.targets = [cell_rect(sight, 8, 2)]
+    return sight
+
+
+def cell_rect(sight, col, row):
+    x0, y0 = sight.field.map.position
+    return x0 + col * sight.step, y0 + row * sight.step, sight.step, sight.step
+
+
+def center(sight, col, row):
+    x, y, w, h = cell_rect(sight, col, row)
+    return x + w // 2, y + h // 2
+
+
+def test_target_on_the_line_of_fire(sight):
+    x, y = center(sight, 1, 2)
+    assert sight.can_hit(x, y, Direction.RIGHT)
+    assert not any(sight.can_hit(x, y, d) for d in (Direction.LEFT, Direction.UP, Direction.DOWN))
+    # beside the line: the trace of the projectile misses it
+    assert not sight.can_hit(*center(sight, 1, 0), Direction.RIGHT)
+    assert sight.can_hit(*center(sight, 8, 4), Direction.UP)
+
+
+def test_cells_in_the_way(sight):
+    x, y = center(sight, 1, 2)
+    set_cell = sight.field.map.set_cell_col_row
+    # the rows are cached by the first look and changed by the cells
+    set_cell(4, 2, CellType.BRICK)
+    assert not sight.can_hit(x, y, Direction.RIGHT)
+    set_cell(4, 2, CellType.FREE)
+    assert sight.can_hit(x, y, Direction.RIGHT)
+
+    # the trace is wider than a half of a cell: a wall in the next row is in the way, two rows off it is not
+    set_cell(4, 3, CellType.CONCRETE)
+    assert not sight.can_hit(x, y, Direction.RIGHT)
+    set_cell(4, 3, CellType.FREE)
+    set_cell(4, 4, CellType.CONCRETE)
+    assert sight.can_hit(x, y, Direction.RIGHT)
+
+    # behind the target does not matter
+    set_cell(9, 2, CellType.CONCRETE)
+    assert sight.can_hit(x, y, Direction.RIGHT)
+
+
+def test_target_behind_bricks(sight):
+    sight.targets, sight.targets_behind_bricks = [], sight.targets
+    x, y = center(sight, 1, 2)
+    set_cell = sight.field.map.set_cell_col_row
+    set_cell(4, 2, CellType.BRICK)
+    set_cell(5, 2, CellType.BRICK_LEFT)
+    assert sight.can_hit(x, y, Direction.RIGHT)
+    set_cell(6, 2, CellType.CONCRETE)
+    assert not sight.can_hit(x, y, Direction.RIGHT)
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+
+import controls
+from game import Game
+from netplay import LoopbackTransport, RollbackSession
+from util import FixedClock
+
+DIRECTIONS = [0, controls.UP, controls.DOWN, controls.LEFT, controls.RIGHT]
+
+
+def new_game(versus):
+    return Game(clock=FixedClock(), seed=8, players=2, versus=versus)
+
+
+def play(latency, loss, versus, steps=600):
+    """
+    Two bots over the loopback transport, then both sides catch up with each other
+    :return: the sessions and the inputs they took: player -> step -> bits
+    """
+    transports = LoopbackTransport.pair(latency, loss, seed=3)
+    sessions = [RollbackSession(new_game(versus), player, transport) for player, transport in enumerate(transports)]
+    taken = [{}, {}]
+
+    def advance(player, bits):
+        session = sessions[player]
+        t = session.game.ticks
+        if session.advance(bits):
+            taken[player][t + session.input_delay] = bits
+
+    bots = [random.Random(player) for player in range(2)]
+    bits = [0, 0]
+    for _ in range(steps):
+        for player, rng in enumerate(bots):
+            if rng.random() < 0.05:
+                bits[player] = rng.choice(DIRECTIONS)
+            advance(player, bits[player] | (controls.FIRE if rng.random() < 0.05 else 0))
+
+    for _ in range(1000):
+        last = max(session.game.ticks for session in sessions)
+        if all(session.game.ticks == last and session.ahead < 0 for session in sessions):
+            break
+        for player, session in enumerate(sessions):
+            if session.game.ticks < last:
+                advance(player, 0)
+            else:
+                session.poll()
+                session.send()
+    return sessions, taken
+
+
+@pytest.mark.parametrize('latency, loss, versus', [(0, 0.0, False), (6, 0.0, False), (6, 0.2, False),
+                                                   (10, 0.3, True)])
+def test_both_sides_play_the_same_match(latency, loss, versus):
+    sessions, taken = play(latency, loss, versus)
+    for session in sessions:
+        assert session.desync_step is None
+        assert session.ahead < 0
+    if latency:
+        assert all(session.rollbacks for session in sessions)
+
+    # the match as if both inputs of every step were known in time
+    game = new_game(versus)
+    while game.ticks < sessions[0].game.ticks:
+        for player in range(2):
+            game.apply_input(taken[player].get(game.ticks, 0), player)
+        game.step()
+    for session in sessions:
+        assert session.game.ticks == game.ticks
+        assert session.game.snapshot() == game.snapshot()
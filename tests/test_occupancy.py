@@ -0,0 +1,88 @@
+import hashlib
+import random
+
+import pytest
+
+from discrete_map import OccupancyMap
+from game import Game
+from util import FixedClock, Direction
+
+
+class RefillOccupancyMap(OccupancyMap):
+    """
+    The map as it was before the footprints were tracked: cleared of the tanks and filled in again every tick
+    """
+
+    def place_group(self, placements):
+        placements = list(placements)
+        group = {obj for obj, _ in placements} | set(self._group)
+        cells = self._cells
+        cells[:] = [None if c in group else c for c in cells]
+        self._group = {obj: rank for rank, (obj, _) in enumerate(placements)}
+        for obj, rect in placements:
+            self.fill_rect(rect, obj, only_if_empty=True)
+
+
+def new_map():
+    return OccupancyMap((0, 0), 8, cells_width=8, cells_height=8)
+
+
+def test_first_of_the_group_wins():
+    m = new_map()
+    a, b = object(), object()
+    m.place_group([(b, (0, 0, 15, 15))])
+    # a comes first, it takes the cells b was on before
+    m.place_group([(a, (8, 8, 15, 15)), (b, (0, 0, 15, 15))])
+    assert m.get_cell_by_col_row(1, 1) is a
+    assert m.get_cell_by_col_row(0, 0) is b
+    # b gets them back once a has left
+    m.place_group([(a, (40, 40, 15, 15)), (b, (0, 0, 15, 15))])
+    assert m.get_cell_by_col_row(1, 1) is b
+
+
+def test_group_never_takes_other_objects():
+    m = new_map()
+    base, tank = object(), object()
+    m.place(base, (0, 0, 15, 15))
+    m.place_group([(tank, (8, 8, 15, 15))])
+    assert m.get_cell_by_col_row(1, 1) is base
+    assert m.get_cell_by_col_row(2, 2) is tank
+
+
+def test_missing_objects_leave_the_map():
+    m = new_map()
+    a, b = object(), object()
+    m.place_group([(a, (0, 0, 15, 15)), (b, (8, 8, 15, 15))])
+    m.place_group([(b, (8, 8, 15, 15))])
+    assert m.get_cell_by_col_row(0, 0) is None
+    assert m.get_cell_by_col_row(1, 1) is b
+
+
+def play(seed, refill, ticks):
+    """
+    :return: a digest of the tanks and the cells after every tick
+    """
+    game = Game(clock=FixedClock(), seed=seed, level=1 + seed % 2)
+    if refill:
+        game.field.oc_map.__class__ = RefillOccupancyMap
+    game.ai.MAX_ENEMIES = 5
+    rng = random.Random(seed)
+    digests = []
+    for i in range(ticks):
+        if i % 30 == 0:
+            game.my_tank_move_to_direction = rng.choice([None, *Direction])
+        if i % 15 == 0:
+            game.fire()
+        game.step()
+        cells = [c if c is None else (type(c).__name__, c.position) for c in game.field.oc_map._cells]
+        tanks = [(t.position, t.tank_type, t.direction) for t in game.tanks]
+        digests.append(hashlib.md5(repr((tanks, cells)).encode()).hexdigest())
+    return digests
+
+
+@pytest.mark.parametrize('seed', [3, 7, 11, 19])
+def test_same_game_as_refilling_the_map(seed):
+    tracked = play(seed, False, 1200)
+    refilled = play(seed, True, 1200)
+    diverged = next((step for step, (a, b) in enumerate(zip(tracked, refilled)) if a != b), None)
+    assert diverged is None, f'diverged at step {diverged}'
@@ -0,0 +1,125 @@
+import pytest
+
+from field import CellType
+from game import Game
+from projectile import Projectile
+from util import FixedClock, Direction
+
+FAST = 40  # five times the usual speed, much more than the thinnest obstacle
+
+
+def empty_game(swept):
+    """
+    A game with no enemies and no walls
+    """
+    game = Game(clock=FixedClock(), seed=1, swept_projectiles=swept)
+    game.ai.MAX_ENEMIES = 0
+    for t in list(game.ai.all_enemies):
+        game.remove_tank(t)
+    cells = game.field.map
+    for col in range(cells.width):
+        for row in range(cells.height):
+            cells.set_cell_col_row(col, row, CellType.FREE)
+    return game
+
+
+def build_wall(game, cols, row, cell):
+    """
+    :return: the top left corner of the wall
+    """
+    for col in cols:
+        game.field.map.set_cell_col_row(col, row, cell)
+    return game.field.map.coord_by_col_and_row(cols[0], row)
+
+
+def shoot_up(game, x, y, ticks=1):
+    p = game.spawn_projectile(x, y, Direction.UP, sender=game.my_tank)
+    for _ in range(ticks):
+        game.step()
+    return p
+
+
+def test_sweep_splits_the_move(monkeypatch):
+    monkeypatch.setattr(Projectile, 'SPEED', FAST)
+    p = Projectile(100, 200, Direction.UP)
+    p.update()
+    assert p.sweep() == [(100, 192), (100, 184), (100, 176), (100, 168), (100, 160)]
+
+
+def test_sweep_of_a_slow_projectile_is_its_position():
+    p = Projectile(100, 200, Direction.LEFT)
+    p.update()
+    assert p.sweep() == [p.position]
+
+
+@pytest.mark.parametrize('swept', [False, True])
+def test_normal_speed_hits_a_thin_wall(swept):
+    game = empty_game(swept)
+    x, y = build_wall(game, range(4, 8), 10, CellType.BRICK_BOTTOM)
+    step = game.field.map.step
+    p = shoot_up(game, x + 2 * step, y + step + 20, ticks=4)
+    assert p not in game.projectiles
+    assert game.field.map.get_cell_by_col_row(6, 10) is CellType.FREE
+
+
+@pytest.mark.parametrize('swept, passes', [(False, True), (True, False)])
+def test_fast_projectile_and_a_thin_wall(monkeypatch, swept, passes):
+    monkeypatch.setattr(Projectile, 'SPEED', FAST)
+    game = empty_game(swept)
+    x, y = build_wall(game, range(4, 8), 10, CellType.BRICK_BOTTOM)
+    step = game.field.map.step
+    # the only sample of the move lands above the half brick
+    p = shoot_up(game, x + 2 * step, y + step + 20)
+    assert (p in game.projectiles) is passes
+    assert (game.field.map.get_cell_by_col_row(6, 10) is CellType.BRICK_BOTTOM) is passes
+    if not passes:
+        # stopped on the brick, not at the end of the move
+        assert p.position[1] > y
+
+
+@pytest.mark.parametrize('swept, passes', [(False, True), (True, False)])
+def test_fast_projectile_and_a_tank(monkeypatch, swept, passes):
+    monkeypatch.setattr(Projectile, 'SPEED', FAST)
+    game = empty_game(swept)
+    enemy = game.ai.get_next_enemy((0, 0))
+    enemy.is_spawning = False
+    enemy.place((200, 200))
+    game.tanks.add_child(enemy)
+    game.world.update(enemy)
+    game.freeze_timer.start()  # it stands still
+    _, top, _, height = enemy.bounding_rect
+    # the move starts below the tank and ends above it
+    p = shoot_up(game, 200, top + height + 5)
+    assert (p in game.projectiles) is passes
+
+
+@pytest.mark.parametrize('swept', [False, True])
+@pytest.mark.parametrize('speed', [Projectile.SPEED, FAST])
+@pytest.mark.parametrize('gap, hits', [(0, True), (1, False)])
+def test_corner_graze(monkeypatch, swept, speed, gap, hits):
+    monkeypatch.setattr(Projectile, 'SPEED', speed)
+    game = empty_game(swept)
+    # a wall two cells high, so even the sampled fast projectile lands in it
+    x, _ = build_wall(game, [10], 9, CellType.CONCRETE)
+    build_wall(game, [10], 10, CellType.CONCRETE)
+    # the side aim point of the projectile passes the left edge of the wall at the distance of the gap
+    side = max(dx for dx, _ in Projectile(0, 0, Direction.UP).split_for_aim())
+    # from just below the wall to a cell above it
+    p = shoot_up(game, x - side - gap, game.field.map.coord_by_col_and_row(10, 12)[1], ticks=-(-64 // speed))
+    assert (p not in game.projectiles) is hits
+
+
+def test_same_game_at_the_usual_speed():
+    # a move of the usual speed is a single sample of the sweep
+    states = []
+    for swept in (False, True):
+        game = Game(clock=FixedClock(), seed=5, swept_projectiles=swept)
+        game.ai.MAX_ENEMIES = 10
+        state = []
+        for i in range(600):
+            if i % 10 == 0:
+                game.fire()
+            game.step()
+            state.append(([t.position for t in game.tanks], [p.position for p in game.projectiles], game.score))
+        states.append(state)
+    assert states[0] == states[1]
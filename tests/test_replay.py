@@ -0,0 +1,41 @@
+import pytest
+
+from game import Game
+from replay import Replay, ReplayError, MAX_SEED
+from util import FixedClock
+
+
+@pytest.mark.parametrize('seed', [0, MAX_SEED])
+def test_seed_survives_the_file(seed):
+    replay = Replay(seed)
+    replay.record(3)
+    assert Replay.from_bytes(replay.to_bytes()).seed == seed
+
+
+@pytest.mark.parametrize('seed', [-1, MAX_SEED + 1])
+def test_seed_out_of_range_is_refused_at_the_start(seed):
+    with pytest.raises(ReplayError):
+        Replay(seed)
+
+
+def play(games, ticks):
+    """
+    Steps the games in turns, each one fires from outside of its step
+    :return: the positions of the tanks and the projectiles of every game after every tick
+    """
+    states = [[] for _ in games]
+    for i in range(ticks):
+        for game, state in zip(games, states):
+            if i % 20 == 0:
+                game.fire()
+            game.step()
+            state.append(([t.position for t in game.tanks], [p.position for p in game.projectiles]))
+    return states
+
+
+def test_games_in_one_process_keep_their_time():
+    alone, = play([Game(clock=FixedClock(), seed=4)], 600)
+    # the other game is ahead by a second, its timers must not shift the timers of the first one
+    ahead = Game(clock=FixedClock(1.0), seed=4)
+    together, _ = play([Game(clock=FixedClock(), seed=4), ahead], 600)
+    assert together == alone
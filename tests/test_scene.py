@@ -0,0 +1,97 @@
+from game import Game
+from util import Entity, GameObject, FixedClock
+
+
+class Item(Entity):
+    __slots__ = ('kind',)
+
+    def __init__(self, kind='a'):
+        super().__init__()
+        self.kind = kind
+
+
+def walk(node):
+    yield node
+    for child in node:
+        yield from walk(child)
+
+
+def test_add_and_remove_while_iterating_wait_for_the_end():
+    node = GameObject()
+    first, second, late = Item(), Item(), Item()
+    node.add_child(first)
+    node.add_child(second)
+    seen = []
+    for child in node:
+        seen.append(child)
+        if child is first:
+            # nested iteration: the changes wait for the outermost one
+            for _ in node:
+                node.add_child(late)
+                node.remove_child(first)
+                break
+        assert late not in node._children and first in node._children
+    assert seen == [first, second]
+    assert list(node) == [second, late]
+
+
+def test_remove_from_parent_while_visiting():
+    node = GameObject()
+    items = [Item() for _ in range(3)]
+    for item in items:
+        node.add_child(item)
+    for child in node:
+        child.remove_from_parent()
+    assert list(node) == []
+    assert node.total_children == 1
+
+
+def test_counts_of_the_tree():
+    root, layer = GameObject(), GameObject()
+    root.add_child(layer)
+    for _ in range(3):
+        layer.add_child(Item())
+    assert root.total_children == 5
+    item = Item()
+    for _ in layer:
+        layer.add_child(item)
+        assert root.total_children == 5  # pending, not counted yet
+    assert root.total_children == 6
+    layer.remove_from_parent()
+    assert root.total_children == 1
+
+
+def test_views_follow_adds_removes_and_reindex():
+    node = GameObject()
+    a, b = Item('a'), Item('b')
+    node.add_child(a)
+    node.add_view('a', lambda c: c.kind == 'a')
+    node.add_child(b)
+    assert node.view('a') == (a,)
+    # the same tuple while the view does not change
+    assert node.view('a') is node.view('a')
+
+    c = Item('a')
+    for _ in node:
+        node.add_child(c)
+        assert node.view('a') == (a,)
+    assert node.view('a') == (a, c)
+
+    b.kind = 'a'
+    node.reindex(b)
+    assert node.view('a') == (a, b, c)  # in the order of the children
+    node.remove_child(a)
+    assert node.view('a') == (b, c)
+
+
+def test_views_of_the_tanks_of_a_game():
+    game = Game(clock=FixedClock(), seed=3)
+    game.ai.MAX_ENEMIES = 6
+    predicates = {name: view.predicate for name, view in game.tanks._views.items()}
+    for i in range(1200):
+        if i % 20 == 0:
+            game.fire()
+        game.step()
+        for name, predicate in predicates.items():
+            assert game.tanks.view(name) == tuple(t for t in game.tanks if predicate(t)), (i, name)
+        assert game.scene.total_children == sum(1 for _ in walk(game.scene))
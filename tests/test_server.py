@@ -0,0 +1,62 @@
+import pytest
+
+import controls
+from game import Game
+from server import MatchServer, encode_state, decode_state, xor_bytes
+from tests.test_spectate import watched_match
+from util import FixedClock, Direction
+
+
+@pytest.mark.parametrize('data, previous', [(b'abcdef', b'abcxyz'), (b'abcdef', b'ab'), (b'ab', b'abcdef'),
+                                            (b'', b'abc'), (b'\0\xff' * 100, b'')])
+def test_xor_round_trip(data, previous):
+    delta = xor_bytes(data, previous)
+    assert len(delta) == len(data)
+    assert xor_bytes(delta, previous) == data
+
+
+def test_states_of_a_match_round_trip():
+    game = Game(clock=FixedClock(), seed=2)
+    previous = got = None
+    sizes = []
+    for i in range(300):
+        game.apply_input(controls.bits_of(Direction.UP, i % 25 == 0))
+        game.step()
+        data = game.snapshot()
+        # a keyframe now and then, the deltas from the state sent before between them
+        body = encode_state(game.ticks, data, None if i % 100 == 0 else previous)
+        step, got = decode_state(body, got)
+        assert (step, got) == (game.ticks, data)
+        sizes.append(len(body))
+        previous = data
+    # the deltas of a match that goes on are much smaller than the keyframes
+    assert max(sizes[1:100]) * 3 < sizes[0]
+
+
+def test_delta_without_the_state_before_it():
+    with pytest.raises(ValueError):
+        decode_state(encode_state(1, b'state', b'before'))
+
+
+def test_failed_step_closes_only_its_match(monkeypatch):
+    server = MatchServer(seed=1)
+    broken, broken_spectator = watched_match(server)
+    fine, fine_spectator = watched_match(server)
+    server.tick()
+
+    def fail(dt):
+        raise RuntimeError('broken step')
+
+    monkeypatch.setattr(broken, 'step', fail)
+    sent = len(fine_spectator.writer.data)
+    server.tick()
+    server.tick()
+    assert server.match_errors == 1
+    assert broken.id not in server.matches
+    assert broken_spectator.match is None and broken_spectator.writer.closed
+    assert fine.game.ticks == 3
+    assert len(fine_spectator.writer.data) > sent
+
+    # the connection ends after the match, leaving finds nothing to do
+    server.leave(broken_spectator)
+    assert list(server.matches) == [fine.id]
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+import controls
+from ai import EnemyFractionAI
+from game import Game
+from snapshot import SnapshotError
+from util import FixedClock, Direction
+
+OPTIONS = [
+    {},
+    {'ecs': True, 'swept_projectiles': True},
+    {'ai_mode': EnemyFractionAI.MODE_FLOW, 'sight_fire': True},
+    {'players': 2, 'versus': True},
+]
+
+
+def new_game(seed, **options):
+    game = Game(clock=FixedClock(), seed=seed, **options)
+    game.ai.MAX_ENEMIES = 8
+    return game
+
+
+def drive(game, rng, ticks):
+    """
+    Plays the players at random
+    :return: the snapshots after every step
+    """
+    directions = [None] * len(game.player_tanks)
+    snapshots = []
+    for i in range(ticks):
+        for player in range(len(directions)):
+            if i % 20 == 0:
+                directions[player] = rng.choice([None, *Direction])
+            game.apply_input(controls.bits_of(directions[player], rng.random() < 0.1), player)
+        game.step()
+        snapshots.append(game.snapshot())
+    return snapshots
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_restored_game_goes_on_the_same(options):
+    game = new_game(3, **options)
+    drive(game, random.Random(1), 400)
+    saved = game.snapshot()
+    played = drive(game, random.Random(2), 500)
+
+    # into another game which has been played a bit, and into the same one
+    other = new_game(40, **options)
+    drive(other, random.Random(3), 50)
+    for restored in (other, game):
+        restored.restore(saved)
+        assert restored.snapshot() == saved
+        replayed = drive(restored, random.Random(2), 500)
+        diverged = next((step for step, (a, b) in enumerate(zip(played, replayed)) if a != b), None)
+        assert diverged is None, f'diverged at step {diverged}'
+
+
+def test_snapshot_of_another_kind_of_game_is_refused():
+    saved = new_game(1).snapshot()
+    with pytest.raises(SnapshotError):
+        new_game(1, level=2).restore(saved)
+    with pytest.raises(SnapshotError):
+        new_game(1, players=2).restore(saved)
+    with pytest.raises(SnapshotError):
+        Game(seed=1).restore(saved)  # on the wall clock
+    with pytest.raises(SnapshotError):
+        new_game(1).restore(saved[:4] + bytes([0]) + saved[5:])  # of another version
@@ -0,0 +1,89 @@
+from bonus import BonusType
+from game import Game
+from server import MatchServer, Client
+from spectate import SpectatorEncoder, SpectatorView
+from util import FixedClock
+
+
+def fill_bonuses(game, n):
+    for i in range(n):
+        game.make_bonus(32 + i % 12 * 32, 32 + i // 12 * 32, BonusType.CASK)
+
+
+def bonus_positions(bonuses):
+    return sorted(b.position for b in bonuses)
+
+
+def test_bonus_table_has_no_limit():
+    # bonuses never expire, a long match leaves many of them
+    game = Game(clock=FixedClock(), seed=1)
+    encoder = SpectatorEncoder(game)
+    view = SpectatorView()
+    encoder.delta()
+    view.apply(encoder.keyframe())
+    fill_bonuses(game, 100)
+    game.step()
+    view.apply(encoder.delta())
+    assert len(view._bonuses) >= 100
+    assert bonus_positions(view._bonuses.values()) == bonus_positions(game.bonues)
+
+    # the ids of the picked ones are used again
+    for b in list(game.bonues)[:50]:
+        b.remove_from_parent()
+    fill_bonuses(game, 30)
+    game.step()
+    view.apply(encoder.delta())
+    assert bonus_positions(view._bonuses.values()) == bonus_positions(game.bonues)
+    # 30 of the 50 ids given back are taken again, no new ones
+    assert max(view._bonuses) < len(view._bonuses) + 20
+
+    late = SpectatorView()
+    late.apply(encoder.keyframe())
+    assert bonus_positions(late._bonuses.values()) == bonus_positions(game.bonues)
+
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+        self.transport = self
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def get_write_buffer_size(self):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+def watched_match(server):
+    player, spectator = Client(Writer()), Client(Writer())
+    server.join(player)
+    server.join(spectator, player.match.id)
+    return player.match, spectator
+
+
+def test_encoder_error_stops_only_its_match():
+    server = MatchServer(seed=1)
+    broken, broken_spectator = watched_match(server)
+    fine, fine_spectator = watched_match(server)
+    server.tick()
+
+    # a position the frames can not hold
+    broken.game.make_bonus(5000, 0, BonusType.CASK)
+    sent = len(broken_spectator.writer.data), len(fine_spectator.writer.data)
+    server.tick()
+    assert server.spectate_errors == 1
+    assert len(broken_spectator.writer.data) == sent[0]
+    assert len(fine_spectator.writer.data) > sent[1]
+    assert broken_spectator.needs_keyframe
+
+    # the stream of the match starts again with a keyframe
+    for b in list(broken.game.bonues):
+        b.remove_from_parent()
+    server.tick()
+    assert server.spectate_errors == 1
+    assert len(broken_spectator.writer.data) > sent[0]
+    assert not broken_spectator.needs_keyframe
@@ -0,0 +1,99 @@
+import pygame
+import pytest
+
+import config
+import sprite_cache
+from config import ATLAS
+from spritesheet import SpriteSheet
+from util import COLOR_BLACK_KEY
+
+
+def scan_crop_rect(img, bg_color=COLOR_BLACK_KEY, square=False):
+    """
+    The crop rect found pixel by pixel, as find_crop_rect did before the masks
+    """
+    w, h = img.get_width(), img.get_height()
+
+    def scan_line(or_x, or_y, horizontal):
+        line_x = range(w) if horizontal else [or_x] * w
+        line_y = [or_y] * h if horizontal else range(h)
+        return all(img.get_at((x, y)) == bg_color for x, y in zip(line_x, line_y))
+
+    left, right, top, bottom = 0, 0, 0, 0
+    while left < w and scan_line(left, 0, horizontal=False):
+        left += 1
+    while right < w and scan_line(w - 1 - right, 0, horizontal=False):
+        right += 1
+    while top < h and scan_line(0, top, horizontal=True):
+        top += 1
+    while bottom < h and scan_line(0, h - bottom - 1, horizontal=True):
+        bottom += 1
+
+    crop_w = w - right - left
+    crop_h = h - bottom - top
+    if square:
+        d = crop_w - crop_h
+        if d > 0:
+            top -= d // 2
+            crop_h = crop_w
+        else:
+            left -= d // 2
+            crop_w = crop_h
+    return left, top, crop_w, crop_h
+
+
+@pytest.mark.parametrize('w, h', [(1, 1), (2, 2), (1, 2), (2, 1), (4, 2)])
+def test_crop_rects_of_the_whole_atlas(w, h):
+    atlas = ATLAS()
+    cols = atlas.sheet.get_width() // atlas.sprite_size
+    rows = atlas.sheet.get_height() // atlas.sprite_size
+    for x in range(cols - w + 1):
+        for y in range(rows - h + 1):
+            image, _ = atlas._make_image(x, y, w, h, COLOR_BLACK_KEY, False, False)
+            for square in (False, True):
+                expected = scan_crop_rect(image, square=square)
+                assert tuple(SpriteSheet.find_crop_rect(image, square=square)) == expected, (x, y, square)
+
+
+def test_crop_rect_key_has_the_resolved_colorkey():
+    atlas = ATLAS()
+    image = atlas.image_at(0, 0, 2, 2, colorkey=-1, auto_crop=True)
+    assert (0, 0, 2, 2, image.get_colorkey(), False) in atlas._crop_rects
+
+
+def new_sheet(cache_file=None):
+    return SpriteSheet(config.ATLAS_FILE, upsample=config.ATLAS_UPSAMPLE, sprite_size=config.ATLAS_SPRITE_SIZE,
+                       cache_file=cache_file)
+
+
+def test_sprite_cache_round_trip(monkeypatch, tmp_path):
+    made = new_sheet()
+    monkeypatch.setattr(config, '_altas', made)
+    sprite_cache.make_all_sprites()
+    cache_file = str(tmp_path / 'atlas.cache')
+    assert sprite_cache.save(made, cache_file) == len(made.made_sprites)
+
+    cached = new_sheet(cache_file)
+    assert set(cached._precomputed) == set(made.made_sprites)
+    for key, (image, crop_rect) in made.made_sprites.items():
+        image_from_cache = cached.image_at(*key)
+        assert image_from_cache.get_size() == image.get_size()
+        assert image_from_cache.get_colorkey() == image.get_colorkey()
+        assert pygame.image.tostring(image_from_cache, 'RGB') == pygame.image.tostring(image, 'RGB')
+        assert cached._precomputed[key][4] == (tuple(crop_rect) if crop_rect else None)
+    # every sprite came from the cache, the atlas was not even decoded
+    assert cached._sheet is None and not cached.made_sprites
+
+    # a file cut short is refused as a whole
+    with open(cache_file, 'r+b') as f:
+        f.truncate(len(f.read()) - 1)
+    assert new_sheet(cache_file)._precomputed == {}
+
+
+@pytest.mark.parametrize('content', [b'', b'BCSC', b'\x80\x04\x95 a pickle', b'BCSC' + bytes(100)])
+def test_broken_sprite_cache_is_ignored(tmp_path, content):
+    cache_file = tmp_path / 'atlas.cache'
+    cache_file.write_bytes(content)
+    sheet = new_sheet(str(cache_file))
+    assert sheet._precomputed == {}
+    assert sheet.image_at(0, 0, 2, 2).get_size() == (sheet.real_sprite_size * 2,) * 2
@@ -14,5 +14,9 @@ class GameOverLabel(GameObject):
         w, h = go.size
         self.position = x + (w - self.size[0]) // 2, y + (h - self.size[1]) // 2 + 2
 
+    @property
+    def screen_rects(self):
+        return (*self.position, self._image.get_width(), self._image.get_height()),
+
     def render(self, screen):
         screen.blit(self._image, self.position)
@@ -1,5 +1,4 @@
 import time
-from collections import OrderedDict
 from enum import Enum
 from pygame import Surface
 import random
@@ -19,34 +18,63 @@ class Direction(Enum):
 
     @property
     def vector(self):
-        return {
-            self.UP: (0, -1),
-            self.DOWN: (0, 1),
-            self.LEFT: (-1, 0),
-            self.RIGHT: (1, 0)
-        }[self]
+        return _DIRECTION_VECTORS[self._value_]
 
     @classmethod
-    def random(cls):
-        return random.choice(list(cls))
+    def random(cls, rng=random):
+        return rng.choice(list(cls))
 
     @classmethod
     def all(cls):
         return set(cls)
 
 
+# by the values of Direction: a table lookup, the vectors are asked for in every move
+_DIRECTION_VECTORS = {
+    Direction.UP.value: (0, -1),
+    Direction.DOWN.value: (0, 1),
+    Direction.LEFT.value: (-1, 0),
+    Direction.RIGHT.value: (1, 0)
+}
+
+
+class Clock:
+    """Wall clock, the time source of animators and timers of a real time game"""
+
+    def now(self):
+        return time.monotonic()
+
+
+class FixedClock(Clock):
+    """Manually advanced clock for the fixed timestep (headless) simulation"""
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def now(self):
+        return self.time
+
+    def advance(self, dt):
+        self.time += dt
+
+
 class Animator:
-    def __init__(self, delay=0.1, max_states=5, once=False):
+    def __init__(self, clock: Clock, delay=0.1, max_states=5, once=False):
+        """
+        :param clock: of the game the animator belongs to
+        """
+        self.clock = clock
         self.max_states = max_states
         self.delay = delay
         self.state = 0
         self.once = once
         self.done = False
-        self.last_time = time.monotonic()
+        self.last_time = clock.now()
 
     def __call__(self):
-        if self.last_time + self.delay < time.monotonic():
-            self.last_time = time.monotonic()
+        t = self.clock.now()
+        if self.last_time + self.delay < t:
+            self.last_time = t
             self.state += 1
             if self.state >= self.max_states:
                 if self.once:
@@ -61,15 +89,15 @@ class Animator:
 
 
 class Timer(Animator):
-    def __init__(self, delay, paused=True):
-        super().__init__(delay, 1, once=True)
+    def __init__(self, clock: Clock, delay, paused=True):
+        super().__init__(clock, delay, 1, once=True)
         if paused:
             self.done = True
 
     def start(self):
         self.done = False
         self.state = 0
-        self.last_time = time.monotonic()
+        self.last_time = self.clock.now()
 
     def tick(self):
         if not self.done:
@@ -81,14 +109,19 @@ class Timer(Animator):
 
 
 class ArmedTimer(Timer):
-    def __init__(self, delay):
-        super().__init__(delay, paused=False)
+    def __init__(self, clock: Clock, delay):
+        super().__init__(clock, delay, paused=False)
+
+
+class Entity:
+    """
+    Leaf object of the scene: no children and no __dict__, subclasses declare their __slots__
+    """
 
+    __slots__ = ('_parent', '_position', 'size')
 
-class GameObject:
     def __init__(self):
         self._parent = None
-        self._children = OrderedDict()
         self._position = (0, 0)
         self.size = (0, 0)
 
@@ -115,17 +148,7 @@ class GameObject:
         return id(self)
 
     def __iter__(self):
-        return iter(OrderedDict(self._children))
-
-    def __getitem__(self, item):
-        return self._children[item]
-
-    def add_child(self, child: 'GameObject'):
-        child._parent = self
-        self._children[child] = 1
-
-    def remove_child(self, child):
-        del self._children[child]
+        return iter(())
 
     def remove_from_parent(self):
         if self._parent is not None:
@@ -134,15 +157,194 @@ class GameObject:
 
     def visit(self, screen: Surface):
         self.render(screen)
-        for child in list(self._children.keys()):
-            child.visit(screen)
 
     def render(self, screen):
         ...
 
+    # --- dirty rects, see DirtyRectTracker ---
+
+    @property
+    def screen_rects(self):
+        """
+        Parts of the screen painted by render
+        :return: tuple of (x, y, w, h)
+        """
+        return ()
+
+    @property
+    def render_state(self):
+        """
+        Anything that changes the look of the object while it stays in place (animation frame, etc.)
+        """
+        return None
+
+    def take_dirty_rects(self):
+        """
+        Parts of the screen repainted with changes inside the object since the last call
+        """
+        return ()
+
+    @property
+    def total_children(self):
+        return 1
+
+
+class _View:
+    __slots__ = ('predicate', 'members', 'items')
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+        self.members = {}
+        self.items = ()
+
+
+class GameObject(Entity):
+    """
+    Node of the scene that can have children.
+    Children added or removed while the node is being iterated (or visited) join or leave it
+    when the outermost iteration is over, so iterating does not need a copy
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._children = {}
+        self._iterating = 0
+        self._pending = []  # (add?, child) to apply after the iteration
+        self._count = 1  # this node and all its descendants
+        self._views = {}
+
+    def __iter__(self):
+        self._iterating += 1
+        try:
+            yield from self._children
+        finally:
+            self._iterating -= 1
+            if not self._iterating and self._pending:
+                self._apply_pending()
+
+    def __getitem__(self, item):
+        return self._children[item]
+
+    def add_child(self, child: Entity):
+        child._parent = self
+        if self._iterating:
+            self._pending.append((True, child))
+        else:
+            self._add(child)
+
+    def remove_child(self, child):
+        if self._iterating:
+            self._pending.append((False, child))
+        else:
+            self._remove(child)
+
+    def _apply_pending(self):
+        pending, self._pending = self._pending, []
+        for add, child in pending:
+            if add:
+                self._add(child)
+            else:
+                self._remove(child)
+
+    def _add(self, child):
+        if child in self._children:
+            return
+        self._children[child] = None
+        self._change_count(child.total_children)
+        for view in self._views.values():
+            if view.predicate(child):
+                view.members[child] = None
+                view.items = None
+
+    def _remove(self, child):
+        del self._children[child]
+        self._change_count(-child.total_children)
+        for view in self._views.values():
+            if child in view.members:
+                del view.members[child]
+                view.items = None
+
+    def _change_count(self, delta):
+        node = self
+        while True:
+            node._count += delta
+            parent = node._parent
+            # a pending child is counted by its parent when it is really added
+            if parent is None or node not in parent._children:
+                break
+            node = parent
+
+    def visit(self, screen: Surface):
+        self.render(screen)
+        self._iterating += 1
+        try:
+            for child in self._children:
+                child.visit(screen)
+        finally:
+            self._iterating -= 1
+            if not self._iterating and self._pending:
+                self._apply_pending()
+
     @property
     def total_children(self):
-        return 1 + sum(child.total_children for child in self._children)
+        return self._count
+
+    # --- views ---
+
+    def add_view(self, name, predicate):
+        """
+        Declares a view: the children for which predicate(child) is true, in the order of the children.
+        It is kept up to date on add and remove; call reindex when a child changes what the predicate depends on
+        """
+        view = self._views[name] = _View(predicate)
+        view.members = {child: None for child in self._children if predicate(child)}
+        view.items = None
+
+    def view(self, name):
+        """
+        :return: tuple of the children in the view, it stays the same while the view does not change
+        """
+        view = self._views[name]
+        if view.items is None:
+            view.items = tuple(view.members)
+        return view.items
+
+    def reindex(self, child):
+        if child not in self._children:
+            return  # it is still pending, the views will test it when it is added
+        for view in self._views.values():
+            if view.predicate(child) != (child in view.members):
+                predicate = view.predicate
+                view.members = {c: None for c in self._children if predicate(c)}
+                view.items = None
+
+
+class Pool:
+    """
+    Free list of short-lived objects to reuse instead of allocating new ones
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._free = []
+
+    def take(self):
+        """
+        :return: a released object or None if there is none
+        """
+        return self._free.pop() if self._free else None
+
+    def give_back(self, obj):
+        if len(self._free) < self.max_size:
+            self._free.append(obj)
+
+    def __len__(self):
+        return len(self._free)
+
+
+def lerp_position(a, b, alpha):
+    (ax, ay), (bx, by) = a, b
+    return round(ax + (bx - ax) * alpha), round(ay + (by - ay) * alpha)
 
 
 def trim_rect(rect, amount):